@@ -0,0 +1 @@
+# autoRed benchmark harness
@@ -0,0 +1,225 @@
+# fake services for autoRed
+
+"""Local stand-ins for the external services the pipeline talks to.
+
+A single threaded HTTP server answers like the Hugging Face router
+(OpenAI-compatible chat completions), Cloudflare Workers AI, the image
+inference endpoint and the Xiaohongshu creator center, each with its own
+latency and error distribution, so the whole pipeline can be benchmarked
+offline and reproducibly.
+"""
+import io
+import json
+import time
+import random
+import threading
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from PIL import Image
+
+CREATOR_PAGE = Path(__file__).parent / "creator.html"
+
+# What a well-behaved text model returns for the content element prompt.
+CONTENT_ELEMENT = {
+    "image_prompt": "写实摄影-温柔-(高细节) - 年轻女性 - 米色针织衫 - 咖啡馆窗边 - 午后自然光 - 50mm 镜头",
+    "title": "午后咖啡馆的温柔时光☕️",
+    "copy": "阳光刚刚好，咖啡也刚刚好。\n#咖啡馆 #氛围感 #日常",
+}
+
+
+@dataclass
+class Latency:
+    """Latency distribution of one endpoint: normal around `mean` seconds,
+    clipped at zero, failing with HTTP 500 at `error_rate`."""
+    mean: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+
+    def sample(self, rng: random.Random) -> float:
+        return max(0.0, rng.gauss(self.mean, self.jitter))
+
+    def wait(self, rng: random.Random) -> bool:
+        """Sleep for one sampled latency. Returns False if the request should fail."""
+        time.sleep(self.sample(rng))
+        return rng.random() >= self.error_rate
+
+
+def _png(size: int) -> bytes:
+    # Noise does not compress, so encoding costs resemble a real render.
+    image = Image.frombytes("RGB", (size, size), random.Random(0).randbytes(size * size * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class FakeServices:
+    def __init__(self, text: Latency = Latency(), image: Latency = Latency(), upload: Latency = Latency(),
+                 publish: Latency = Latency(), image_size: int = 1024, seed: int = 0):
+        self.text = text
+        self.image = image
+        self.upload = upload
+        self.publish = publish
+        self.image_bytes = _png(image_size)
+        self.requests = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def env(self) -> dict:
+        """Environment variables pointing the pipeline at these services."""
+        return {
+            "HF_BASE_URL": f"{self.base_url}/hf/v1",
+            "CLOUDFLARE_BASE_URL": f"{self.base_url}/cloudflare",
+            "IMAGE_BASE_URL": f"{self.base_url}/image",
+            "XHS_CREATOR_URL": f"{self.base_url}/creator",
+            "HF_TOKEN": "benchmark",
+            "CLOUDFLARE_API_TOKEN": "benchmark",
+        }
+
+    def _rng_for_request(self) -> random.Random:
+        # Each request draws from its own generator so sleeping threads do not contend.
+        with self._lock:
+            return random.Random(self._rng.random())
+
+    def _wait(self, latency: Latency) -> bool:
+        return latency.wait(self._rng_for_request())
+
+    def _handler(self):
+        services = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body: bytes, content_type="application/json"):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _json(self, payload, status=200):
+                self._send(status, json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+
+            def _stream_completion(self, content: str, latency: Latency):
+                """Server-sent events like a streaming chat completion.
+
+                A quarter of the sampled latency passes before the first token,
+                the rest is spread over the chunks.
+                """
+                rng = services._rng_for_request()
+                total = latency.sample(rng)
+                if rng.random() < latency.error_rate:
+                    time.sleep(total)
+                    return self._json({"error": "overloaded"}, 500)
+                pieces = [content[i:i + 8] for i in range(0, len(content), 8)]
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                def event(data: str):
+                    body = f"data: {data}\n\n".encode("utf-8")
+                    self.wfile.write(f"{len(body):x}\r\n".encode() + body + b"\r\n")
+                    self.wfile.flush()
+
+                time.sleep(total / 4)
+                for piece in pieces:
+                    time.sleep(total * 3 / 4 / len(pieces))
+                    event(json.dumps({
+                        "id": "chatcmpl-benchmark",
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": "benchmark",
+                        "choices": [{"index": 0, "finish_reason": None, "delta": {"content": piece}}],
+                    }, ensure_ascii=False))
+                event("[DONE]")
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _count(self, name):
+                with services._lock:
+                    services.requests[name] = services.requests.get(name, 0) + 1
+
+            def do_GET(self):
+                if self.path.startswith("/creator/api/"):
+                    # Session check: logged in while the request carries a web_session cookie.
+                    self._count("session")
+                    logged_in = "web_session=" in (self.headers.get("Cookie") or "")
+                    self._json({"success": True, "code": 0} if logged_in else {"success": False, "code": -100})
+                elif self.path.startswith("/creator"):
+                    self._count("creator")
+                    self._send(200, CREATOR_PAGE.read_bytes(), "text/html; charset=utf-8")
+                else:
+                    self._send(404, b"{}")
+
+            def do_PUT(self):
+                self.do_POST()
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                content = json.dumps(CONTENT_ELEMENT, ensure_ascii=False)
+                if self.path.startswith("/hf/"):
+                    self._count("hf")
+                    if json.loads(body or b"{}").get("stream"):
+                        return self._stream_completion(content, services.text)
+                    if not services._wait(services.text):
+                        return self._json({"error": "overloaded"}, 500)
+                    self._json({
+                        "id": "chatcmpl-benchmark",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": "benchmark",
+                        "choices": [{"index": 0, "finish_reason": "stop",
+                                     "message": {"role": "assistant", "content": content}}],
+                        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                    })
+                elif self.path.startswith("/cloudflare/"):
+                    self._count("cloudflare")
+                    if not services._wait(services.text):
+                        return self._json({"success": False, "errors": ["overloaded"]}, 500)
+                    self._json({"success": True, "result": {"output": [{
+                        "type": "message", "role": "assistant",
+                        "content": [{"type": "output_text", "text": content}],
+                    }]}})
+                elif self.path.startswith("/image"):
+                    self._count("image")
+                    if not services._wait(services.image):
+                        return self._json({"error": "overloaded"}, 500)
+                    self._send(200, services.image_bytes, "image/png")
+                elif self.path.startswith("/ros-upload"):
+                    self._count("upload")
+                    ok = services._wait(services.upload)
+                    self._json({"success": ok}, 200 if ok else 500)
+                elif self.path.startswith("/api/publish"):
+                    self._count("publish")
+                    ok = services._wait(services.publish)
+                    self._json({"success": ok}, 200 if ok else 500)
+                else:
+                    self._send(404, b"{}")
+
+        return Handler
+
+    def start(self) -> "FakeServices":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,247 @@
+# benchmark runner for autoRed
+
+"""End-to-end benchmark of the posting pipeline against local stand-ins.
+
+Starts :class:`~benchmarks.fake_services.FakeServices`, points the pipeline at
+it through the endpoint settings and runs the selected scenarios:
+
+* ``generate`` – text and image generation per post, no browser needed
+* ``job``      – ``main.job_v2`` post after post, publishing through Playwright
+* ``batch``    – the staged batch pipeline (``MODE=batch``)
+
+For each scenario it reports posts/min, per-stage p50/p95 and peak RSS.
+With ``--baseline`` the run fails when throughput regressed by more than
+``--tolerance`` against an earlier ``--output`` file.
+
+Usage:
+    python -m benchmarks.run --posts 10 --scenarios generate,batch
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+from pathlib import Path
+from typing import Dict, List
+
+from benchmarks.fake_services import FakeServices, Latency
+
+SCENARIOS = ("generate", "job", "batch")
+
+# Spans of a ``job_v2`` post reported as its stages.
+JOB_STAGES = {"text.generate": "text", "image.generate": "image", "publish": "publish", "job": "post"}
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _peak_rss_mb() -> dict:
+    # ru_maxrss is in KiB on Linux. Children only count once they were waited
+    # for, which for the browser is after the publisher pool closed.
+    return {
+        "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+    }
+
+
+def _summary(name: str, stage_times: Dict[str, List[float]], posts: int, failed: int, elapsed: float) -> dict:
+    return {
+        "scenario": name,
+        "posts": posts,
+        "failed": failed,
+        "seconds": round(elapsed, 2),
+        "posts_per_min": round(posts / elapsed * 60, 2) if elapsed > 0 else 0.0,
+        "stages": {
+            stage: {"p50": round(_percentile(times, 0.5), 3), "p95": round(_percentile(times, 0.95), 3)}
+            for stage, times in stage_times.items() if times
+        },
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def _spans_offset() -> int:
+    """Current end of the metrics JSON lines file, to read later spans from."""
+    from config.settings import METRICS_JSONL
+
+    path = Path(METRICS_JSONL)
+    return path.stat().st_size if path.exists() else 0
+
+
+def _span_times(offset: int, stages: Dict[str, str]) -> Dict[str, List[float]]:
+    """Durations of the successful spans named in `stages` recorded after
+    `offset`, read back from the metrics JSON lines file."""
+    from config.settings import METRICS_JSONL
+
+    stage_times = {stage: [] for stage in stages.values()}
+    path = Path(METRICS_JSONL)
+    if not path.exists():
+        return stage_times
+    with path.open("rb") as f:
+        f.seek(offset)
+        for line in f:
+            record = json.loads(line)
+            if record["span"] in stages and record["outcome"] == "ok":
+                stage_times[stages[record["span"]]].append(record["duration"])
+    return stage_times
+
+
+def bench_generate(n: int) -> dict:
+    """Text then images for `n` posts, one after the other."""
+    from src.llm_client import generate_content_element_routed
+    from src.image_client import EarlyRender
+    from config.settings import IMAGES_PER_POST
+
+    stage_times = {"text": [], "image": [], "post": []}
+    done = failed = 0
+    started = time.perf_counter()
+    for _ in range(n):
+        post_start = time.perf_counter()
+        try:
+            early = EarlyRender(count=IMAGES_PER_POST, mode="prod", in_memory=True)
+            content = generate_content_element_routed(on_image_prompt=early.start)
+            if not content:
+                raise RuntimeError("no content generated")
+            stage_times["text"].append(time.perf_counter() - post_start)
+            # Time still spent waiting for images after the text was complete.
+            image_start = time.perf_counter()
+            early.result(content["image_prompt"])
+            stage_times["image"].append(time.perf_counter() - image_start)
+        except Exception as e:
+            print(f"[autoRed] Benchmark post failed: {e}")
+            failed += 1
+            continue
+        stage_times["post"].append(time.perf_counter() - post_start)
+        done += 1
+    return _summary("generate", stage_times, done, failed, time.perf_counter() - started)
+
+
+def bench_job(n: int, pool) -> dict:
+    """``job_v2`` for `n` posts on one warm publisher pool; stages from its spans."""
+    from main import job_v2
+
+    done = failed = 0
+    offset = _spans_offset()
+    started = time.perf_counter()
+    for _ in range(n):
+        try:
+            job_v2(mode="prod", pool=pool)
+        except Exception as e:
+            print(f"[autoRed] Benchmark post failed: {e}")
+            failed += 1
+            continue
+        done += 1
+    elapsed = time.perf_counter() - started
+    return _summary("job", _span_times(offset, JOB_STAGES), done, failed, elapsed)
+
+
+def bench_batch(n: int, pool) -> dict:
+    """The staged pipeline for a batch of `n` posts."""
+    from src.pipeline import run_batch
+
+    started = time.perf_counter()
+    posts = run_batch(n, mode="prod", headless=True, pool=pool)
+    elapsed = time.perf_counter() - started
+    published = [p for p in posts if p.error is None]
+    stage_times = {}
+    for post in published:
+        for stage, seconds in post.timings.items():
+            stage_times.setdefault(stage, []).append(seconds)
+    return _summary("batch", stage_times, len(published), len(posts) - len(published), elapsed)
+
+
+def _print_report(results: List[dict]):
+    for result in results:
+        print(f"\n[autoRed] Scenario {result['scenario']}: {result['posts']} posts "
+              f"({result['failed']} failed) in {result['seconds']}s -> {result['posts_per_min']} posts/min")
+        for stage, stats in result["stages"].items():
+            print(f"[autoRed]   {stage:<8} p50 {stats['p50']:.3f}s  p95 {stats['p95']:.3f}s")
+        rss = result["peak_rss_mb"]
+        print(f"[autoRed]   peak RSS {rss['self']} MB (browser and other children {rss['children']} MB)")
+
+
+def _regressions(results: List[dict], baseline_path: Path, tolerance: float) -> List[str]:
+    baseline = {r["scenario"]: r for r in json.loads(baseline_path.read_text())}
+    problems = []
+    for result in results:
+        before = baseline.get(result["scenario"])
+        if before and result["posts_per_min"] < before["posts_per_min"] * (1 - tolerance):
+            problems.append(f"{result['scenario']}: {result['posts_per_min']} posts/min, "
+                            f"baseline {before['posts_per_min']}")
+    return problems
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the autoRed pipeline against local stand-ins.")
+    parser.add_argument("--posts", type=int, default=10, help="posts per scenario")
+    parser.add_argument("--scenarios", default="generate,job,batch",
+                        help=f"comma separated, any of {', '.join(SCENARIOS)}")
+    for name, mean in (("text", 1.0), ("image", 2.0), ("upload", 0.3), ("publish", 0.2)):
+        parser.add_argument(f"--{name}-latency", type=float, default=mean, help=f"mean {name} latency (s)")
+        parser.add_argument(f"--{name}-jitter", type=float, default=mean / 4, help=f"{name} latency stddev (s)")
+        parser.add_argument(f"--{name}-error-rate", type=float, default=0.0, help=f"share of failing {name} calls")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the latency/error draws")
+    parser.add_argument("--output", type=Path, help="write the results as JSON")
+    parser.add_argument("--baseline", type=Path, help="results JSON of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed throughput drop vs. baseline")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = _parse_args(argv)
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    latency = {
+        name: Latency(getattr(args, f"{name}_latency"), getattr(args, f"{name}_jitter"),
+                      getattr(args, f"{name}_error_rate"))
+        for name in ("text", "image", "upload", "publish")
+    }
+    with FakeServices(**latency, seed=args.seed) as services:
+        # Settings are read at import time, so the environment has to point at
+        # the stand-ins before anything from src is imported.
+        os.environ.update(services.env())
+        os.environ.update({
+            "TEXT_PROVIDERS": "cloudflare,hf",
+            "CACHE_ENABLED": "false",
+            # The stand-ins answer every request with the same post.
+            "DEDUP_ENABLED": "false",
+            # Benchmark draws must not count towards the real combination coverage.
+            "SAMPLER_STATE_PATH": str(Path(tempfile.mkdtemp()) / "sampler.json"),
+            "ATTEMPT_STATE_PATH": str(Path(tempfile.mkdtemp()) / "attempt.json"),
+            # Spans of this run only; the job scenario reads its stages from them.
+            "METRICS_JSONL": str(Path(tempfile.mkdtemp()) / "spans.jsonl"),
+            "PUBLISH_AUTO_SUBMIT": "true",
+            "XHS_ACCOUNTS": "",
+        })
+        results = []
+        if "generate" in scenarios:
+            results.append(bench_generate(args.posts))
+        if {"job", "batch"} & set(scenarios):
+            from src.publisher import PublisherPool
+            with PublisherPool(headless=True) as pool:
+                if "job" in scenarios:
+                    results.append(bench_job(args.posts, pool))
+                if "batch" in scenarios:
+                    results.append(bench_batch(args.posts, pool))
+        print(f"\n[autoRed] Requests served: {services.requests}")
+
+    _print_report(results)
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+    if args.baseline:
+        problems = _regressions(results, args.baseline, args.tolerance)
+        for problem in problems:
+            print(f"[autoRed] Throughput regression – {problem}")
+        if problems:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
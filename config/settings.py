@@ -1,21 +1,182 @@
 # Settings for autoRed project
 
+"""All configuration of autoRed, read once from the environment.
+
+This module is the single settings object: every value is a typed module
+constant, parsed when the module is first imported, after the project's
+``.env`` file has been loaded. Importing it has no other side effects.
+"""
+
 import os
 from pathlib import Path
-from dotenv import load_dotenv
+from typing import Optional
+
+ENV_PATH = Path(__file__).parent.parent / ".env"
+_env_loaded = False
+
+
+def load_env(path: Path = ENV_PATH):
+    """Load the .env file into the environment once; existing variables win."""
+    global _env_loaded
+    if _env_loaded:
+        return
+    _env_loaded = True
+    if path.exists():
+        from dotenv import load_dotenv
+        load_dotenv(dotenv_path=path)
+
+
+def _str(name: str, default: str = "") -> str:
+    return os.getenv(name, default)
+
+
+def _int(name: str, default: int) -> int:
+    return int(os.getenv(name) or default)
 
-# Load .env file if present
-env_path = Path(__file__).parent.parent / ".env"
-if env_path.exists():
-    load_dotenv(dotenv_path=env_path)
+
+def _float(name: str, default: float) -> float:
+    return float(os.getenv(name) or default)
+
+
+def _bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    return default if not value else value.lower() in ("1", "true", "yes")
+
+
+def _path(name: str, default: Path) -> Path:
+    return Path(os.getenv(name) or default)
+
+
+load_env()
 
 # Google Cloud API key for Gemini and Imagen
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-print(GOOGLE_API_KEY)
+GOOGLE_API_KEY: Optional[str] = os.getenv("GOOGLE_API_KEY")
 
 # Model selections (default values)
-TEXT_MODEL_NAME = os.getenv("TEXT_MODEL_NAME", "gemini-2.5-flash")
-IMAGE_MODEL_NAME = os.getenv("IMAGE_MODEL_NAME", "imagen-4.0-generate-001")
+TEXT_MODEL_NAME: str = _str("TEXT_MODEL_NAME", "gemini-2.5-flash")
+IMAGE_MODEL_NAME: str = _str("IMAGE_MODEL_NAME", "imagen-4.0-generate-001")
 
 # Scheduler configuration (24h format, e.g., "09:00")
-SCHEDULE_TIME = os.getenv("SCHEDULE_TIME", "09:00")
+SCHEDULE_TIME: str = _str("SCHEDULE_TIME", "09:00")
+
+# Batch pipeline configuration (MODE=batch N=20)
+BATCH_SIZE: int = _int("N", 20)
+# Max items buffered between two consecutive stages
+PIPELINE_QUEUE_SIZE: int = _int("PIPELINE_QUEUE_SIZE", 2)
+# Per-stage concurrency limits
+TEXT_CONCURRENCY: int = _int("TEXT_CONCURRENCY", 2)
+IMAGE_CONCURRENCY: int = _int("IMAGE_CONCURRENCY", 1)
+PUBLISH_CONCURRENCY: int = _int("PUBLISH_CONCURRENCY", 1)
+
+# Publisher session pool: warm browser sessions and how many posts each one
+# serves before it is recycled
+PUBLISHER_POOL_SIZE: int = _int("PUBLISHER_POOL_SIZE", 1)
+PUBLISHER_MAX_USES: int = _int("PUBLISHER_MAX_USES", 20)
+
+# Publish flow: per-step timeouts in seconds. Unless auto submit is enabled the
+# post is left in the editor for review and the job waits for "发布成功".
+PUBLISH_AUTO_SUBMIT: bool = _bool("PUBLISH_AUTO_SUBMIT", False)
+PUBLISH_UPLOAD_TIMEOUT: float = _float("PUBLISH_UPLOAD_TIMEOUT", 120)
+PUBLISH_CONFIRM_TIMEOUT: float = _float("PUBLISH_CONFIRM_TIMEOUT", 3600)
+
+# Creator accounts to publish with, e.g. "alice,bob:900" (name[:min seconds
+# between posts]). Empty means the single default cookie file.
+XHS_ACCOUNTS: str = _str("XHS_ACCOUNTS", "")
+ACCOUNT_MIN_INTERVAL: float = _float("ACCOUNT_MIN_INTERVAL", 0)
+
+# Shared HTTP clients for text generation providers
+LLM_POOL_SIZE: int = _int("LLM_POOL_SIZE", 10)
+LLM_TIMEOUT: float = _float("LLM_TIMEOUT", 120)
+LLM_KEEPALIVE_EXPIRY: float = _float("LLM_KEEPALIVE_EXPIRY", 60)
+# Minimum seconds between requests per text provider, e.g. "cloudflare:0.5,hf:1"
+TEXT_PROVIDER_MIN_INTERVAL: str = _str("TEXT_PROVIDER_MIN_INTERVAL", "")
+
+# On-disk cache of generated content and images
+CACHE_ENABLED: bool = _bool("CACHE_ENABLED", True)
+CACHE_DIR: Path = _path("CACHE_DIR", Path(__file__).parent.parent / "output" / "cache")
+CACHE_MAX_MB: int = _int("CACHE_MAX_MB", 1024)
+# Fixed generation seed; set it to make reruns reproducible (and cache hits)
+GENERATION_SEED: Optional[int] = int(os.environ["GENERATION_SEED"]) if os.getenv("GENERATION_SEED") else None
+# Seed and combination of the post MODE=test/dev is working on, kept until it
+# is published so a rerun after a failure is served from the cache
+ATTEMPT_STATE_PATH: Path = _path("ATTEMPT_STATE_PATH", Path(__file__).parent.parent / "output" / "attempt.json")
+
+# Images per post (1-6) and how many of them are rendered at once
+IMAGES_PER_POST: int = _int("IMAGES_PER_POST", 1)
+IMAGE_WORKERS: int = _int("IMAGE_WORKERS", 6)
+
+# Upload encoding of generated images: format (jpeg, webp or png), quality and
+# longest side in pixels. In-memory images go straight to the upload form.
+IMAGE_FORMAT: str = _str("IMAGE_FORMAT", "jpeg").lower()
+IMAGE_QUALITY: int = _int("IMAGE_QUALITY", 90)
+IMAGE_MAX_DIMENSION: int = _int("IMAGE_MAX_DIMENSION", 2048)
+
+# Start rendering images as soon as the streamed text output holds a complete
+# image_prompt, while title and copy are still being generated
+IMAGE_EARLY_START: bool = _bool("IMAGE_EARLY_START", True)
+IMAGE_IN_MEMORY: bool = _bool("IMAGE_IN_MEMORY", True)
+
+# Text provider router: enabled providers (cloudflare, hf, hf-novita, gemini),
+# rolling stats window, hedge delay in seconds and error rate that marks a
+# provider unhealthy
+TEXT_PROVIDERS: str = _str("TEXT_PROVIDERS", "cloudflare,hf,hf-novita,gemini")
+ROUTER_WINDOW: int = _int("ROUTER_WINDOW", 50)
+ROUTER_HEDGE_AFTER: float = _float("ROUTER_HEDGE_AFTER", 20)
+ROUTER_MAX_ERROR_RATE: float = _float("ROUTER_MAX_ERROR_RATE", 0.5)
+
+# Durable job queue: SQLite file, worker threads, minimum seconds between two
+# publishes, lease of a claimed post and attempts before a post is failed
+JOB_DB_PATH: Path = _path("JOB_DB_PATH", Path(__file__).parent.parent / "output" / "jobs.sqlite3")
+JOB_WORKERS: int = _int("JOB_WORKERS", 1)
+JOB_PUBLISH_INTERVAL: float = _float("JOB_PUBLISH_INTERVAL", 0)
+JOB_LEASE_SECONDS: float = _float("JOB_LEASE_SECONDS", 7200)
+JOB_MAX_ATTEMPTS: int = _int("JOB_MAX_ATTEMPTS", 3)
+
+# Pre-generation buffer: posts kept ready to publish, refill period in minutes
+# and the hours the producer may run in (e.g. "1-7"; empty means any time)
+BUFFER_SIZE: int = _int("BUFFER_SIZE", 3)
+BUFFER_REFILL_MINUTES: int = _int("BUFFER_REFILL_MINUTES", 30)
+BUFFER_IDLE_HOURS: str = _str("BUFFER_IDLE_HOURS", "")
+
+# Near-duplicate detection against published posts: SQLite index, largest
+# Hamming distance (out of 64 bits) between text SimHashes and between image
+# dHashes that counts as a repeat, and text generations tried per post
+DEDUP_ENABLED: bool = _bool("DEDUP_ENABLED", True)
+DEDUP_DB_PATH: Path = _path("DEDUP_DB_PATH", Path(__file__).parent.parent / "output" / "dedup.sqlite3")
+DEDUP_TEXT_DISTANCE: int = _int("DEDUP_TEXT_DISTANCE", 3)
+DEDUP_IMAGE_DISTANCE: int = _int("DEDUP_IMAGE_DISTANCE", 5)
+DEDUP_MAX_TRIES: int = _int("DEDUP_MAX_TRIES", 3)
+
+# Usage counts of the style/mood/ethnicity/scene combinations posts were
+# generated with, so sampling keeps favouring the least covered ones
+SAMPLER_STATE_PATH: Path = _path("SAMPLER_STATE_PATH", Path(__file__).parent.parent / "output" / "sampler.json")
+
+# Service endpoints. Overridable so the pipeline can run against local
+# stand-ins (see benchmarks/). Without IMAGE_BASE_URL images go through the
+# Hugging Face inference provider.
+HF_BASE_URL: str = _str("HF_BASE_URL", "https://router.huggingface.co/v1")
+CLOUDFLARE_BASE_URL: str = _str(
+    "CLOUDFLARE_BASE_URL",
+    "https://api.cloudflare.com/client/v4/accounts/812985d5fdeac955ccfdb053fe794f93/ai/run",
+)
+IMAGE_BASE_URL: Optional[str] = os.getenv("IMAGE_BASE_URL")
+XHS_CREATOR_URL: str = _str("XHS_CREATOR_URL", "https://creator.xiaohongshu.com")
+
+# Session health monitor: seconds between validations of each account's
+# cookies, how long a validation lets publish skip the login probe, how long
+# before the session cookies expire to start alerting, the cheap request that
+# validates a session, the cookies that carry the login and an optional
+# webhook alerts are posted to
+SESSION_CHECK_INTERVAL: float = _float("SESSION_CHECK_INTERVAL", 1800)
+SESSION_TRUST_SECONDS: float = _float("SESSION_TRUST_SECONDS", 3600)
+SESSION_EXPIRY_WARNING: float = _float("SESSION_EXPIRY_WARNING", 3 * 86400)
+SESSION_CHECK_URL: str = _str("SESSION_CHECK_URL", f"{XHS_CREATOR_URL}/api/galaxy/user/info")
+SESSION_COOKIES: str = _str("SESSION_COOKIES", "web_session,galaxy_creator_session_id,customer-sso-sid")
+SESSION_ALERT_WEBHOOK: Optional[str] = os.getenv("SESSION_ALERT_WEBHOOK")
+
+# Metrics: every finished span is appended to METRICS_JSONL and the aggregates
+# are written in Prometheus text format to METRICS_PROM_FILE (e.g. for the node
+# exporter's textfile collector). An empty path disables that export.
+METRICS_DIR: Path = Path(__file__).parent.parent / "output" / "metrics"
+METRICS_JSONL: str = _str("METRICS_JSONL", str(METRICS_DIR / "spans.jsonl"))
+METRICS_PROM_FILE: str = _str("METRICS_PROM_FILE", str(METRICS_DIR / "autored.prom"))
@@ -1,12 +1,13 @@
-import subprocess
 import os
-import time
 import json
 import logging
 import shutil
-from datetime import datetime
-from publish_assistant import find_new_videos, clean_filename_for_title
+from publish_assistant import clean_filename_for_title
 from xiaohongshu_uploader import XiaohongshuUploader
+from media_catalog import MediaCatalog
+from upload_scheduler import UploadScheduler
+from media_prep import MediaPreparer, PREPARED_DIR, prepared_paths
+from ingest import download_channels
 
 # --- Configuration ---
 CONFIG_FILE = "config.json"
@@ -31,7 +32,14 @@ def load_config():
             "https://www.youtube.com/@The_FirstTake"
         ],
         "download_limit": 3,
-        "upload_delay": 300,  # 5 minutes between uploads
+        "max_parallel_downloads": 4,
+        "bandwidth_limit": "40M",  # total for all parallel downloads
+        "upload_delay": 300,  # 5 minutes between uploads per account
+        "upload_burst": 1,  # uploads an account may start back to back
+        "max_parallel_uploads": 2,
+        "prepare_media": True,  # transcode and build covers with ffmpeg before uploading
+        "media_prep_workers": None,  # defaults to the number of CPU cores
+        "xiaohongshu_accounts": ["xiaohongshu_config.json"],  # one config file per account
         "auto_upload": False,
         "hashtags": "#THEFIRSTTAKE #音乐现场 #JPOP #live",
         "enable_xiaohongshu_api": False
@@ -50,56 +58,24 @@ def load_config():
             json.dump(default_config, f, indent=2, ensure_ascii=False)
         return default_config
 
-def download_channel_videos(channel_url, download_limit):
-    """Download videos from a YouTube channel using yt-dlp."""
-    try:
-        command = [
-            "yt-dlp",
-            "-f", "bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best",
-            "-o", os.path.join(DOWNLOAD_DIR, "%(title)s.%(ext)s"),
-            "--download-archive", os.path.join(DOWNLOAD_DIR, "downloaded.txt"),
-            "--write-thumbnail",
-            "--limit-rate", "10M",
-            "--retries", "3",
-            "--fragment-retries", "3",
-            "--playlist-items", f"1-{download_limit}",
-            "--verbose",
-            channel_url
-        ]
-        
-        logging.info(f"Downloading from channel: {channel_url}")
-        
-        # Run within conda environment
-        conda_command = ["conda", "run", "-n", "web"] + command
-        result = subprocess.run(conda_command, capture_output=True, text=True, encoding='utf-8')
-        
-        if result.returncode == 0:
-            logging.info(f"Successfully downloaded videos from {channel_url}")
-            return True
-        else:
-            logging.error(f"Download failed: {result.stderr}")
-            return False
-            
-    except Exception as e:
-        logging.error(f"Error during download: {e}")
-        return False
-
-def upload_to_xiaohongshu(video_info, hashtags, config):
+def upload_to_xiaohongshu(video_info, hashtags, config, account=None):
     """Upload video to Xiaohongshu using API or manual process."""
     video_path = video_info["video_path"]
     filename = video_info["filename"]
-    thumbnail_path = video_info.get("thumbnail_path")
+    # Prefer the transcoded video and cover from the preparation stage
+    upload_path = video_info.get("upload_path", video_path)
+    cover_path = video_info.get("cover_path") or video_info.get("thumbnail_path")
     
     title = clean_filename_for_title(filename)
     caption = f"{title}\n\n{hashtags}"
     
     logging.info(f"Preparing to upload: {title}")
-    logging.info(f"Video file: {video_path}")
+    logging.info(f"Video file: {upload_path}")
     
     if config.get("enable_xiaohongshu_api", False):
         # Use API upload
         try:
-            uploader = XiaohongshuUploader()
+            uploader = XiaohongshuUploader(account) if account else XiaohongshuUploader()
             
             if not uploader.is_authenticated():
                 logging.warning("Xiaohongshu API not authenticated, falling back to manual process")
@@ -109,15 +85,15 @@ def upload_to_xiaohongshu(video_info, hashtags, config):
             tags = [tag.strip() for tag in hashtags.split("#") if tag.strip()]
             
             result = uploader.upload_video(
-                video_path=video_path,
+                video_path=upload_path,
                 title=title,
                 description=caption,
                 tags=tags,
-                cover_path=thumbnail_path
+                cover_path=cover_path
             )
             
             if result["success"]:
-                move_to_uploaded(video_info)
+                move_to_uploaded(video_info, config)
                 logging.info(f"✅ API upload successful: {title}")
                 return True
             else:
@@ -139,9 +115,10 @@ def manual_upload_process(video_info, caption, config):
     
     print("\n" + "="*50)
     print(f"🎬 准备手动上传: {title}")
-    print(f"📁 视频文件: {video_path}")
-    if video_info.get("thumbnail_path"):
-        print(f"🖼️  封面文件: {video_info['thumbnail_path']}")
+    print(f"📁 视频文件: {video_info.get('upload_path', video_path)}")
+    cover_path = video_info.get("cover_path") or video_info.get("thumbnail_path")
+    if cover_path:
+        print(f"🖼️  封面文件: {cover_path}")
     print("\n📝 文案内容:")
     print(caption)
     print("="*50)
@@ -149,14 +126,14 @@ def manual_upload_process(video_info, caption, config):
     # For manual process, we'll just move the file and log
     # In a real implementation, you might open the upload page
     try:
-        move_to_uploaded(video_info)
+        move_to_uploaded(video_info, config)
         logging.info(f"✅ Manual upload process completed for: {title}")
         return True
     except Exception as e:
         logging.error(f"Manual upload process error: {e}")
         return False
 
-def move_to_uploaded(video_info):
+def move_to_uploaded(video_info, config=None):
     """Move processed files to uploaded directory."""
     os.makedirs(UPLOADED_DIR, exist_ok=True)
     
@@ -167,6 +144,12 @@ def move_to_uploaded(video_info):
     thumbnail_path = video_info.get("thumbnail_path")
     if thumbnail_path and os.path.exists(thumbnail_path):
         shutil.move(thumbnail_path, UPLOADED_DIR)
+    
+    # The prepared copies are only kept to retry failed uploads
+    prepared_dir = (config or {}).get("prepared_dir", PREPARED_DIR)
+    for path in prepared_paths(video_info, prepared_dir):
+        if os.path.exists(path):
+            os.remove(path)
 
 def main():
     """Main automation function."""
@@ -174,30 +157,57 @@ def main():
     
     config = load_config()
     
-    # Download videos from all configured channels
-    for channel_url in config["youtube_channels"]:
-        success = download_channel_videos(channel_url, config["download_limit"])
-        if not success:
-            logging.warning(f"Failed to download from {channel_url}, skipping upload")
-            continue
+    catalog = MediaCatalog()
+    submitted = set()
     
-    # Find and process new videos
-    videos_to_process = find_new_videos()
+    def upload(video_info, account):
+        success = upload_to_xiaohongshu(video_info, config["hashtags"], config, account=account)
+        if success:
+            catalog.mark_uploaded(video_info["video_path"])
+        else:
+            catalog.mark_failed(video_info["video_path"], "upload failed")
+        return success
     
-    if not videos_to_process:
-        logging.info("No new videos found to process")
-        return
+    scheduler = UploadScheduler(
+        upload,
+        accounts=config.get("xiaohongshu_accounts") or [None],
+        interval=config["upload_delay"],
+        burst=config.get("upload_burst", 1),
+        workers=config.get("max_parallel_uploads", 2)
+    ).start()
+    preparer = MediaPreparer(config)
+    
+    def enqueue_pending(files=None):
+        # Index new downloads, prepare the ones not uploaded yet and queue them for upload.
+        # While channels download in parallel only a finished channel's own files are
+        # indexed, never another channel's half-written ones.
+        if files is None:
+            catalog.sync()
+        else:
+            catalog.add(files)
+        for video_info in catalog.pending():
+            if video_info["video_path"] not in submitted:
+                submitted.add(video_info["video_path"])
+                preparer.submit(video_info, scheduler.submit)
     
-    logging.info(f"Found {len(videos_to_process)} new videos to process")
+    def on_channel_done(channel_url, success, files):
+        if not success:
+            logging.warning(f"Failed to download from {channel_url}")
+        enqueue_pending(files)
+    
+    # Upload what is already downloaded while the channels are fetched in parallel
+    enqueue_pending()
+    download_channels(config["youtube_channels"], config, on_complete=on_channel_done)
     
-    # Process each video
-    for video_info in videos_to_process:
-        success = upload_to_xiaohongshu(video_info, config["hashtags"], config)
-        
-        if success and config["upload_delay"] > 0:
-            logging.info(f"Waiting {config['upload_delay']} seconds before next upload...")
-            time.sleep(config["upload_delay"])
+    if not submitted:
+        logging.info("No new videos found to process")
+    else:
+        logging.info(f"Queued {len(submitted)} new videos, waiting for uploads to finish")
+    preparer.close()
+    scheduler.close()
     
+    logging.info(f"Catalog status: {catalog.counts()}")
+    catalog.close()
     logging.info("=== Auto Uploader completed ===")
 
 if __name__ == "__main__":
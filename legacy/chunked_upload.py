@@ -0,0 +1,243 @@
+import os
+import json
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+DEFAULT_WORKERS = 4
+PROGRESS_SUFFIX = ".upload.json"
+
+
+class UploadError(Exception):
+    """Raised when a chunked upload cannot be completed."""
+
+
+class UploadExpired(UploadError):
+    """The server no longer knows the upload id; it has to start over."""
+
+
+class ChunkedUploader:
+    """Upload a file in parts over HTTP, concurrently and resumably.
+
+    Protocol, relative to ``base_url``:
+        POST /api/media/upload/init              -> {"data": {"upload_id": ...}}
+        PUT  /api/media/upload/<id>/parts/<n>    raw bytes of part n
+        POST /api/media/upload/<id>/complete     -> {"data": {"id": media_id}}
+
+    Servers without the chunked endpoints (``init`` answers 404 or 405) get
+    the whole file in a single multipart ``POST /api/media/upload`` instead.
+
+    Each part is read from disk with seek/read when it is sent, so at most
+    ``workers`` parts are held in memory. Finished parts are recorded in a
+    progress file next to the video; after a crash the upload continues with
+    the missing parts only.
+    """
+
+    def __init__(self, base_url, headers=None, session=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                 workers=DEFAULT_WORKERS, max_retries=3, timeout=60, retry_delay=1.0):
+        self.base_url = base_url.rstrip("/")
+        self.headers = dict(headers or {})
+        self.chunk_size = chunk_size
+        self.workers = max(1, workers)
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.retry_delay = retry_delay
+        # Cleared once the server turned out not to support chunked uploads.
+        self.chunked = True
+        self.session = session or requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    # --- Progress persistence ---
+
+    @staticmethod
+    def progress_path(file_path):
+        return file_path + PROGRESS_SUFFIX
+
+    def _load_progress(self, file_path, size, mtime):
+        path = self.progress_path(file_path)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                progress = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable upload progress {path}: {e}")
+            return None
+        # A changed file or chunk size invalidates the recorded parts.
+        if (progress.get("size"), progress.get("mtime"), progress.get("chunk_size")) != (size, mtime, self.chunk_size):
+            logging.info(f"File changed since last attempt, restarting upload: {file_path}")
+            return None
+        return progress
+
+    def _save_progress(self, file_path, progress):
+        path = self.progress_path(file_path)
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(progress, f)
+        os.replace(tmp, path)
+
+    def _clear_progress(self, file_path):
+        try:
+            os.remove(self.progress_path(file_path))
+        except FileNotFoundError:
+            pass
+
+    # --- HTTP ---
+
+    def _request(self, method, path, headers=None, **kwargs):
+        """Send a request, retrying connection errors and 5xx/429 responses."""
+        url = f"{self.base_url}{path}"
+        headers = {**self.headers, **(headers or {})}
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                response = self.session.request(method, url, headers=headers, timeout=self.timeout, **kwargs)
+            except requests.RequestException as e:
+                error = str(e)
+            else:
+                if response.status_code < 500 and response.status_code != 429:
+                    return response
+                error = f"HTTP {response.status_code}"
+            if attempt < self.max_retries:
+                logging.warning(f"{method} {path} failed ({error}), retry {attempt}/{self.max_retries - 1}")
+                time.sleep(self.retry_delay * 2 ** (attempt - 1))
+        raise UploadError(f"{method} {path} failed after {self.max_retries} attempts: {error}")
+
+    def _json(self, response, what):
+        if response.status_code != 200:
+            raise UploadError(f"{what} failed: HTTP {response.status_code} - {response.text}")
+        result = response.json()
+        if result.get("success") is False:
+            raise UploadError(f"{what} failed: {result.get('message', 'Unknown error')}")
+        return result.get("data", {})
+
+    def _init_upload(self, file_path, size, content_type):
+        """Start a chunked upload; None if the server does not support them."""
+        response = self._request("POST", "/api/media/upload/init", json={
+            "filename": os.path.basename(file_path),
+            "size": size,
+            "chunk_size": self.chunk_size,
+            "content_type": content_type,
+        })
+        if response.status_code in (404, 405):
+            logging.info(f"Chunked upload not supported (HTTP {response.status_code}), "
+                         f"falling back to a single upload")
+            self.chunked = False
+            return None
+        data = self._json(response, "Upload init")
+        if not data.get("upload_id"):
+            raise UploadError("No upload_id in init response")
+        return data["upload_id"]
+
+    def _send_part(self, file_path, upload_id, index, size):
+        start = index * self.chunk_size
+        with open(file_path, 'rb') as f:
+            f.seek(start)
+            chunk = f.read(self.chunk_size)
+        end = start + len(chunk) - 1
+        response = self._request(
+            "PUT", f"/api/media/upload/{upload_id}/parts/{index}", data=chunk,
+            headers={"Content-Range": f"bytes {start}-{end}/{size}",
+                     "Content-Type": "application/octet-stream"}
+        )
+        if response.status_code == 404:
+            raise UploadExpired(f"Upload {upload_id} expired on the server")
+        if response.status_code != 200:
+            raise UploadError(f"Part {index} rejected: HTTP {response.status_code} - {response.text}")
+        return len(chunk)
+
+    def _upload_single(self, file_path, size, content_type):
+        """Send the whole file in one request (servers without chunked uploads)."""
+        start = time.monotonic()
+        with open(file_path, 'rb') as f:
+            response = self.session.post(
+                f"{self.base_url}/api/media/upload",
+                files={"file": (os.path.basename(file_path), f, content_type)},
+                headers=self.headers,
+                timeout=self.timeout
+            )
+        media_id = self._json(response, "Upload").get("id")
+        if not media_id:
+            raise UploadError("No media ID in upload response")
+        return self._result(file_path, media_id, size, time.monotonic() - start)
+
+    @staticmethod
+    def _result(file_path, media_id, sent, elapsed):
+        throughput = sent / 1024 / 1024 / max(elapsed, 1e-6)
+        logging.info(f"Uploaded {os.path.basename(file_path)}: {sent} bytes in {elapsed:.1f}s ({throughput:.2f} MB/s)")
+        return {"media_id": media_id, "bytes": sent, "seconds": elapsed, "throughput_mbps": throughput}
+
+    # --- Public API ---
+
+    def upload(self, file_path, content_type="video/mp4"):
+        """Upload `file_path` and return the server's media id.
+
+        Returns:
+            dict with media_id, bytes, seconds and throughput in MB/s.
+        """
+        stat = os.stat(file_path)
+        size, mtime = stat.st_size, stat.st_mtime_ns
+        total_parts = max(1, -(-size // self.chunk_size))
+
+        if not self.chunked:
+            return self._upload_single(file_path, size, content_type)
+
+        progress = self._load_progress(file_path, size, mtime)
+        if progress is None:
+            upload_id = self._init_upload(file_path, size, content_type)
+            if upload_id is None:
+                return self._upload_single(file_path, size, content_type)
+            progress = {
+                "upload_id": upload_id,
+                "size": size,
+                "mtime": mtime,
+                "chunk_size": self.chunk_size,
+                "parts": [],
+            }
+            self._save_progress(file_path, progress)
+        else:
+            logging.info(f"Resuming upload {progress['upload_id']}: "
+                         f"{len(progress['parts'])}/{total_parts} parts already sent")
+
+        upload_id = progress["upload_id"]
+        done = set(progress["parts"])
+        missing = [i for i in range(total_parts) if i not in done]
+
+        start = time.monotonic()
+        sent = 0
+        failed = None
+        if missing:
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(missing))) as executor:
+                futures = {executor.submit(self._send_part, file_path, upload_id, i, size): i for i in missing}
+                for future in as_completed(futures):
+                    index = futures[future]
+                    try:
+                        sent += future.result()
+                    except UploadError as e:
+                        # Keep recording the parts still in flight so a
+                        # resumed upload does not send them again.
+                        failed = failed or e
+                        continue
+                    done.add(index)
+                    progress["parts"] = sorted(done)
+                    self._save_progress(file_path, progress)
+                    elapsed = time.monotonic() - start
+                    logging.info(f"Uploaded part {len(done)}/{total_parts} "
+                                 f"({sent / 1024 / 1024 / max(elapsed, 1e-6):.2f} MB/s)")
+            if failed:
+                if isinstance(failed, UploadExpired):
+                    self._clear_progress(file_path)
+                raise failed
+
+        data = self._json(self._request("POST", f"/api/media/upload/{upload_id}/complete",
+                                        json={"parts": total_parts}), "Upload complete")
+        media_id = data.get("id")
+        if not media_id:
+            raise UploadError("No media ID in complete response")
+        self._clear_progress(file_path)
+        return self._result(file_path, media_id, sent, time.monotonic() - start)
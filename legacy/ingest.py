@@ -0,0 +1,153 @@
+import os
+import re
+import sys
+import shutil
+import logging
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# --- Configuration ---
+DOWNLOAD_DIR = "downloads"
+ARCHIVE_FILE = os.path.join(DOWNLOAD_DIR, "downloaded.txt")
+
+_RATE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+_PROGRESS_RE = re.compile(r"\[download\]\s+(\d+(?:\.\d+)?)%")
+
+
+def parse_rate(rate):
+    """Convert a yt-dlp style rate such as '10M' or '512K' into bytes/s."""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMG]?)i?B?\s*", str(rate), re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Invalid rate: {rate}")
+    return int(float(match.group(1)) * _RATE_UNITS[match.group(2).upper()])
+
+
+def yt_dlp_command(config):
+    """Locate yt-dlp once: an explicit path, the binary on PATH, or the module
+    installed in the current interpreter. No conda wrapper per call."""
+    if config.get("yt_dlp_path"):
+        return [config["yt_dlp_path"]]
+    binary = shutil.which("yt-dlp")
+    if binary:
+        return [binary]
+    return [sys.executable, "-m", "yt_dlp"]
+
+
+def build_command(base_command, channel_url, download_limit, rate_limit, done_file=None):
+    # yt-dlp appends the final path of every finished video to `done_file`
+    done = ["--print-to-file", "after_move:filepath", done_file] if done_file else []
+    return base_command + done + [
+        "-f", "bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best",
+        "-o", os.path.join(DOWNLOAD_DIR, "%(title)s.%(ext)s"),
+        "--download-archive", ARCHIVE_FILE,
+        "--write-thumbnail",
+        "--limit-rate", str(rate_limit),
+        "--retries", "3",
+        "--fragment-retries", "3",
+        # Resume partially downloaded files instead of starting over
+        "--continue",
+        "--part",
+        # One progress line per update so it can be streamed
+        "--newline",
+        "--playlist-items", f"1-{download_limit}",
+        channel_url
+    ]
+
+
+def download_channel(base_command, channel_url, download_limit, rate_limit, files=None):
+    """Download one channel, streaming yt-dlp's output line by line.
+
+    The paths of the videos this run finished (merged and moved into place)
+    are appended to `files` when given.
+    """
+    done_file = None
+    if files is not None:
+        fd, done_file = tempfile.mkstemp(prefix="ytdlp-done-", suffix=".txt")
+        os.close(fd)
+    try:
+        return _run_download(build_command(base_command, channel_url, download_limit, rate_limit, done_file),
+                             channel_url, rate_limit)
+    finally:
+        if done_file:
+            with open(done_file, encoding='utf-8', errors='replace') as f:
+                files.extend(line.strip() for line in f if line.strip())
+            os.remove(done_file)
+
+
+def _run_download(command, channel_url, rate_limit):
+    logging.info(f"Downloading from channel: {channel_url} (limit {rate_limit} B/s)")
+
+    try:
+        process = subprocess.Popen(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            encoding='utf-8',
+            errors='replace'
+        )
+    except OSError as e:
+        logging.error(f"Could not start yt-dlp for {channel_url}: {e}")
+        return False
+
+    last_logged = -10.0
+    tail = []
+    for line in process.stdout:
+        line = line.rstrip()
+        if not line:
+            continue
+        tail = (tail + [line])[-20:]
+        progress = _PROGRESS_RE.search(line)
+        if progress:
+            # Log progress in 10% steps; a new file restarts at 0%.
+            percent = float(progress.group(1))
+            if percent < last_logged or percent - last_logged >= 10:
+                last_logged = percent
+                logging.info(f"[{channel_url}] {line}")
+        elif line.startswith(("[download] Destination", "ERROR", "WARNING")):
+            logging.info(f"[{channel_url}] {line}")
+
+    if process.wait() == 0:
+        logging.info(f"Successfully downloaded videos from {channel_url}")
+        return True
+    logging.error(f"Download failed for {channel_url}: " + "\n".join(tail))
+    return False
+
+
+def download_channels(channel_urls, config, on_complete=None):
+    """Download several channels concurrently within one bandwidth budget.
+
+    The total budget (config 'bandwidth_limit') is split evenly across the
+    parallel downloads, so the sum never exceeds it however many run at once.
+    `on_complete(channel_url, success, files)` is called as each channel
+    finishes with the videos it finished, so they can be handled while the
+    others are still downloading.
+
+    Returns:
+        dict mapping channel URL to True/False success.
+    """
+    if not channel_urls:
+        return {}
+    os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+    workers = max(1, min(config.get("max_parallel_downloads", 4), len(channel_urls)))
+    budget = parse_rate(config.get("bandwidth_limit", "40M"))
+    rate_limit = max(1, budget // workers)
+    base_command = yt_dlp_command(config)
+    download_limit = config.get("download_limit", 3)
+
+    logging.info(f"Downloading {len(channel_urls)} channels with {workers} workers, "
+                 f"{budget} B/s total bandwidth")
+    results = {}
+    files = {url: [] for url in channel_urls}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(download_channel, base_command, url, download_limit, rate_limit, files[url]): url
+            for url in channel_urls
+        }
+        for future in as_completed(futures):
+            url = futures[future]
+            results[url] = future.result()
+            if on_complete:
+                on_complete(url, results[url], files[url])
+    return results
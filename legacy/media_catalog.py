@@ -0,0 +1,221 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+from publish_assistant import clean_filename_for_title
+
+# --- Configuration ---
+DOWNLOAD_DIR = "downloads"
+# Kept outside DOWNLOAD_DIR so catalog writes do not change the directory's mtime
+CATALOG_FILE = "media_catalog.sqlite3"
+
+VIDEO_EXTENSIONS = ('.mp4', '.mkv', '.webm', '.mov')
+THUMBNAIL_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+# Files yt-dlp is still writing: per-format parts before merging ("x.f137.mp4"),
+# the merge output ("x.temp.mp4") and partial downloads ("x.mp4.part", "x.mp4.ytdl")
+_INCOMPLETE_RE = re.compile(r"\.f\d+\.\w+$|\.temp\.\w+$|\.(part|ytdl)(-Frag\d+)?$", re.IGNORECASE)
+
+# Upload states
+STATUS_NEW = "new"
+STATUS_UPLOADED = "uploaded"
+STATUS_FAILED = "failed"
+# Failed uploads are retried until they failed this many times
+MAX_UPLOAD_ATTEMPTS = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS media (
+    video_path TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    thumbnail_path TEXT,
+    title TEXT,
+    size INTEGER,
+    hash TEXT,
+    status TEXT NOT NULL DEFAULT 'new',
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    added_at REAL NOT NULL,
+    uploaded_at REAL
+);
+CREATE INDEX IF NOT EXISTS media_status ON media (status, added_at);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def is_video(name):
+    """True for a finished video file name."""
+    return name.lower().endswith(VIDEO_EXTENSIONS) and not _INCOMPLETE_RE.search(name)
+
+
+def quick_hash(path, chunk_size=1024 * 1024):
+    """Cheap content fingerprint: file size plus the first and last MiB."""
+    size = os.path.getsize(path)
+    digest = hashlib.sha256(str(size).encode())
+    with open(path, 'rb') as f:
+        digest.update(f.read(chunk_size))
+        if size > chunk_size:
+            f.seek(max(chunk_size, size - chunk_size))
+            digest.update(f.read(chunk_size))
+    return digest.hexdigest()
+
+
+class MediaCatalog:
+    """Persistent index of downloaded videos and their upload status.
+
+    The download directory is only rescanned when its modification time
+    changed (a file was added, renamed or removed), and then in a single
+    directory listing. Finding the next videos to upload is an indexed query.
+    """
+
+    def __init__(self, db_path=CATALOG_FILE, download_dir=DOWNLOAD_DIR, max_attempts=MAX_UPLOAD_ATTEMPTS):
+        self.download_dir = download_dir
+        self.max_attempts = max_attempts
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def _meta(self, key):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def _set_meta(self, key, value):
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def sync(self, force=False):
+        """Index new files in the download directory. Returns the number added."""
+        if not os.path.isdir(self.download_dir):
+            return 0
+        dir_mtime = os.stat(self.download_dir).st_mtime_ns
+        with self._lock:
+            if not force and self._meta("dir_mtime") == str(dir_mtime):
+                return 0
+
+            entries = {e.name: e for e in os.scandir(self.download_dir) if e.is_file()}
+            known = {row["video_path"]: row for row in self._conn.execute(
+                "SELECT video_path, thumbnail_path, status FROM media")}
+
+            added = 0
+            self._conn.execute("BEGIN")
+            try:
+                for name, entry in entries.items():
+                    if not is_video(name):
+                        continue
+                    video_path = os.path.join(self.download_dir, name)
+                    thumbnail_path = self._find_thumbnail(name, entries)
+                    row = known.get(video_path)
+                    if row is None:
+                        self._insert(video_path, thumbnail_path, entry.stat().st_size)
+                        added += 1
+                    elif row["thumbnail_path"] is None and thumbnail_path:
+                        # Thumbnail arrived after the video was indexed
+                        self._conn.execute("UPDATE media SET thumbnail_path = ? WHERE video_path = ?",
+                                           (thumbnail_path, video_path))
+
+                # Forget pending videos whose files were removed by hand
+                for video_path, row in known.items():
+                    if row["status"] != STATUS_UPLOADED and os.path.basename(video_path) not in entries:
+                        self._conn.execute("DELETE FROM media WHERE video_path = ?", (video_path,))
+
+                self._set_meta("dir_mtime", dir_mtime)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        if added:
+            logging.info(f"Catalog indexed {added} new video(s)")
+        return added
+
+    def add(self, video_paths):
+        """Index specific finished downloads, e.g. the files one channel just
+        completed, without rescanning the directory other channels are still
+        writing to. Returns the number added."""
+        added = 0
+        with self._lock:
+            for path in video_paths:
+                name = os.path.basename(path)
+                video_path = os.path.join(self.download_dir, name)
+                if not is_video(name) or not os.path.isfile(video_path):
+                    continue
+                if self._conn.execute("SELECT 1 FROM media WHERE video_path = ?", (video_path,)).fetchone():
+                    continue
+                base_name = os.path.splitext(video_path)[0]
+                thumbnail_path = next((base_name + ext for ext in THUMBNAIL_EXTENSIONS
+                                       if os.path.isfile(base_name + ext)), None)
+                self._insert(video_path, thumbnail_path, os.path.getsize(video_path))
+                added += 1
+        if added:
+            logging.info(f"Catalog indexed {added} new video(s)")
+        return added
+
+    def _insert(self, video_path, thumbnail_path, size):
+        name = os.path.basename(video_path)
+        self._conn.execute(
+            "INSERT INTO media (video_path, filename, thumbnail_path, title, size, hash, added_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (video_path, name, thumbnail_path, clean_filename_for_title(name),
+             size, quick_hash(video_path), time.time())
+        )
+
+    @staticmethod
+    def _find_thumbnail(video_name, entries):
+        base_name = os.path.splitext(video_name)[0]
+        for ext in THUMBNAIL_EXTENSIONS:
+            if base_name + ext in entries:
+                return entries[base_name + ext].path
+        return None
+
+    def pending(self, limit=None):
+        """Videos not uploaded yet, oldest first, as video_info dicts.
+
+        Includes failed uploads until they have failed `max_attempts` times, so
+        a transient error does not drop a video for good.
+        """
+        query = ("SELECT * FROM media WHERE status = ? OR (status = ? AND attempts < ?) "
+                 "ORDER BY added_at")
+        params = [STATUS_NEW, STATUS_FAILED, self.max_attempts]
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [
+            {
+                "video_path": row["video_path"],
+                "thumbnail_path": row["thumbnail_path"],
+                "filename": row["filename"],
+                "title": row["title"],
+                "hash": row["hash"],
+            }
+            for row in rows
+        ]
+
+    def mark_uploaded(self, video_path):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE media SET status = ?, error = NULL, uploaded_at = ? WHERE video_path = ?",
+                (STATUS_UPLOADED, time.time(), video_path)
+            )
+
+    def mark_failed(self, video_path, error):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE media SET status = ?, error = ?, attempts = attempts + 1 WHERE video_path = ?",
+                (STATUS_FAILED, str(error), video_path)
+            )
+
+    def counts(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) AS n FROM media GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    def close(self):
+        self._conn.close()
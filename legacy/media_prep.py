@@ -0,0 +1,153 @@
+import os
+import shutil
+import logging
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+from media_catalog import quick_hash
+
+# --- Configuration ---
+PREPARED_DIR = "prepared"
+MAX_DIMENSION = 1920  # longest side of uploaded videos and covers
+VIDEO_CRF = 23
+VIDEO_MAXRATE = "8M"
+AUDIO_BITRATE = "128k"
+
+
+def find_ffmpeg(config):
+    return config.get("ffmpeg_path") or shutil.which("ffmpeg")
+
+
+def _scale_filter(max_dimension):
+    # Shrink the longest side to max_dimension (never upscale), keep even sizes for x264
+    return (f"scale='if(gt(iw,ih),min({max_dimension},iw),-2)'"
+            f":'if(gt(iw,ih),-2,min({max_dimension},ih))'")
+
+
+def transcode_command(ffmpeg, source, target, max_dimension=MAX_DIMENSION, threads=0):
+    return [
+        ffmpeg, "-y", "-loglevel", "error",
+        "-i", source,
+        "-vf", _scale_filter(max_dimension),
+        "-c:v", "libx264", "-preset", "veryfast", "-crf", str(VIDEO_CRF),
+        "-maxrate", VIDEO_MAXRATE, "-bufsize", "16M", "-pix_fmt", "yuv420p",
+        "-c:a", "aac", "-b:a", AUDIO_BITRATE,
+        "-movflags", "+faststart",
+        "-threads", str(threads),
+        "-f", "mp4", target
+    ]
+
+
+def cover_command(ffmpeg, source, target, from_video, max_dimension=MAX_DIMENSION):
+    """Convert the thumbnail to JPEG, or grab the first keyframe after 1s of the video."""
+    seek = ["-skip_frame", "nokey", "-ss", "1"] if from_video else []
+    return [
+        ffmpeg, "-y", "-loglevel", "error",
+        *seek, "-i", source,
+        "-frames:v", "1",
+        "-vf", _scale_filter(max_dimension),
+        "-q:v", "2",
+        "-f", "image2", target
+    ]
+
+
+def _run(build, target):
+    """Run ffmpeg into a temporary file and move it into place when complete.
+
+    `build` is called with the temporary path and returns the command.
+    """
+    tmp = target + ".part"
+    result = subprocess.run(build(tmp), capture_output=True, text=True, errors='replace')
+    if result.returncode != 0:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise RuntimeError(result.stderr.strip()[-500:] or f"ffmpeg exited with {result.returncode}")
+    os.replace(tmp, target)
+
+
+def prepare_video(video_path, thumbnail_path, source_hash, ffmpeg, output_dir=PREPARED_DIR,
+                  max_dimension=MAX_DIMENSION, threads=0):
+    """Transcode one video and build its cover. Runs in a worker process.
+
+    Outputs are named after the source hash, so a video that was already
+    prepared (e.g. before a failed upload) is not transcoded again.
+
+    Returns:
+        (upload_path, cover_path)
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    upload_path = os.path.join(output_dir, f"{source_hash}.mp4")
+    cover_path = os.path.join(output_dir, f"{source_hash}.jpg")
+
+    if not os.path.exists(upload_path):
+        _run(lambda tmp: transcode_command(ffmpeg, video_path, tmp, max_dimension, threads), upload_path)
+    if not os.path.exists(cover_path):
+        from_video = not (thumbnail_path and os.path.exists(thumbnail_path))
+        source = video_path if from_video else thumbnail_path
+        _run(lambda tmp: cover_command(ffmpeg, source, tmp, from_video, max_dimension), cover_path)
+    return upload_path, cover_path
+
+
+def prepared_paths(video_info, output_dir=PREPARED_DIR):
+    """Files created for a video by prepare_video, if any."""
+    source_hash = video_info.get("hash")
+    if not source_hash:
+        return []
+    return [os.path.join(output_dir, f"{source_hash}{ext}") for ext in (".mp4", ".jpg")]
+
+
+class MediaPreparer:
+    """Prepare videos for upload in a process pool.
+
+    Each finished video is handed to a callback together with its upload
+    path and cover, so uploads start while other videos are still being
+    transcoded. Without ffmpeg, or when preparation fails, the original
+    files are passed through unchanged.
+    """
+
+    def __init__(self, config):
+        self.ffmpeg = find_ffmpeg(config)
+        self.output_dir = config.get("prepared_dir", PREPARED_DIR)
+        self.max_dimension = config.get("max_video_dimension", MAX_DIMENSION)
+        cores = os.cpu_count() or 1
+        self.workers = max(1, config.get("media_prep_workers") or cores)
+        # Split the cores between the parallel ffmpeg processes
+        self.threads = max(1, cores // self.workers)
+        self.enabled = config.get("prepare_media", True) and bool(self.ffmpeg)
+        self._executor = None
+        if config.get("prepare_media", True) and not self.ffmpeg:
+            logging.warning("ffmpeg not found, uploading videos as downloaded")
+
+    def submit(self, video_info, callback):
+        """Prepare `video_info` and call `callback(video_info)` with the result."""
+        if not self.enabled:
+            callback(video_info)
+            return
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+
+        source_hash = video_info.get("hash") or quick_hash(video_info["video_path"])
+        video_info = dict(video_info, hash=source_hash)
+        future = self._executor.submit(
+            prepare_video, video_info["video_path"], video_info.get("thumbnail_path"), source_hash,
+            self.ffmpeg, self.output_dir, self.max_dimension, self.threads
+        )
+
+        def done(future):
+            try:
+                upload_path, cover_path = future.result()
+            except Exception as e:
+                logging.error(f"Preparing {video_info['filename']} failed, uploading original: {e}")
+                callback(video_info)
+                return
+            logging.info(f"Prepared {video_info['filename']}: "
+                         f"{os.path.getsize(video_info['video_path'])} -> {os.path.getsize(upload_path)} bytes")
+            callback(dict(video_info, upload_path=upload_path, cover_path=cover_path))
+
+        future.add_done_callback(done)
+
+    def close(self):
+        """Wait for all submitted videos to be prepared."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
@@ -30,16 +30,18 @@ def find_new_videos():
     video_extensions = ('.mp4', '.mkv', '.webm', '.mov')
     thumbnail_extensions = ('.jpg', '.jpeg', '.png', '.webp')
 
-    for item in os.listdir(DOWNLOAD_DIR):
+    items = os.listdir(DOWNLOAD_DIR)
+    # Look thumbnails up in the listing instead of probing the disk per extension
+    names = set(items)
+    for item in items:
         item_path = os.path.join(DOWNLOAD_DIR, item)
-        if os.path.isfile(item_path) and item.lower().endswith(video_extensions):
+        if item.lower().endswith(video_extensions) and os.path.isfile(item_path):
             # Find matching thumbnail
             base_name = os.path.splitext(item)[0]
             thumbnail_path = None
             for ext in thumbnail_extensions:
-                potential_thumb = os.path.join(DOWNLOAD_DIR, base_name + ext)
-                if os.path.exists(potential_thumb):
-                    thumbnail_path = potential_thumb
+                if base_name + ext in names:
+                    thumbnail_path = os.path.join(DOWNLOAD_DIR, base_name + ext)
                     break
             
             new_videos.append({
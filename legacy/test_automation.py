@@ -11,6 +11,13 @@ from unittest.mock import patch, MagicMock
 
 # Add current directory to Python path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+# The generator package (src, config) lives one level up
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+# Spans recorded by the tests stay out of the real metrics files
+os.environ.setdefault("METRICS_JSONL", "")
+os.environ.setdefault("METRICS_PROM_FILE", "")
 
 def test_config_loading():
     """Test configuration loading functionality."""
@@ -87,6 +94,843 @@ def test_video_discovery():
     
     print("✅ Video discovery test passed")
 
+def test_parallel_ingestion():
+    """Test that channels download in parallel within the bandwidth budget."""
+    print("Testing parallel ingestion...")
+    
+    from ingest import parse_rate, download_channels
+    
+    assert parse_rate("10M") == 10 * 1024 * 1024
+    assert parse_rate("512K") == 512 * 1024
+    
+    config = {"max_parallel_downloads": 4, "bandwidth_limit": "40M", "download_limit": 2}
+    channels = [f"https://www.youtube.com/@channel{i}" for i in range(6)]
+    
+    with patch('ingest.download_channel') as mock_download, \
+         patch('os.makedirs'):
+        def fake_download(cmd, url, limit, rate, files):
+            files.append(f"downloads/{url.rsplit('@', 1)[-1]}.mp4")
+            return not url.endswith("5")
+        mock_download.side_effect = fake_download
+        finished = {}
+        results = download_channels(channels, config,
+                                    on_complete=lambda url, ok, files: finished.update({url: files}))
+    
+    assert len(results) == 6, f"Expected 6 results, got {len(results)}"
+    assert results[channels[5]] is False, "channel5 should have failed"
+    rates = {call.args[3] for call in mock_download.call_args_list}
+    assert rates == {10 * 1024 * 1024}, f"Budget not split across 4 workers: {rates}"
+    assert finished[channels[0]] == ["downloads/channel0.mp4"], "Each channel reports only its own files"
+    
+    print("✅ Parallel ingestion test passed")
+
+def test_media_catalog():
+    """Test incremental indexing and upload tracking of the media catalog."""
+    print("Testing media catalog...")
+    
+    import tempfile
+    from media_catalog import MediaCatalog
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        download_dir = os.path.join(tmp, "downloads")
+        os.makedirs(download_dir)
+        for name in ("video1.mp4", "video1.webp", "video2.mkv", "video3.f137.mp4", "video4.temp.mp4",
+                     "video5.mp4.part", "video5.mp4.ytdl", "notes.txt"):
+            with open(os.path.join(download_dir, name), "wb") as f:
+                f.write(b"data")
+        
+        catalog = MediaCatalog(os.path.join(tmp, "catalog.sqlite3"), download_dir)
+        assert catalog.sync() == 2, "Expected 2 indexed videos"
+        assert catalog.sync() == 0, "Unchanged directory should not be rescanned"
+        
+        pending = {v["filename"]: v for v in catalog.pending()}
+        assert set(pending) == {"video1.mp4", "video2.mkv"}
+        assert pending["video1.mp4"]["thumbnail_path"].endswith("video1.webp")
+        assert pending["video2.mkv"]["thumbnail_path"] is None
+        
+        catalog.mark_uploaded(pending["video1.mp4"]["video_path"])
+        assert [v["filename"] for v in catalog.pending()] == ["video2.mkv"]
+        
+        # A channel's finished files are indexed without a rescan
+        for name in ("video6.mp4", "video6.jpg"):
+            with open(os.path.join(download_dir, name), "wb") as f:
+                f.write(b"data")
+        assert catalog.add([os.path.join(download_dir, "video6.mp4"), "downloads/video4.temp.mp4"]) == 1
+        video6 = next(v for v in catalog.pending() if v["filename"] == "video6.mp4")
+        assert video6["thumbnail_path"].endswith("video6.jpg")
+        catalog.mark_uploaded(video6["video_path"])
+        
+        # Failed uploads are retried until the attempt cap
+        video2 = pending["video2.mkv"]["video_path"]
+        for _ in range(catalog.max_attempts - 1):
+            catalog.mark_failed(video2, "network error")
+            assert [v["filename"] for v in catalog.pending()] == ["video2.mkv"], "Failed upload should be retried"
+        catalog.mark_failed(video2, "network error")
+        assert catalog.pending() == [], "Upload should be given up after the attempt cap"
+        assert catalog.counts() == {"uploaded": 2, "failed": 1}
+        catalog.close()
+    
+    print("✅ Media catalog test passed")
+
+def test_chunked_upload():
+    """Test chunked, resumable upload against a local stand-in server."""
+    print("Testing chunked upload...")
+    
+    import tempfile
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from chunked_upload import ChunkedUploader, UploadError
+    
+    parts = {}
+    received = []
+    failures = {"1": 1, "3": 99}  # part 1 fails once, part 3 until allowed
+    legacy_server = []  # non-empty: no chunked endpoints, like older servers
+    
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+        
+        def _reply(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if legacy_server:
+                if self.path != "/api/media/upload":
+                    self._reply(404, {"success": False})
+                    return
+                legacy_server.append(body)
+                self._reply(200, {"success": True, "data": {"id": "media-2"}})
+            elif self.path.endswith("/init"):
+                self._reply(200, {"success": True, "data": {"upload_id": "u1"}})
+            else:
+                self._reply(200, {"success": True, "data": {"id": "media-1"}})
+        
+        def do_PUT(self):
+            index = self.path.rsplit("/", 1)[-1]
+            data = self.rfile.read(int(self.headers["Content-Length"]))
+            if failures.get(index, 0) > 0:
+                failures[index] -= 1
+                self._reply(500, {"success": False})
+                return
+            parts[int(index)] = data
+            received.append(int(index))
+            self._reply(200, {"success": True})
+    
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            video_path = os.path.join(tmp, "video.mp4")
+            content = os.urandom(10 * 1024 + 123)
+            with open(video_path, "wb") as f:
+                f.write(content)
+            
+            uploader = ChunkedUploader(f"http://127.0.0.1:{server.server_address[1]}",
+                                       chunk_size=1024, workers=4, max_retries=2, retry_delay=0)
+            
+            # First attempt: part 3 keeps failing, finished parts are remembered
+            try:
+                uploader.upload(video_path)
+                assert False, "Expected the upload to fail"
+            except UploadError:
+                pass
+            assert os.path.exists(uploader.progress_path(video_path)), "Progress should be saved"
+            
+            # Second attempt resumes and only sends what is missing
+            failures["3"] = 0
+            first_pass = set(received)
+            received.clear()
+            result = uploader.upload(video_path)
+            
+            assert result["media_id"] == "media-1"
+            assert not first_pass & set(received), "Finished parts should not be re-sent"
+            assert b"".join(parts[i] for i in sorted(parts)) == content, "Reassembled file differs"
+            assert not os.path.exists(uploader.progress_path(video_path)), "Progress should be cleared"
+            
+            # Without the chunked endpoints the file goes up in a single request
+            legacy_server.append(None)
+            received.clear()
+            result = uploader.upload(video_path)
+            assert result["media_id"] == "media-2" and not received, "Expected a single upload"
+            assert content in legacy_server[1], "Single upload should carry the whole file"
+            assert not uploader.chunked, "Fallback should be remembered"
+    finally:
+        server.shutdown()
+        server.server_close()
+    
+    print("✅ Chunked upload test passed")
+
+def test_upload_scheduler():
+    """Test concurrent uploads paced by a token bucket per account."""
+    print("Testing upload scheduler...")
+    
+    import time
+    import threading
+    from upload_scheduler import UploadScheduler
+    
+    starts = {}
+    lock = threading.Lock()
+    
+    def fake_upload(video_info, account):
+        with lock:
+            starts.setdefault(account, []).append(time.monotonic())
+        time.sleep(0.02)
+        return video_info["filename"] != "bad.mp4"
+    
+    scheduler = UploadScheduler(fake_upload, accounts=["a", "b"], interval=0.1, burst=1, workers=4).start()
+    names = ["v1.mp4", "v2.mp4", "bad.mp4", "v3.mp4"]
+    for name in names:
+        scheduler.submit({"video_path": f"downloads/{name}", "filename": name})
+    results = scheduler.close()
+    
+    assert len(results) == 4, "All videos should be processed"
+    assert results["downloads/bad.mp4"] is False
+    assert scheduler.stats()["succeeded"] == 3 and scheduler.stats()["failed"] == 1
+    assert set(starts) == {"a", "b"}, "Both accounts should be used"
+    for times in starts.values():
+        gaps = [b - a for a, b in zip(times, times[1:])]
+        assert all(gap >= 0.09 for gap in gaps), f"Account rate limit violated: {gaps}"
+    
+    print("✅ Upload scheduler test passed")
+
+def test_media_preparation():
+    """Test transcoding/cover commands and the source-hash cache."""
+    print("Testing media preparation...")
+    
+    import tempfile
+    import media_prep
+    
+    commands = []
+    
+    def fake_run(command, **kwargs):
+        commands.append(command)
+        with open(command[-1], "wb") as f:
+            f.write(b"prepared")
+        return MagicMock(returncode=0, stderr="")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        video = os.path.join(tmp, "video.mp4")
+        thumbnail = os.path.join(tmp, "video.webp")
+        for path in (video, thumbnail):
+            with open(path, "wb") as f:
+                f.write(b"source")
+        output_dir = os.path.join(tmp, "prepared")
+        
+        with patch("media_prep.subprocess.run", side_effect=fake_run):
+            upload_path, cover_path = media_prep.prepare_video(video, thumbnail, "abc", "ffmpeg", output_dir)
+            assert len(commands) == 2, "Expected a transcode and a cover command"
+            assert "libx264" in commands[0] and commands[0][commands[0].index("-i") + 1] == video
+            assert commands[1][commands[1].index("-i") + 1] == thumbnail, "Cover should use the thumbnail"
+            assert upload_path.endswith("abc.mp4") and cover_path.endswith("abc.jpg")
+            assert os.path.exists(upload_path) and not os.path.exists(upload_path + ".part")
+            
+            # Cached by source hash: nothing is run again
+            media_prep.prepare_video(video, thumbnail, "abc", "ffmpeg", output_dir)
+            assert len(commands) == 2, "Prepared video should come from the cache"
+            
+            # Without a thumbnail the cover comes from a keyframe
+            media_prep.prepare_video(video, None, "def", "ffmpeg", output_dir)
+            assert "nokey" in commands[-1] and commands[-1][commands[-1].index("-i") + 1] == video
+        
+        # Uploaded videos take their prepared copies from the configured directory along
+        import auto_uploader
+        with patch("auto_uploader.UPLOADED_DIR", os.path.join(tmp, "uploaded")):
+            auto_uploader.move_to_uploaded({"video_path": video, "thumbnail_path": thumbnail, "hash": "abc"},
+                                           {"prepared_dir": output_dir})
+        assert not os.path.exists(upload_path) and not os.path.exists(cover_path), "Prepared copies left behind"
+        assert os.path.exists(os.path.join(tmp, "uploaded", "video.mp4"))
+        video = os.path.join(tmp, "uploaded", "video.mp4")
+        
+        # Without ffmpeg videos pass through unchanged
+        with patch("media_prep.shutil.which", return_value=None):
+            preparer = media_prep.MediaPreparer({"prepare_media": True})
+        received = []
+        preparer.submit({"video_path": video, "filename": "video.mp4"}, received.append)
+        assert received == [{"video_path": video, "filename": "video.mp4"}]
+    
+    print("✅ Media preparation test passed")
+
+def test_provider_router():
+    """Test hedging, cancellation of the losing request and failover."""
+    print("Testing provider router...")
+    
+    import time
+    import asyncio
+    from src.router import ProviderRouter
+    
+    calls = []
+    cancelled = []
+    
+    def provider(name, delay, fail=False):
+        async def call(**kwargs):
+            calls.append(name)
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                cancelled.append(name)
+                raise
+            if fail:
+                raise RuntimeError(f"{name} is down")
+            return {"provider": name, **kwargs}
+        return call
+    
+    async def run(router, **kwargs):
+        start = time.monotonic()
+        result = await router.call(**kwargs)
+        # Let the cancelled loser process its cancellation
+        await asyncio.sleep(0.01)
+        return result, time.monotonic() - start
+    
+    # No hedge while the primary answers within the delay
+    router = ProviderRouter({"a": provider("a", 0.01), "b": provider("b", 0.01)}, hedge_after=0.5)
+    result, _ = asyncio.run(run(router, seed=1))
+    assert result == {"provider": "a", "seed": 1} and calls == ["a"], f"Unexpected hedge: {calls}"
+    
+    # A slow primary is hedged after the delay; the first success wins, the loser is cancelled
+    calls.clear()
+    router = ProviderRouter({"slow": provider("slow", 1.0), "fast": provider("fast", 0.01)}, hedge_after=0.05)
+    result, elapsed = asyncio.run(run(router))
+    assert result["provider"] == "fast", f"Hedge should win: {result}"
+    assert calls == ["slow", "fast"], f"Expected a hedge request: {calls}"
+    assert elapsed < 0.5, f"Hedge did not cut latency: {elapsed:.2f}s"
+    assert cancelled == ["slow"], "Losing request should be cancelled"
+    assert not router.stats["slow"].samples, "A cancelled request says nothing about the provider"
+    
+    # A failing provider falls over to the next one and drops in the ranking
+    calls.clear()
+    router = ProviderRouter({"down": provider("down", 0, fail=True), "up": provider("up", 0.01)}, hedge_after=0.5)
+    result, _ = asyncio.run(run(router))
+    assert result["provider"] == "up" and calls == ["down", "up"], f"No failover: {calls}"
+    assert router.stats["down"].error_rate == 1.0
+    assert router.ranked() == ["up", "down"], "Failing provider should be ranked last"
+    
+    # Answers served from a cache do not count as provider latency
+    from src.router import served_from_cache
+    
+    async def cached(**kwargs):
+        served_from_cache()
+        return {"provider": "cached"}
+    
+    router = ProviderRouter({"cached": cached}, hedge_after=0.5)
+    result, _ = asyncio.run(run(router))
+    assert result["provider"] == "cached" and not router.stats["cached"].samples, "Cache hit was timed"
+    
+    # All providers failing is an error
+    router = ProviderRouter({"down": provider("down", 0, fail=True)}, hedge_after=0.5)
+    try:
+        asyncio.run(router.call())
+        assert False, "Expected the call to fail"
+    except RuntimeError:
+        pass
+    
+    print("✅ Provider router test passed")
+
+def test_json_stream():
+    """Test incremental extraction of the content element from model output."""
+    print("Testing streamed JSON extraction...")
+    
+    from src.json_stream import JsonObjectStream, ContentError, parse_content
+    
+    post = {"image_prompt": 'a "red" dress, city at night', "title": "夜色 {城市}", "copy": "line one\nline two"}
+    
+    # Code fences and prose around the object
+    text = "Sure! Here is the post:\n```json\n" + json.dumps(post, ensure_ascii=False) + "\n```\nEnjoy {it}."
+    assert parse_content(text) == post
+    
+    # Trailing commas and raw newlines inside strings
+    assert parse_content('{"image_prompt": "a", "title": "b", "copy": "c\nd",}')["copy"] == "c\nd"
+    
+    # Braces in prose before the object are skipped
+    assert parse_content('Use {style} here: {"image_prompt": "a", "title": "b", "copy": "c"}')["title"] == "b"
+    
+    # Streamed in small chunks: image_prompt is reported as soon as it is complete
+    fields = []
+    stream = JsonObjectStream(on_field=lambda key, value: fields.append((key, value)))
+    text = "```json\n" + json.dumps(post, ensure_ascii=False) + "\n```"
+    cut = text.index('"title"')
+    for i in range(0, cut, 3):
+        assert stream.feed(text[i:min(i + 3, cut)]) is None
+    assert fields == [("image_prompt", post["image_prompt"])], f"image_prompt not reported early: {fields}"
+    stream.feed(text[cut:])
+    assert stream.done and stream.result == post
+    assert [key for key, _ in fields] == ["image_prompt", "title", "copy"]
+    
+    # Missing fields and missing objects are content errors
+    for bad in ('{"title": "b", "copy": "c"}', "no json here", '{"image_prompt": "a", "title": '):
+        try:
+            parse_content(bad)
+            assert False, f"Expected a content error for {bad!r}"
+        except ContentError:
+            pass
+    
+    print("✅ Streamed JSON extraction test passed")
+
+def test_job_store():
+    """Test leases, resuming after a crash and giving up after max attempts."""
+    print("Testing job store...")
+    
+    import time
+    import tempfile
+    from pathlib import Path
+    from src.jobstore import JobStore, PENDING, CONTENT_GENERATED, IMAGES_RENDERED, PUBLISHED, FAILED
+    from src import worker
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        store = JobStore(Path(tmp) / "jobs.sqlite3")
+        first, second = store.enqueue(2, combinations=[{"style": "a"}, None])
+        
+        # A claimed post is leased: a second worker gets the next one
+        job = store.claim(lease=0.05)
+        assert job.id == first and job.combination == {"style": "a"}
+        assert job.seed is not None, "Posts get a stable seed"
+        assert store.claim().id == second
+        assert store.claim() is None, "Leased posts must not be claimed twice"
+        
+        # The worker crashes after generating content; once its lease expires
+        # the post is claimed again at the stage it reached
+        store.advance(job, CONTENT_GENERATED, content={"image_prompt": "p", "title": "t", "copy": "c"})
+        time.sleep(0.06)
+        reclaimed = store.claim()
+        assert reclaimed.id == first and reclaimed.state == CONTENT_GENERATED, "Expired lease should be reclaimed"
+        store.release(store.get(second))
+        
+        # Resuming skips the finished stage
+        image = Path(tmp) / "image.png"
+        image.write_bytes(b"png")
+        with patch("src.worker.generate_content_element_routed") as generate, \
+             patch("src.worker.generate_images", return_value=[image]) as render, \
+             patch("src.worker.run_publish") as publish, \
+             patch("src.worker.get_dedup_index") as dedup:
+            dedup.return_value.find_images.return_value = None
+            assert worker.process(store, reclaimed)
+        generate.assert_not_called()
+        render.assert_called_once()
+        assert publish.call_args.args[1] == "t"
+        assert store.get(first).state == PUBLISHED and store.get(first).images == [image]
+        
+        # Failures are retried until the attempt limit, then the post is failed
+        job = store.claim()
+        assert job.id == second and job.state == PENDING
+        for attempt in range(1, 3):
+            store.fail(job, "boom", max_attempts=3)
+            assert store.get(second).state == PENDING and store.get(second).attempts == attempt
+            job = store.claim()
+            assert job.id == second, "Failed post should be claimable again"
+        store.fail(job, "boom", max_attempts=3)
+        assert store.get(second).state == FAILED
+        assert store.claim() is None
+        assert store.counts() == {PUBLISHED: 1, FAILED: 1}
+        assert IMAGES_RENDERED not in store.counts()
+        store.close()
+    
+    print("✅ Job store test passed")
+
+def test_coverage_sampler():
+    """Test that draws favour under-covered values and usage persists once recorded."""
+    print("Testing coverage sampler...")
+    
+    import random
+    import tempfile
+    from pathlib import Path
+    from src.sampler import CoverageSampler
+    
+    dimensions = {"style": ["a", "b", "c"], "mood": ["x", "y"]}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "sampler.json"
+        sampler = CoverageSampler(dimensions, path=path, rng=random.Random(1))
+        
+        # One batch covers every combination before repeating any
+        draws = sampler.draw(6)
+        assert len({(d["style"], d["mood"]) for d in draws}) == 6, f"Repeated combination: {draws}"
+        
+        # Draws are only reserved: nothing is persisted until recorded
+        assert not path.exists() and sampler.stats()["draws"] == 0
+        for draw in draws:
+            if draw["style"] == "a":
+                sampler.record(draw)
+            else:
+                sampler.release(draw)
+        assert sampler.stats()["draws"] == 2
+        
+        # Under-covered values are preferred: "a" is used, so it is drawn last
+        reloaded = CoverageSampler(dimensions, path=path, rng=random.Random(2))
+        assert reloaded.stats()["draws"] == 2, "Recorded counts should persist"
+        picks = reloaded.draw(4)
+        assert all(d["style"] != "a" for d in picks), f"Used style drawn first: {picks}"
+        
+        # Outstanding reservations steer concurrent draws elsewhere
+        for draw in picks:
+            reloaded.release(draw)
+        first, second = reloaded.draw()[0], reloaded.draw()[0]
+        assert first != second and "a" not in (first["style"], second["style"])
+        
+        # Combinations outside the pools are ignored
+        reloaded.record({"style": "z", "mood": "x"})
+        assert reloaded.stats()["draws"] == 2
+        
+        # Fan-out generation records successful draws and releases failed ones
+        import asyncio
+        from src import llm_client
+        calls = []
+        
+        async def provider(combination=None, **kwargs):
+            calls.append(combination)
+            if len(calls) % 3 == 0:
+                raise RuntimeError("provider down")
+            return {"title": "t", "copy": "c", "image_prompt": "p"}
+        
+        async def collect():
+            return [r async for r in llm_client.agenerate_content_elements(6, providers=["stub"])]
+        
+        saved = llm_client._sampler, llm_client.CONTENT_PROVIDERS
+        llm_client._sampler = CoverageSampler(dimensions, path=Path(tmp) / "fanout.json")
+        llm_client.CONTENT_PROVIDERS = {"stub": provider}
+        try:
+            results = asyncio.run(collect())
+            assert len(results) == 4 and all(calls), "Every request should get a drawn combination"
+            assert llm_client._sampler.stats()["draws"] == 4, "Successful generations should be recorded"
+            assert not llm_client._sampler._reserved, "No reservation should be left behind"
+        finally:
+            llm_client._sampler, llm_client.CONTENT_PROVIDERS = saved
+    
+    print("✅ Coverage sampler test passed")
+
+def test_session_monitor():
+    """Test login validation, inconclusive checks and refreshed cookies."""
+    print("Testing session monitor...")
+    
+    import json
+    import asyncio
+    import tempfile
+    from pathlib import Path
+    import httpx
+    from src.accounts import Account, load_cookies
+    from src import session_monitor
+    from src.session_monitor import SessionMonitor, mark_validated, invalidate, validated_recently
+    
+    # Validation marks expire after max_age and are dropped by invalidate
+    mark_validated("tester")
+    assert validated_recently("tester") and not validated_recently("tester", max_age=0)
+    invalidate("tester")
+    assert not validated_recently("tester") and not validated_recently("nobody")
+    
+    def respond(status, body, content_type="application/json", headers=()):
+        def handler(request):
+            return httpx.Response(status, content=body, headers=[("content-type", content_type), *headers])
+        return handler
+    
+    url = "https://creator.example.com/api/user"
+    with tempfile.TemporaryDirectory() as tmp:
+        account = Account("tester", Path(tmp) / "tester.json")
+        account.cookies_path.write_text(json.dumps([
+            {"name": "web_session", "value": "old", "domain": ".example.com", "path": "/", "expires": -1},
+        ]))
+        monitor = SessionMonitor(accounts=[account], url=url, webhook=None)
+        
+        async def check(handler):
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                return await monitor.check(account, client)
+        
+        # A logged in answer validates the account and stores refreshed cookies
+        status = asyncio.run(check(respond(200, b'{"success": true}', headers=[
+            ("set-cookie", "web_session=new; Domain=.example.com; Path=/"),
+            ("set-cookie", "a1=xyz; Path=/"),
+        ])))
+        assert status.valid is True and validated_recently("tester")
+        cookies = {c["name"]: c for c in load_cookies(account)}
+        assert cookies["web_session"]["value"] == "new", "Refreshed cookie should replace the old value"
+        assert cookies["a1"]["domain"] == "creator.example.com", "New host-only cookie should be added"
+        
+        # Unparseable, unexpected or server error answers are inconclusive: no invalidation
+        for handler in (respond(200, b"<html>login</html>", "text/html"),
+                        respond(200, b"{not json"),
+                        respond(200, b'{"data": {}}'),
+                        respond(503, b"")):
+            status = asyncio.run(check(handler))
+            assert status.valid is None and status.error, f"Expected an inconclusive check: {status}"
+            assert validated_recently("tester"), "Inconclusive check must not invalidate the login"
+        
+        # An explicit rejection invalidates the account
+        status = asyncio.run(check(respond(200, b'{"success": false, "code": -100}')))
+        assert status.valid is False and not validated_recently("tester")
+        
+        # Unchanged cookies are not rewritten
+        jar = [{"name": "a1", "value": "xyz", "domain": "creator.example.com", "path": "/", "expires": -1}]
+        unchanged = httpx.Cookies()
+        unchanged.set("a1", "xyz", domain="creator.example.com")
+        assert not session_monitor._merge_set_cookies(jar, unchanged.jar, "creator.example.com")
+    
+    print("✅ Session monitor test passed")
+
+def test_result_cache():
+    """Test hit/miss counting, size tracking and LRU eviction at the size cap."""
+    print("Testing result cache...")
+    
+    import tempfile
+    from pathlib import Path
+    from src.cache import ResultCache
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ResultCache(root=Path(tmp), max_bytes=250, enabled=True)
+        
+        # Misses and hits are counted; unkeyed (unseeded) results are not cached
+        assert cache.get_bytes("a" * 64) is None
+        cache.put_bytes("a" * 64, b"x" * 100)
+        assert cache.get_bytes("a" * 64) == b"x" * 100
+        cache.put_bytes(None, b"ignored")
+        assert cache.get_bytes(None) is None
+        assert cache.stats() == {"hits": 1, "misses": 1, "entries": 1, "bytes": 100}
+        
+        # Replacing an entry updates the size without adding an entry
+        cache.put_bytes("a" * 64, b"x" * 80)
+        cache.put_bytes("b" * 64, b"y" * 100)
+        assert cache.stats()["entries"] == 2 and cache.stats()["bytes"] == 180
+        
+        # Over the cap the least recently used entries go first
+        os.utime(cache._path("a" * 64), (1, 1))
+        os.utime(cache._path("b" * 64), (2, 2))
+        assert cache.get_bytes("a" * 64) is not None  # "a" is now the most recently used
+        cache.put_bytes("c" * 64, b"z" * 100)
+        assert cache.get_bytes("b" * 64) is None, "Least recently used entry should be evicted"
+        assert cache.get_bytes("a" * 64) is not None and cache.get_bytes("c" * 64) is not None
+        stats = cache.stats()
+        assert stats["entries"] == 2 and stats["bytes"] == 180 <= cache.max_bytes, stats
+        
+        # A new instance picks up the entries already on disk
+        assert ResultCache(root=Path(tmp), enabled=True).stats()["bytes"] == 180
+    
+    print("✅ Result cache test passed")
+
+def test_dedup_index():
+    """Test near-duplicate detection of text and images and the test mode index."""
+    print("Testing dedup index...")
+    
+    import io
+    import tempfile
+    from pathlib import Path
+    from PIL import Image
+    from src import dedup
+    from src.dedup import DedupIndex, get_dedup_index
+    from src.media import EncodedImage
+    
+    def image(name, size=(64, 64), flip=False, fmt="PNG"):
+        img = Image.new("L", size)
+        img.putdata([(x * 255 // size[0]) ^ (y * 7 % 32) for y in range(size[1]) for x in range(size[0])])
+        if flip:
+            img = img.transpose(Image.Transpose.FLIP_LEFT_RIGHT)
+        buffer = io.BytesIO()
+        img.save(buffer, fmt)
+        return EncodedImage(name, f"image/{fmt.lower()}", buffer.getvalue())
+    
+    post = {"title": "Autumn sunset by the lake",
+            "copy": "A quiet walk in golden light with warm colors and soft wind through the trees",
+            "image_prompt": "portrait at the lake, golden hour, soft light"}
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "dedup.sqlite3"
+        index = DedupIndex(path=path, enabled=True)
+        assert index.find_text(post) is None and index.find_images([image("a.png")]) is None
+        index.add(post, [image("a.png")])
+        
+        # Case, punctuation and emoji changes are still a repeat
+        variant = {"title": "autumn SUNSET, by the lake ✨"}
+        assert "title" in (index.find_text(variant) or ""), "Near-duplicate title should be rejected"
+        # Distinct text passes
+        distinct = {"title": "Snowy cabin in a Nordic forest", "copy": "Cocoa by the fireplace on a winter night"}
+        assert index.find_text(distinct) is None, "Distinct text should be accepted"
+        
+        # A re-encoded, resized copy of a published image is a repeat; a mirrored one is not
+        assert index.find_images([image("b.jpg", size=(128, 128), fmt="JPEG")]), "Re-encoded image should match"
+        assert index.find_images([image("c.png", flip=True)]) is None, "Different image should pass"
+        
+        # The threshold decides how far a rewording may go
+        reworded = {"copy": post["copy"].replace("trees", "pines")}
+        assert index.find_text(reworded) is None
+        assert DedupIndex(path=path, text_distance=8, enabled=True).find_text(reworded)
+        
+        # Fingerprints persist across instances
+        assert DedupIndex(path=path, enabled=True).counts() == {"title": 1, "copy": 1, "image_prompt": 1, "image": 1}
+        index.close()
+        
+        # Test mode posts stay out of the persistent index
+        saved = dedup._index, dedup._test_index
+        dedup._index, dedup._test_index = DedupIndex(path=Path(tmp) / "prod.sqlite3", enabled=True), None
+        try:
+            test_index = get_dedup_index("test")
+            assert test_index is not get_dedup_index("prod")
+            test_index.add(post, [image("a.png")])
+            assert get_dedup_index("prod").find_text(post) is None, "Test post leaked into the real index"
+            assert DedupIndex(path=Path(tmp) / "prod.sqlite3", enabled=True).counts() == {}
+        finally:
+            dedup._index.close()
+            dedup._index, dedup._test_index = saved
+    
+    print("✅ Dedup index test passed")
+
+def test_batch_pipeline():
+    """Test bounded queues between stages and isolation of failing posts."""
+    print("Testing batch pipeline...")
+    
+    import asyncio
+    from src import pipeline
+    
+    # Posts that passed the text stage, and of those the ones that reached
+    # the publish stage or dropped out on the way there
+    progress = {"text": 0, "drained": 0, "publish": 0, "backlog": 0}
+    
+    async def text(post, mode):
+        if post.index == 2:
+            raise RuntimeError("provider down")
+        post.title = f"post {post.index}"
+        progress["text"] += 1
+        progress["backlog"] = max(progress["backlog"], progress["text"] - progress["drained"])
+    
+    def image(post, mode):
+        if post.index == 4:
+            progress["drained"] += 1
+            raise RuntimeError("render failed")
+        post.images = [f"{post.index}.png"]
+    
+    async def publish(post, pool, mode):
+        progress["drained"] += 1
+        progress["publish"] += 1
+        # The slowest stage sets the pace
+        await asyncio.sleep(0.01)
+    
+    with patch.object(pipeline, "_text_stage", text), \
+         patch.object(pipeline, "_image_stage", image), \
+         patch.object(pipeline, "_publish_stage", publish), \
+         patch.object(pipeline, "get_sampler") as sampler, \
+         patch.multiple(pipeline, PIPELINE_QUEUE_SIZE=1, TEXT_CONCURRENCY=1, IMAGE_CONCURRENCY=1,
+                        PUBLISH_CONCURRENCY=1, GENERATION_SEED=0):
+        posts = asyncio.run(pipeline._run_pipeline(10, "test", pool=None))
+    sampler.return_value.draw.assert_not_called()
+    
+    # A failing post drops out at its stage while the others keep flowing
+    assert [p.index for p in posts] == list(range(10)), "Every post should come out of the pipeline"
+    failed = {p.index: p.error for p in posts if p.error}
+    assert set(failed) == {2, 4}, f"Unexpected failures: {failed}"
+    assert failed[2].startswith("text:") and failed[4].startswith("image:")
+    assert "publish" not in posts[4].timings and posts[5].title == "post 5"
+    assert progress["publish"] == 8
+    
+    # Text generation cannot run arbitrarily far ahead of a slow publish stage:
+    # one post in each queue and at most one waiting at each stage to hand over.
+    assert progress["backlog"] <= 4, f"Queues are not bounded: {progress['backlog']} posts ahead"
+    
+    print("✅ Batch pipeline test passed")
+
+def test_post_buffer():
+    """Test idle hours, topping up the buffer and publishing from it."""
+    print("Testing post buffer...")
+    
+    import asyncio
+    import tempfile
+    from datetime import datetime
+    from pathlib import Path
+    from unittest.mock import AsyncMock
+    from PIL import Image
+    from src import buffer, dedup
+    from src.jobstore import JobStore, PENDING, CONTENT_GENERATED, IMAGES_RENDERED, PUBLISHED
+    
+    at = lambda hour: datetime(2024, 1, 1, hour)
+    assert buffer._in_idle_hours(at(3), "1-7") and not buffer._in_idle_hours(at(7), "1-7")
+    assert buffer._in_idle_hours(at(23), "22-6") and not buffer._in_idle_hours(at(12), "22-6")
+    assert buffer._in_idle_hours(at(12), "")
+    # A malformed spec is reported and ignored instead of failing the job
+    for spec in ("1to7", "night", "1-7-9", "25-3"):
+        assert buffer._in_idle_hours(at(12), spec), f"Malformed spec {spec!r} should mean always idle"
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        store = JobStore(Path(tmp) / "jobs.sqlite3")
+        generated = []
+        
+        async def generate(**kwargs):
+            generated.append(kwargs)
+            return {"image_prompt": os.urandom(8).hex(), "title": os.urandom(8).hex(), "copy": os.urandom(16).hex()}
+        
+        def render(prompt, job_id=None, **kwargs):
+            path = Path(tmp) / f"{job_id}.png"
+            Image.frombytes("L", (32, 32), os.urandom(32 * 32)).save(path)
+            return [path]
+        
+        saved_index = dedup._test_index
+        dedup._test_index = None
+        try:
+            with patch("src.worker.agenerate_content_element_routed", side_effect=generate), \
+                 patch("src.worker.generate_images", side_effect=render), \
+                 patch("src.worker.arun_publish", new_callable=AsyncMock) as publish, \
+                 patch("src.worker.get_sampler") as sampler:
+                sampler.return_value.draw.side_effect = lambda n: [{"style": "a"}] * n
+                
+                # Outside idle hours nothing is generated
+                with patch.object(buffer, "_in_idle_hours", return_value=False):
+                    assert asyncio.run(buffer.top_up(store, target=2, mode="test")) == 0
+                assert not generated
+                
+                # Topping up fills the buffer once; a full buffer generates nothing
+                assert asyncio.run(buffer.top_up(store, target=2, mode="test", force=True)) == 2
+                assert asyncio.run(buffer.top_up(store, target=2, mode="test", force=True)) == 2
+                assert len(generated) == 2 and store.counts() == {IMAGES_RENDERED: 2}
+                
+                # The oldest ready post is published without generating anything
+                first = store.get(1)
+                assert asyncio.run(buffer.publish_next(store, mode="test"))
+                assert publish.call_args.args[1] == first.content["title"]
+                assert store.get(1).state == PUBLISHED and len(generated) == 2
+                
+                # A post with lost images goes back for new images; the buffer is
+                # then empty and a post is generated on the spot
+                store.get(2).images[0].unlink()
+                assert asyncio.run(buffer.publish_next(store, mode="test"))
+                assert publish.call_count == 2 and store.get(2).state == PUBLISHED
+                assert len(generated) == 2, "Lost images need new images, not new text"
+                assert store.counts() == {PUBLISHED: 2, PENDING: 1}
+                
+                # A buffered post repeating a published one gets new text
+                store.advance(store.get(3), CONTENT_GENERATED, content=store.get(1).content)
+                store.advance(store.get(3), IMAGES_RENDERED, images=render("", job_id="job3"))
+                assert asyncio.run(buffer.publish_next(store, mode="test"))
+                assert len(generated) == 3 and store.get(3).state == PUBLISHED
+        finally:
+            dedup._test_index = saved_index
+            store.close()
+    
+    print("✅ Post buffer test passed")
+
+def test_import_budget():
+    """Test that importing the generator stays cheap and loads no provider SDK."""
+    print("Testing import time budget...")
+    
+    import subprocess
+    
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    # A fresh interpreter, so modules imported by other tests do not count
+    code = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        "import main\n"
+        "elapsed = time.perf_counter() - start\n"
+        "heavy = ['openai', 'google.genai', 'playwright', 'apscheduler', 'huggingface_hub.inference']\n"
+        "print(elapsed)\n"
+        "print(','.join(m for m in heavy if any(n == m or n.startswith(m + '.') for n in sys.modules)))\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=project_root, capture_output=True, text=True)
+    assert result.returncode == 0, f"Importing main failed: {result.stderr}"
+    lines = result.stdout.splitlines()
+    elapsed, loaded = float(lines[-2]), lines[-1]
+    
+    assert loaded == "", f"Provider SDKs imported eagerly: {loaded}"
+    assert elapsed < 1.0, f"Importing main took {elapsed:.2f}s"
+    
+    print("✅ Import time budget test passed")
+
 def main():
     """Run all tests."""
     print("Running automation workflow tests...\n")
@@ -95,6 +939,21 @@ def main():
         test_config_loading()
         test_filename_cleaning() 
         test_video_discovery()
+        test_parallel_ingestion()
+        test_media_catalog()
+        test_chunked_upload()
+        test_upload_scheduler()
+        test_media_preparation()
+        test_provider_router()
+        test_json_stream()
+        test_job_store()
+        test_coverage_sampler()
+        test_session_monitor()
+        test_result_cache()
+        test_dedup_index()
+        test_batch_pipeline()
+        test_post_buffer()
+        test_import_budget()
         
         print("\n🎉 All tests passed! The automation workflow is ready.")
         print("\nNext steps:")
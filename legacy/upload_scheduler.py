@@ -0,0 +1,148 @@
+import time
+import queue
+import logging
+import threading
+
+_STOP = object()
+
+
+class TokenBucket:
+    """Rate limit of one account: `capacity` uploads at once, refilled at one
+    upload every `interval` seconds."""
+
+    def __init__(self, interval, capacity=1):
+        self.interval = interval
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        if self.interval <= 0:
+            self.tokens = float(self.capacity)
+        else:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) / self.interval)
+        self.updated = now
+
+    def wait_time(self):
+        """Seconds until a token is available (0 if one is available now)."""
+        self._refill(time.monotonic())
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) * self.interval
+
+    def take(self):
+        self._refill(time.monotonic())
+        self.tokens -= 1
+
+
+class UploadScheduler:
+    """Run uploads concurrently within each account's token bucket.
+
+    Videos can be submitted while earlier ones are uploading, e.g. as channel
+    downloads finish. A worker takes the next video and uploads it with the
+    account whose bucket frees up first, so throughput is bounded by the
+    accounts' quota instead of a fixed sleep between uploads.
+    """
+
+    def __init__(self, upload_fn, accounts=(None,), interval=300, burst=1, workers=2):
+        """
+        Args:
+            upload_fn: Called as upload_fn(video_info, account), returns True on success.
+            accounts: Account identifiers passed through to upload_fn.
+            interval: Seconds between uploads of one account.
+            burst: Uploads an account may start back to back.
+            workers: Maximum concurrent uploads.
+        """
+        self.upload_fn = upload_fn
+        self.buckets = {account: TokenBucket(interval, burst) for account in (accounts or (None,))}
+        self.interval = interval
+        self.workers = max(1, workers)
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._threads = []
+        self.queued = 0
+        self.in_flight = 0
+        self.succeeded = 0
+        self.failed = 0
+        self._durations = []
+        self.results = {}
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"upload-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def submit(self, video_info):
+        with self._lock:
+            self.queued += 1
+        self._queue.put(video_info)
+        self.log_status()
+
+    def _acquire_account(self):
+        """Block until some account has a token, take it and return the account."""
+        while True:
+            with self._lock:
+                account, wait = min(((a, b.wait_time()) for a, b in self.buckets.items()), key=lambda x: x[1])
+                if wait <= 0:
+                    self.buckets[account].take()
+                    return account
+            time.sleep(min(wait, 1.0))
+
+    def _worker(self):
+        while True:
+            video_info = self._queue.get()
+            if video_info is _STOP:
+                return
+            account = self._acquire_account()
+            with self._lock:
+                self.queued -= 1
+                self.in_flight += 1
+            start = time.monotonic()
+            try:
+                success = bool(self.upload_fn(video_info, account))
+            except Exception as e:
+                logging.error(f"Upload of {video_info.get('filename')} raised: {e}")
+                success = False
+            with self._lock:
+                self.in_flight -= 1
+                self._durations.append(time.monotonic() - start)
+                if success:
+                    self.succeeded += 1
+                else:
+                    self.failed += 1
+                self.results[video_info["video_path"]] = success
+            self.log_status()
+
+    def stats(self):
+        """Queue depth, progress and the estimated seconds until the queue is drained."""
+        with self._lock:
+            queued = self.queued
+            remaining = queued + self.in_flight
+            average = sum(self._durations) / len(self._durations) if self._durations else 0.0
+            # Bounded by upload time across the workers and by the accounts' quota.
+            ready = sum(int(b.tokens) for b in self.buckets.values())
+            quota_eta = max(0, queued - ready) * self.interval / len(self.buckets)
+            work_eta = -(-remaining // self.workers) * average
+            return {
+                "queued": queued,
+                "in_flight": self.in_flight,
+                "succeeded": self.succeeded,
+                "failed": self.failed,
+                "eta_seconds": round(max(quota_eta, work_eta), 1),
+            }
+
+    def log_status(self):
+        s = self.stats()
+        logging.info(f"Upload queue: {s['queued']} queued, {s['in_flight']} uploading, "
+                     f"{s['succeeded']} done, {s['failed']} failed, ETA {s['eta_seconds']:.0f}s")
+
+    def close(self):
+        """Wait for all submitted uploads to finish and stop the workers."""
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        return self.results
@@ -3,7 +3,9 @@ import json
 import time
 import logging
 import os
-from typing import Dict, Optional
+from typing import Dict
+
+from chunked_upload import ChunkedUploader
 
 class XiaohongshuUploader:
     """Class to handle Xiaohongshu video uploads."""
@@ -23,7 +25,9 @@ class XiaohongshuUploader:
             "login_cookie": "",
             "csrf_token": "",
             "upload_timeout": 300,
-            "max_retries": 3
+            "max_retries": 3,
+            "chunk_size_mb": 8,
+            "upload_workers": 4
         }
         
         if os.path.exists(self.config_file):
@@ -61,6 +65,18 @@ class XiaohongshuUploader:
             "X-CSRF-Token": csrf_token
         })
     
+    def chunked_uploader(self) -> ChunkedUploader:
+        """Chunked upload engine sharing this uploader's session and credentials."""
+        return ChunkedUploader(
+            self.config["api_base_url"],
+            headers=self.headers,
+            session=self.session,
+            chunk_size=int(self.config.get("chunk_size_mb", 8) * 1024 * 1024),
+            workers=self.config.get("upload_workers", 4),
+            max_retries=self.config.get("max_retries", 3),
+            timeout=self.config["upload_timeout"]
+        )
+    
     def upload_video(self, video_path: str, title: str, description: str, 
                     tags: list = None, cover_path: str = None) -> Dict:
         """Upload video to Xiaohongshu."""
@@ -69,36 +85,10 @@ class XiaohongshuUploader:
             logging.error("Not authenticated. Please set login cookie and CSRF token.")
             return {"success": False, "error": "Not authenticated"}
         
-        # Step 1: Initiate upload
-        upload_url = f"{self.config['api_base_url']}/api/media/upload"
-        
         try:
-            # Step 2: Upload video file
-            with open(video_path, 'rb') as video_file:
-                files = {"file": (os.path.basename(video_path), video_file, 'video/mp4')}
-                
-                response = self.session.post(
-                    upload_url,
-                    files=files,
-                    headers=self.headers,
-                    timeout=self.config["upload_timeout"]
-                )
-            
-            if response.status_code != 200:
-                logging.error(f"Upload failed: {response.status_code} - {response.text}")
-                return {"success": False, "error": f"HTTP {response.status_code}"}
-            
-            upload_result = response.json()
-            
-            if not upload_result.get("success"):
-                logging.error(f"Upload API error: {upload_result}")
-                return {"success": False, "error": upload_result.get("message", "Unknown error")}
-            
-            # Step 3: Create post with uploaded media
-            media_id = upload_result.get("data", {}).get("id")
-            if not media_id:
-                logging.error("No media ID in upload response")
-                return {"success": False, "error": "No media ID"}
+            # Steps 1-3: Upload the video in parts and get its media id
+            upload_result = self.chunked_uploader().upload(video_path, content_type='video/mp4')
+            media_id = upload_result["media_id"]
             
             # Step 4: Create the post
             post_data = {
@@ -120,7 +110,11 @@ class XiaohongshuUploader:
             if response.status_code == 200:
                 result = response.json()
                 logging.info(f"Successfully uploaded video: {title}")
-                return {"success": True, "post_id": result.get("data", {}).get("id")}
+                return {
+                    "success": True,
+                    "post_id": result.get("data", {}).get("id"),
+                    "throughput_mbps": upload_result["throughput_mbps"]
+                }
             else:
                 logging.error(f"Post creation failed: {response.status_code} - {response.text}")
                 return {"success": False, "error": f"HTTP {response.status_code}"}
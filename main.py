@@ -9,22 +9,62 @@
 """
 
 import os
+import json
+import asyncio
 from pathlib import Path
 from datetime import datetime
 
-from apscheduler.schedulers.blocking import BlockingScheduler
+from src.llm_client import generate_image_prompt, generate_post_content, generate_content_element_routed, get_sampler
+from src.image_client import generate_images, EarlyRender
+from src.publisher import run_publish, PublisherPool
+from src.session_monitor import SessionMonitor
+from src.providers import aclose_clients
+from src.pipeline import run_batch
+from src.cache import get_cache
+from src.metrics import traced, get_metrics
+from src.dedup import get_dedup_index
+from src.jobstore import JobStore, random_seed
+from src.worker import drain, enqueue
+from src.buffer import top_up, publish_next
+from config.settings import SCHEDULE_TIME, BATCH_SIZE, GENERATION_SEED, IMAGES_PER_POST, IMAGE_IN_MEMORY
+from config.settings import BUFFER_REFILL_MINUTES, ATTEMPT_STATE_PATH
 
-from src.llm_client import generate_image_prompt, generate_post_content, generate_content_element, generate_content_element_cloudflare
-from src.image_client import generate_images
-from src.publisher import run_publish
-from config.settings import SCHEDULE_TIME
 
+def _attempt():
+    """Seed and combination of the post job_v2 is working on. They stay on disk
+    until the post is published, so a rerun after a failure sends the same
+    requests and is served from the cache."""
+    if GENERATION_SEED is not None:
+        return GENERATION_SEED, None
+    try:
+        state = json.loads(ATTEMPT_STATE_PATH.read_text(encoding="utf-8"))
+        return state["seed"], state["combination"]
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, KeyError) as e:
+        print(f"[autoRed] Ignoring unreadable attempt state {ATTEMPT_STATE_PATH}: {e}")
+    seed, combination = random_seed(), get_sampler().draw()[0]
+    ATTEMPT_STATE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    ATTEMPT_STATE_PATH.write_text(json.dumps({"seed": seed, "combination": combination}, ensure_ascii=False),
+                                  encoding="utf-8")
+    return seed, combination
 
-def job_v2(mode="prod"):
+
+@traced("job")
+def job_v2(mode="prod", pool=None):
     print(f"[autoRed] Job started at {datetime.now()}")
     # 1. Prompt generation
     # content_element = generate_content_element()
-    content_element = generate_content_element_cloudflare()
+    seed, combination = _attempt()
+    # Images start rendering as soon as the image prompt has been streamed.
+    early = EarlyRender(count=IMAGES_PER_POST, mode=mode, seed=seed, in_memory=IMAGE_IN_MEMORY)
+    content_element = generate_content_element_routed(seed=seed, on_image_prompt=early.start,
+                                                      combination=combination)
+    if not content_element:
+        # Every provider failed, or out of tries for content that does not
+        # repeat a published post: start over with a new seed next time.
+        ATTEMPT_STATE_PATH.unlink(missing_ok=True)
+        raise RuntimeError("no content generated")
     # content_element = {}
     image_prompt = content_element.get("image_prompt", "")
     title = content_element.get("title", "title")
@@ -33,13 +73,75 @@ def job_v2(mode="prod"):
     print(f"Generated prompt: {image_prompt}")
     print(f"Title: {title}\nCopy: {copy}")
     # 2. Image generation (default 3 images)
-    images = generate_images(image_prompt, count=1, mode=mode)
+    images = early.result(image_prompt)
+    duplicate = get_dedup_index(mode).find_images(images)
+    if duplicate:
+        # The same seed would render the same images again: start over next time.
+        ATTEMPT_STATE_PATH.unlink(missing_ok=True)
+        raise RuntimeError(f"images repeat a published post ({duplicate})")
     print(f"Generated {len(images)} images. \nlist: {images}")
+    print(f"[autoRed] Cache stats: {get_cache().stats()}")
 
     # 3. Publish
-    run_publish(images, title, copy, headless=False)
+    run_publish(images, title, copy, headless=False, pool=pool)
+    get_dedup_index(mode).add(content_element, images)
+    ATTEMPT_STATE_PATH.unlink(missing_ok=True)
     # print("[autoRed] Job completed.")
 
+def flush_metrics():
+    """Print where time went and write the Prometheus export."""
+    print(f"[autoRed] Span summary: {get_metrics().report()}")
+    get_metrics().flush()
+
+
+def _seeds(n):
+    return [GENERATION_SEED + i for i in range(n)] if GENERATION_SEED is not None else None
+
+
+async def daily_job(store, pool=None):
+    """Publish the next pre-generated post from the buffer."""
+    print(f"[autoRed] Job started at {datetime.now()}")
+    await publish_next(store, pool=pool)
+    flush_metrics()
+
+
+async def run_daily():
+    """Run the daily schedule on one long-lived event loop.
+
+    The warm publisher pool, the scheduled jobs (coroutines) and the text
+    providers' keep-alive clients all live on this loop; only the blocking
+    image SDK runs in worker threads.
+    """
+    from apscheduler.schedulers.asyncio import AsyncIOScheduler
+    # Scheduler configuration – run daily at SCHEDULE_TIME (HH:MM)
+    hour, minute = map(int, SCHEDULE_TIME.split(":"))
+    store = JobStore()
+    # This process is the only worker: leases left by a crashed run are void.
+    store.release_all()
+    # Keep a warm, logged-in browser session around between daily runs.
+    async with PublisherPool(headless=False) as pool:
+        scheduler = AsyncIOScheduler()
+        scheduler.add_job(daily_job, "cron", hour=hour, minute=minute, id="autoRed_daily",
+                          kwargs={"store": store, "pool": pool})
+        # Keep the buffer of ready posts topped up, starting right away so a
+        # half-generated post from a previous run is finished first.
+        scheduler.add_job(top_up, "interval", minutes=BUFFER_REFILL_MINUTES, id="autoRed_buffer",
+                          next_run_time=datetime.now(), kwargs={"store": store})
+        scheduler.start()
+        # Validate the accounts' logins in the background so an expired one
+        # is reported (and re-logged in) before the daily job needs it.
+        monitor = SessionMonitor(pool=pool)
+        monitor.start()
+        print(f"[autoRed] Scheduler started – job will run daily at {SCHEDULE_TIME}.")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await monitor.stop()
+            scheduler.shutdown(wait=False)
+            await aclose_clients()
+            store.close()
+
+
 def job(mode="prod"):
     print(f"[autoRed] Job started at {datetime.now()}")
     # 1. Prompt generation
@@ -63,13 +165,22 @@ if __name__ == "__main__":
     print(f"[autoRed] Mode: {mode}")
     if mode in ("test", "dev"):
         job_v2(mode)
+        flush_metrics()
+    elif mode == "batch":
+        # Staged pipeline: text, image and publish stages overlap across posts.
+        print(f"[autoRed] Batch of {BATCH_SIZE} posts.")
+        run_batch(BATCH_SIZE)
+        flush_metrics()
+    elif mode == "queue":
+        # Durable queue: add N posts and drain everything that is queued.
+        store = JobStore()
+        store.release_all()
+        enqueue(store, BATCH_SIZE, seeds=_seeds(BATCH_SIZE))
+        with PublisherPool(headless=False) as pool:
+            drain(store, pool=pool)
+        flush_metrics()
     elif mode == "daily":
-        # Scheduler configuration – run daily at SCHEDULE_TIME (HH:MM)
-        hour, minute = map(int, SCHEDULE_TIME.split(":"))
-        scheduler = BlockingScheduler()
-        scheduler.add_job(job_v2, "cron", hour=hour, minute=minute, id="autoRed_daily")
-        print(f"[autoRed] Scheduler started – job will run daily at {SCHEDULE_TIME}.")
         try:
-            scheduler.start()
+            asyncio.run(run_daily())
         except (KeyboardInterrupt, SystemExit):
             print("Scheduler stopped.")
@@ -0,0 +1,68 @@
+# accounts for autoRed
+
+"""Registry of Xiaohongshu creator accounts.
+
+Each account has its own cookie jar under ``cookies/<name>.json`` and its own
+minimum interval between two posts. Without ``XHS_ACCOUNTS`` configured the
+registry holds a single ``default`` account backed by the historical
+``cookies/xhs_cookies.json`` file.
+"""
+import os
+import json
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List
+
+from config.settings import XHS_ACCOUNTS, ACCOUNT_MIN_INTERVAL
+
+COOKIES_DIR = Path(__file__).parent.parent / "cookies"
+DEFAULT_COOKIES_PATH = COOKIES_DIR / "xhs_cookies.json"
+
+
+@dataclass(frozen=True)
+class Account:
+    name: str
+    cookies_path: Path
+    # Minimum number of seconds between two posts of this account.
+    min_interval: float = ACCOUNT_MIN_INTERVAL
+
+
+DEFAULT_ACCOUNT = Account("default", DEFAULT_COOKIES_PATH)
+
+
+def load_accounts(spec: str = XHS_ACCOUNTS) -> List[Account]:
+    """Parse an account spec such as ``"alice,bob:900"``.
+
+    Every entry is an account name, optionally followed by ``:<seconds>`` to
+    override the minimum interval between its posts.
+    """
+    accounts = []
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        name, _, interval = entry.partition(":")
+        accounts.append(Account(
+            name=name,
+            cookies_path=COOKIES_DIR / f"{name}.json",
+            min_interval=float(interval) if interval else ACCOUNT_MIN_INTERVAL,
+        ))
+    return accounts or [DEFAULT_ACCOUNT]
+
+
+def load_cookies(account: Account) -> list:
+    """Cookies of the account's jar (Playwright format); empty if none were saved."""
+    if not account.cookies_path.exists():
+        return []
+    return json.loads(account.cookies_path.read_text())
+
+
+def save_cookies(account: Account, cookies: list):
+    """Replace the account's cookie jar atomically, so neither a crash nor a
+    concurrent reader ever sees half a file."""
+    path = account.cookies_path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_text(json.dumps(cookies, ensure_ascii=False, indent=2))
+    os.replace(tmp, path)
@@ -0,0 +1,112 @@
+# buffer for autoRed
+
+"""Pre-generation buffer of ready-to-publish posts.
+
+A producer keeps ``BUFFER_SIZE`` validated posts (content + images on disk)
+in the job store during idle hours. At the scheduled time the publisher only
+pops the oldest buffered post and publishes it, so the publish time no longer
+depends on LLM or image API latency. Both run as coroutines on the
+scheduler's event loop.
+"""
+from datetime import datetime
+from typing import Optional
+
+from src.jobstore import JobStore, Job, PENDING, CONTENT_GENERATED, IMAGES_RENDERED
+from src.publisher import PublisherPool
+from src.worker import aprepare, apublish, aprocess, enqueue
+from src.json_stream import CONTENT_FIELDS
+from src.dedup import get_dedup_index
+from config.settings import BUFFER_SIZE, BUFFER_IDLE_HOURS, GENERATION_SEED
+
+DUPLICATE = "repeats a published post"
+
+
+def _in_idle_hours(now: datetime, spec: str = BUFFER_IDLE_HOURS) -> bool:
+    """Whether `now` falls in a window like ``"1-7"`` (hours, end exclusive,
+    may wrap past midnight). An empty or malformed spec means always idle."""
+    if not spec:
+        return True
+    try:
+        start, end = (int(h) for h in spec.split("-"))
+    except ValueError:
+        start = end = -1
+    if not (0 <= start <= 24 and 0 <= end <= 24):
+        print(f"[autoRed] Ignoring malformed BUFFER_IDLE_HOURS '{spec}', expected e.g. '1-7'.")
+        return True
+    if start <= end:
+        return start <= now.hour < end
+    return now.hour >= start or now.hour < end
+
+
+def validate(job: Job, mode: str = "prod") -> Optional[str]:
+    """Return why a buffered post cannot be published, or None if it can."""
+    missing = [key for key in CONTENT_FIELDS if not job.content.get(key)]
+    if missing:
+        return f"content lacks {missing}"
+    if not job.images:
+        return "no images"
+    for path in job.images:
+        if not path.exists() or path.stat().st_size == 0:
+            return f"image {path} missing or empty"
+    index = get_dedup_index(mode)
+    duplicate = index.find_text(job.content) or index.find_images(job.images)
+    if duplicate:
+        return f"{DUPLICATE} ({duplicate})"
+    return None
+
+
+async def top_up(store: JobStore, target: int = BUFFER_SIZE, mode: str = "prod", force: bool = False) -> int:
+    """Generate posts until `target` posts are ready. Only runs during
+    ``BUFFER_IDLE_HOURS`` unless `force` is set. Returns the number of ready
+    posts afterwards."""
+    if not force and not _in_idle_hours(datetime.now()):
+        return store.counts().get(IMAGES_RENDERED, 0)
+    counts = store.counts()
+    in_flight = counts.get(PENDING, 0) + counts.get(CONTENT_GENERATED, 0)
+    missing = target - counts.get(IMAGES_RENDERED, 0) - in_flight
+    if missing > 0:
+        seeds = None
+        if GENERATION_SEED is not None:
+            # Continue the seed sequence after the posts already in the store.
+            offset = sum(counts.values())
+            seeds = [GENERATION_SEED + offset + i for i in range(missing)]
+        enqueue(store, missing, seeds=seeds)
+    while True:
+        job = store.claim((PENDING, CONTENT_GENERATED))
+        if job is None:
+            break
+        await aprepare(store, job, mode)
+    ready = store.counts().get(IMAGES_RENDERED, 0)
+    print(f"[autoRed] Buffer holds {ready}/{target} ready posts.")
+    return ready
+
+
+async def publish_next(store: JobStore, pool: Optional[PublisherPool] = None, mode: str = "prod") -> bool:
+    """Publish the oldest valid buffered post. Falls back to generating a post
+    on the spot when the buffer is empty."""
+    while True:
+        job = store.claim((IMAGES_RENDERED,))
+        if job is None:
+            break
+        problem = validate(job, mode)
+        if problem is None:
+            break
+        print(f"[autoRed] Buffered post #{job.id} is invalid ({problem}); sending it back for regeneration.")
+        # A repeat of a published post needs new text, not just new images.
+        regenerate = not job.content or problem.startswith(DUPLICATE)
+        store.advance(job, PENDING if regenerate else CONTENT_GENERATED)
+        store.release(job)
+    if job is None:
+        print("[autoRed] Buffer empty, generating a post on the critical path.")
+        enqueue(store, 1)
+        job = store.claim()
+        return job is not None and await aprocess(store, job, mode, pool)
+    try:
+        await apublish(store, job, pool, mode)
+    except Exception as e:
+        print(f"[autoRed] Job #{job.id} failed to publish: {e}")
+        store.fail(job, str(e))
+        return False
+    store.release(job)
+    print(f"[autoRed] Job #{job.id} published from buffer.")
+    return True
@@ -0,0 +1,130 @@
+# cache for autoRed
+
+"""Content-addressed on-disk cache for generation results.
+
+Entries are keyed by a hash of everything that determines the output
+(provider, model, prompt, sampling parameters, seed), so reruns, retries and
+experiments with identical inputs reuse earlier LLM JSON and image bytes
+instead of calling the APIs again. Unseeded generations are random by design
+and get no key (``None``), which the cache ignores. The cache is bounded by
+total size and evicts least recently used entries first.
+"""
+import os
+import json
+import hashlib
+import threading
+from pathlib import Path
+from typing import Any, Optional
+
+from config.settings import CACHE_DIR, CACHE_MAX_MB, CACHE_ENABLED
+
+
+class ResultCache:
+    def __init__(self, root: Path = CACHE_DIR, max_bytes: int = CACHE_MAX_MB * 1024 * 1024,
+                 enabled: bool = CACHE_ENABLED):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        # Number and total size of the entries, scanned once and then kept
+        # up to date.
+        self._count = 0
+        self._total: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(**parts) -> str:
+        """Stable hash of the keyword arguments describing a generation."""
+        canonical = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def get_bytes(self, key: Optional[str]) -> Optional[bytes]:
+        if not self.enabled or key is None:
+            return None
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        # Bump the modification time so eviction sees the entry as recently used.
+        os.utime(path)
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put_bytes(self, key: Optional[str], data: bytes):
+        if not self.enabled or key is None:
+            return
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        with self._lock:
+            self._scan()
+            try:
+                replaced = path.stat().st_size
+            except FileNotFoundError:
+                replaced = None
+                self._count += 1
+            os.replace(tmp, path)
+            self._total += len(data) - (replaced or 0)
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def get_json(self, key: Optional[str]) -> Optional[Any]:
+        data = self.get_bytes(key)
+        return json.loads(data) if data is not None else None
+
+    def put_json(self, key: Optional[str], value: Any):
+        self.put_bytes(key, json.dumps(value, ensure_ascii=False).encode("utf-8"))
+
+    def _entries(self):
+        return [p for p in self.root.glob("*/*") if not p.name.endswith(".tmp")]
+
+    def _scan(self):
+        if self._total is None:
+            sizes = [p.stat().st_size for p in self._entries()]
+            self._count, self._total = len(sizes), sum(sizes)
+
+    def _evict(self):
+        # Only runs once the running total is over the limit; the directory is
+        # scanned then, which also corrects the total for other processes' writes.
+        entries = [(p, p.stat()) for p in self._entries()]
+        count, total = len(entries), sum(st.st_size for _, st in entries)
+        for path, st in sorted(entries, key=lambda e: e[1].st_mtime):
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                continue
+            total -= st.st_size
+            count -= 1
+        self._count, self._total = count, total
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._scan()
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": self._count,
+                "bytes": self._total,
+            }
+
+
+_cache = None
+
+
+def get_cache() -> ResultCache:
+    """Process-wide cache instance."""
+    global _cache
+    if _cache is None:
+        _cache = ResultCache()
+    return _cache
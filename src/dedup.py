@@ -0,0 +1,178 @@
+# dedup for autoRed
+
+"""Near-duplicate detection against the posts published so far.
+
+Every published post leaves fingerprints in a small SQLite index: a 64-bit
+SimHash of its title, copy and image prompt and a 64-bit difference hash
+(dHash) of each image. New text is compared right after it is generated and
+new images right after they are rendered, so a repeat is rejected before the
+next, more expensive stage runs instead of being noticed after publishing.
+"""
+import io
+import re
+import time
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from src.json_stream import CONTENT_FIELDS
+from src.media import EncodedImage
+from config.settings import DEDUP_ENABLED, DEDUP_DB_PATH, DEDUP_TEXT_DISTANCE, DEDUP_IMAGE_DISTANCE
+
+IMAGE = "image"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fingerprints (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    title TEXT,
+    created_at REAL NOT NULL
+);
+"""
+
+
+def _normalize(text: str) -> str:
+    # Case, whitespace, punctuation and emoji do not make a post new.
+    return re.sub(r"[\W_]+", "", text.lower())
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash of the character 3-grams of `text`."""
+    text = _normalize(text)
+    weights = [0] * 64
+    for i in range(max(1, len(text) - 2)):
+        digest = hashlib.blake2b(text[i:i + 3].encode("utf-8"), digest_size=8).digest()
+        h = int.from_bytes(digest, "big")
+        for bit in range(64):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def dhash(image: Union[Path, EncodedImage]) -> int:
+    """64-bit difference hash: brightness gradients of a 9x8 grayscale thumbnail."""
+    from PIL import Image
+
+    source = io.BytesIO(image.data) if isinstance(image, EncodedImage) else image
+    with Image.open(source) as img:
+        # One byte per pixel in mode "L".
+        pixels = img.convert("L").resize((9, 8), Image.Resampling.LANCZOS).tobytes()
+    bits = (pixels[row * 9 + col] < pixels[row * 9 + col + 1] for row in range(8) for col in range(8))
+    return sum(1 << i for i, bit in enumerate(bits) if bit)
+
+
+def _name(image: Union[Path, EncodedImage]) -> str:
+    return image.name if isinstance(image, EncodedImage) else str(image)
+
+
+def distance(a: int, b: int) -> int:
+    """Hamming distance between two hashes."""
+    return bin(a ^ b).count("1")
+
+
+class DedupIndex:
+    def __init__(self, path: Path = DEDUP_DB_PATH, text_distance: int = DEDUP_TEXT_DISTANCE,
+                 image_distance: int = DEDUP_IMAGE_DISTANCE, enabled: bool = DEDUP_ENABLED):
+        self.path = Path(path)
+        self.text_distance = text_distance
+        self.image_distance = image_distance
+        self.enabled = enabled
+        self._conn = None
+        # Fingerprints by kind as (hash, title of the post); a few thousand
+        # posts compare faster in memory than any query could.
+        self._hashes: Dict[str, List[Tuple[int, str]]] = {}
+        self._lock = threading.Lock()
+        if enabled:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+            for kind, value, title in self._conn.execute("SELECT kind, hash, title FROM fingerprints"):
+                self._hashes.setdefault(kind, []).append((int(value, 16), title or ""))
+
+    def _nearest(self, kind: str, value: int, max_distance: int) -> Optional[str]:
+        with self._lock:
+            for known, title in self._hashes.get(kind, ()):
+                if distance(value, known) <= max_distance:
+                    return title
+        return None
+
+    def find_text(self, content: dict) -> Optional[str]:
+        """Describe the published post `content` repeats, or None if it is new."""
+        if not self.enabled:
+            return None
+        for key in CONTENT_FIELDS:
+            if content.get(key):
+                title = self._nearest(key, simhash(content[key]), self.text_distance)
+                if title is not None:
+                    return f"{key} matches '{title}'"
+        return None
+
+    def find_images(self, images: Iterable[Union[Path, EncodedImage]]) -> Optional[str]:
+        """Describe the published post one of `images` repeats, or None."""
+        if not self.enabled:
+            return None
+        for image in images:
+            try:
+                value = dhash(image)
+            except OSError as e:
+                print(f"[autoRed] Could not fingerprint image {_name(image)}: {e}")
+                continue
+            title = self._nearest(IMAGE, value, self.image_distance)
+            if title is not None:
+                return f"image {_name(image)} matches '{title}'"
+        return None
+
+    def add(self, content: dict, images: Iterable[Union[Path, EncodedImage]] = ()):
+        """Record a published post."""
+        if not self.enabled:
+            return
+        title = content.get("title", "")
+        rows = [(key, simhash(content[key])) for key in CONTENT_FIELDS if content.get(key)]
+        for image in images:
+            try:
+                rows.append((IMAGE, dhash(image)))
+            except OSError as e:
+                print(f"[autoRed] Could not fingerprint image {_name(image)}: {e}")
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO fingerprints (kind, hash, title, created_at) VALUES (?, ?, ?, ?)",
+                [(kind, f"{value:016x}", title, now) for kind, value in rows],
+            )
+            for kind, value in rows:
+                self._hashes.setdefault(kind, []).append((value, title))
+
+    def counts(self) -> dict:
+        """Number of fingerprints per kind."""
+        with self._lock:
+            return {kind: len(hashes) for kind, hashes in self._hashes.items()}
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+
+
+_index = None
+_test_index = None
+_index_lock = threading.Lock()
+
+
+def get_dedup_index(mode: str = "prod") -> DedupIndex:
+    """Process-wide index instance.
+
+    Test mode renders the same sample images on every run, so it gets a
+    throwaway in-memory index instead of rejecting them as repeats of the
+    previous test run (and leaving them in the real index).
+    """
+    global _index, _test_index
+    with _index_lock:
+        if mode == "test":
+            if _test_index is None:
+                _test_index = DedupIndex(path=Path(":memory:"))
+            return _test_index
+        if _index is None:
+            _index = DedupIndex()
+        return _index
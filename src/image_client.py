@@ -5,29 +5,88 @@ Provides a function to generate a set of images given a textual prompt.
 """
 
 import os
-from typing import List
+import uuid
+import random
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import TYPE_CHECKING, List, Optional, Union
 from pathlib import Path
 
-from google import genai
-from google.genai import types
-
-from huggingface_hub import InferenceClient
+if TYPE_CHECKING:
+    from huggingface_hub import InferenceClient
 
 
 # Load API key and model name from settings
-from config.settings import IMAGE_MODEL_NAME
+from config.settings import IMAGE_MODEL_NAME, IMAGE_WORKERS, IMAGE_FORMAT, IMAGE_QUALITY, IMAGE_MAX_DIMENSION
+from config.settings import IMAGE_BASE_URL, IMAGE_EARLY_START
+from src.media import EncodedImage, encode_image, extension, mime_type
+from src.cache import ResultCache, get_cache
+from src.metrics import traced, current_span
+
+IMAGE_PROVIDER = "replicate"
+IMAGE_MODEL = "Tongyi-MAI/Z-Image-Turbo"
+
 
+# Appended to the prompt of the 2nd..6th image so a carousel is not six copies
+# of the same picture.
+PROMPT_VARIATIONS = [
+    "",
+    "different pose",
+    "close-up shot",
+    "different camera angle",
+    "full-body shot",
+    "candid moment",
+]
 
 
-def generate_images(prompt: str, count: int = 3, mode="test") -> List[Path]:
-    """Generate `count` images using the Imagen model.
+@traced("image.render", provider=IMAGE_PROVIDER)
+def _render_image(client: "InferenceClient", prompt: str, seed: int, name: str,
+                  cacheable: bool = True) -> EncodedImage:
+    """Render one image (or reuse a cached one), encoded for upload."""
+    cache = get_cache()
+    cache_key = ResultCache.key(kind="image", provider=IMAGE_PROVIDER, model=IMAGE_MODEL, prompt=prompt, seed=seed,
+                                fmt=IMAGE_FORMAT, quality=IMAGE_QUALITY,
+                                max_dimension=IMAGE_MAX_DIMENSION) if cacheable else None
+    cached = cache.get_bytes(cache_key)
+    if cached is not None:
+        current_span().set(cache="hit")
+        print("[autoRed] Image served from cache.")
+        return EncodedImage(name=name + extension(), mime_type=mime_type(), data=cached)
+
+    image = client.text_to_image(
+        prompt,
+        # A client bound to IMAGE_BASE_URL serves a single model.
+        model=None if IMAGE_BASE_URL else IMAGE_MODEL,
+        seed=seed,
+    )
+    # Encoding runs here, on the worker thread, so images encode in parallel.
+    encoded = encode_image(image, name)
+    current_span().add_bytes(len(encoded.data))
+    cache.put_bytes(cache_key, encoded.data)
+    return encoded
+
+
+@traced("image.generate")
+def generate_images(prompt: str, count: int = 3, mode="test", job_id: Optional[str] = None,
+                    seed: Optional[int] = None, in_memory: bool = False) -> List[Union[Path, EncodedImage]]:
+    """Generate `count` images concurrently, encoded for upload.
 
     Args:
         prompt: Text prompt describing the desired image.
         count: Number of images to generate (default 3, max 6).
+        job_id: Name of the output directory for this job. A unique one is
+            generated when omitted, so concurrent jobs never share files.
+        seed: Optional base sampling seed; image i uses ``seed + i``. Results
+            are cached by prompt and seed, so repeating a prompt with the same
+            seed reuses the earlier images. Unseeded renders are not cached.
+        in_memory: Return the encoded images as :class:`EncodedImage` buffers
+            instead of writing them to disk.
 
     Returns:
-        List of file paths to the saved images.
+        List of file paths to the saved images (or in-memory images), in
+        completion order.
     """
     if count < 1 or count > 6:
         raise ValueError("count must be between 1 and 6")
@@ -38,11 +97,19 @@ def generate_images(prompt: str, count: int = 3, mode="test") -> List[Path]:
             Path(__file__).parent.parent / "output" / "images" / "generated1.png"
         ]
 
+    # Save images to a per-job directory within the project
+    job_id = job_id or f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}"
+    output_dir = Path(__file__).parent.parent / "output" / "images" / job_id
+
     # client = genai.Client()
-    client = InferenceClient(
-        provider="replicate",
-        api_key=os.environ["HF_TOKEN"],
-    )
+    from huggingface_hub import InferenceClient
+    if IMAGE_BASE_URL:
+        client = InferenceClient(base_url=IMAGE_BASE_URL, api_key=os.environ["HF_TOKEN"])
+    else:
+        client = InferenceClient(
+            provider=IMAGE_PROVIDER,
+            api_key=os.environ["HF_TOKEN"],
+        )
     # The Imagen API can generate multiple images in a single request when `candidate_count` is set.
     # response = client.models.generate_images(
     #     model=IMAGE_MODEL_NAME,
@@ -51,21 +118,75 @@ def generate_images(prompt: str, count: int = 3, mode="test") -> List[Path]:
     #         number_of_images=count,
     #     ),
     # )
-    image = client.text_to_image(
-        prompt,
-        model="Tongyi-MAI/Z-Image-Turbo",
-    )
+    base_seed = seed if seed is not None else random.randint(1, 2**31 - 1)
+    results = []
+    with ThreadPoolExecutor(max_workers=min(count, IMAGE_WORKERS)) as executor:
+        futures = []
+        for idx in range(count):
+            variant = f"{prompt}, {PROMPT_VARIATIONS[idx]}" if PROMPT_VARIATIONS[idx] else prompt
+            name = f"{job_id}_{idx + 1}"
+            # Run in a copy of this context so the render spans nest under image.generate.
+            futures.append(executor.submit(contextvars.copy_context().run,
+                                           _render_image, client, variant, base_seed + idx, name,
+                                           seed is not None))
+        for future in as_completed(futures):
+            try:
+                encoded = future.result()
+            except Exception as e:
+                print(f"[autoRed] Image generation failed: {e}")
+                continue
+            if in_memory:
+                results.append(encoded)
+            else:
+                output_dir.mkdir(parents=True, exist_ok=True)
+                file_path = output_dir / encoded.name
+                file_path.write_bytes(encoded.data)
+                results.append(file_path)
+    if not results:
+        raise RuntimeError("no image could be generated")
+    return results
+
+
+class EarlyRender:
+    """Render the images of a post while its text is still being generated.
+
+    Pass :meth:`start` as ``on_image_prompt`` to the text generation: the first
+    image prompt reported starts :func:`generate_images` in the background.
+    :meth:`result` returns those images when the final content element kept
+    that prompt, and renders the final prompt otherwise (e.g. when a different
+    hedged provider won the race).
+
+    Args:
+        **kwargs: Passed to :func:`generate_images` along with the prompt.
+    """
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.prompt: Optional[str] = None
+        self._future = None
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def start(self, prompt: str):
+        with self._lock:
+            if self._future is not None or not IMAGE_EARLY_START:
+                return
+            self.prompt = prompt.strip()
+            self._executor = ThreadPoolExecutor(max_workers=1)
+            self._future = self._executor.submit(contextvars.copy_context().run,
+                                                 generate_images, self.prompt, **self.kwargs)
+        print("[autoRed] Image prompt complete, rendering started early.")
 
-    # Save images to a temporary directory within the project
-    output_dir = Path(__file__).parent.parent / "output" / "images"
-    output_dir.mkdir(parents=True, exist_ok=True)
-    saved_paths = []
-    image.save(output_dir / "generated.png")
-    saved_paths.append(output_dir / "generated.png")
-    # for idx, img in enumerate(response.candidates):
-    #     # Each candidate contains a `image` field with base64 data.
-    #     image_data = img.image  # This is a `PIL.Image.Image` object.
-    #     file_path = output_dir / f"generated_{idx + 1}.png"
-    #     image_data.save(file_path)
-    #     saved_paths.append(file_path)
-    return saved_paths
+    def result(self, prompt: str) -> List[Union[Path, EncodedImage]]:
+        """Images for the final `prompt`, reusing the early render if it matches."""
+        with self._lock:
+            future, early_prompt = self._future, self.prompt
+        try:
+            if future is not None and early_prompt == prompt.strip():
+                return future.result()
+            if future is not None:
+                print("[autoRed] Final image prompt differs from the early one, rendering again.")
+            return generate_images(prompt, **self.kwargs)
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
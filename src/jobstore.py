@@ -0,0 +1,181 @@
+# jobstore for autoRed
+
+"""Durable SQLite store of posts and the state each one has reached.
+
+A post moves through ``pending -> content_generated -> images_rendered ->
+published`` (or ``failed`` after too many attempts) and the artifacts of every
+finished stage are recorded with it. After a crash a post is picked up again at
+the stage that failed, so expensive generation steps are never redone.
+"""
+import json
+import time
+import random
+import sqlite3
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+from config.settings import JOB_DB_PATH, JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS
+
+PENDING = "pending"
+CONTENT_GENERATED = "content_generated"
+IMAGES_RENDERED = "images_rendered"
+PUBLISHED = "published"
+FAILED = "failed"
+
+# States a worker still has to act on, in pipeline order.
+OPEN_STATES = (PENDING, CONTENT_GENERATED, IMAGES_RENDERED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS posts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    state TEXT NOT NULL,
+    seed INTEGER,
+    combination TEXT,
+    content TEXT,
+    images TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    locked_until REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS posts_state ON posts (state, id);
+"""
+
+
+def random_seed() -> int:
+    return random.randint(1, 2**31 - 1)
+
+
+@dataclass
+class Job:
+    id: int
+    state: str
+    seed: Optional[int] = None
+    # Style, mood, ethnicity and scene drawn for the post, if any.
+    combination: Optional[dict] = None
+    content: dict = field(default_factory=dict)
+    images: List[Path] = field(default_factory=list)
+    attempts: int = 0
+    error: Optional[str] = None
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> "Job":
+        return cls(
+            id=row["id"],
+            state=row["state"],
+            seed=row["seed"],
+            combination=json.loads(row["combination"]) if row["combination"] else None,
+            content=json.loads(row["content"]) if row["content"] else {},
+            images=[Path(p) for p in json.loads(row["images"])] if row["images"] else [],
+            attempts=row["attempts"],
+            error=row["error"],
+        )
+
+
+class JobStore:
+    def __init__(self, path: Path = JOB_DB_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # One connection shared by the worker threads, serialised by a lock.
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def enqueue(self, n: int = 1, seeds: Optional[Iterable[Optional[int]]] = None,
+                combinations: Optional[Iterable[Optional[dict]]] = None) -> List[int]:
+        """Queue `n` new posts and return their ids.
+
+        A post without a seed gets a random one, stored with it, so every retry
+        of the post sends identical requests and hits the result cache.
+        """
+        seeds = list(seeds) if seeds is not None else [None] * n
+        combinations = list(combinations) if combinations is not None else [None] * len(seeds)
+        now = time.time()
+        with self._lock:
+            return [
+                self._conn.execute(
+                    "INSERT INTO posts (state, seed, combination, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                    (PENDING, seed if seed is not None else random_seed(),
+                     json.dumps(combination, ensure_ascii=False) if combination else None, now, now),
+                ).lastrowid
+                for seed, combination in zip(seeds, combinations)
+            ]
+
+    def claim(self, states: Iterable[str] = OPEN_STATES, lease: float = JOB_LEASE_SECONDS) -> Optional[Job]:
+        """Lease the oldest post in one of `states` for exclusive processing.
+
+        The lease expires after `lease` seconds, so posts held by a crashed
+        worker become claimable again.
+        """
+        states = tuple(states)
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    f"SELECT * FROM posts WHERE state IN ({','.join('?' * len(states))}) "
+                    "AND (locked_until IS NULL OR locked_until < ?) ORDER BY id LIMIT 1",
+                    (*states, now),
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute("UPDATE posts SET locked_until = ? WHERE id = ?", (now + lease, row["id"]))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return Job.from_row(row) if row is not None else None
+
+    def advance(self, job: Job, state: str, content: Optional[dict] = None, images: Optional[List[Path]] = None):
+        """Record a finished stage. The lease is kept so the worker can go on."""
+        if content is not None:
+            job.content = content
+        if images is not None:
+            job.images = list(images)
+        job.state = state
+        with self._lock:
+            self._conn.execute(
+                "UPDATE posts SET state = ?, content = ?, images = ?, error = NULL, updated_at = ? WHERE id = ?",
+                (state, json.dumps(job.content, ensure_ascii=False),
+                 json.dumps([str(p) for p in job.images]), time.time(), job.id),
+            )
+
+    def release_all(self):
+        """Drop every lease, e.g. on startup of the only worker process after
+        a crash, so unfinished posts resume right away."""
+        with self._lock:
+            self._conn.execute("UPDATE posts SET locked_until = NULL WHERE locked_until IS NOT NULL")
+
+    def release(self, job: Job):
+        with self._lock:
+            self._conn.execute("UPDATE posts SET locked_until = NULL WHERE id = ?", (job.id,))
+
+    def fail(self, job: Job, error: str, max_attempts: int = JOB_MAX_ATTEMPTS):
+        """Record a failed attempt; the post is retried until `max_attempts`."""
+        job.attempts += 1
+        job.error = error
+        if job.attempts >= max_attempts:
+            job.state = FAILED
+        with self._lock:
+            self._conn.execute(
+                "UPDATE posts SET state = ?, attempts = ?, error = ?, locked_until = NULL, updated_at = ? WHERE id = ?",
+                (job.state, job.attempts, error, time.time(), job.id),
+            )
+
+    def get(self, job_id: int) -> Optional[Job]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM posts WHERE id = ?", (job_id,)).fetchone()
+        return Job.from_row(row) if row is not None else None
+
+    def counts(self) -> dict:
+        """Number of posts per state."""
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) AS n FROM posts GROUP BY state").fetchall()
+        return {row["state"]: row["n"] for row in rows}
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,177 @@
+# json_stream for autoRed
+
+"""Incremental extraction of the content element from LLM output.
+
+Models wrap the requested JSON object in ```json fences, put prose around it
+or leave trailing commas behind. :class:`JsonObjectStream` consumes the
+output chunk by chunk as it is streamed, finds the first complete JSON object
+in it regardless of what surrounds it, and reports every top-level string
+field the moment its closing quote arrives, so the image stage can start on
+``image_prompt`` while the title and copy are still being generated.
+"""
+import json
+import re
+from typing import Callable, Optional
+
+# Fields every content element must have.
+CONTENT_FIELDS = ("image_prompt", "title", "copy")
+
+
+class ContentError(ValueError):
+    """The model output holds no usable content element."""
+
+
+def _strip_trailing_commas(text: str) -> str:
+    """Remove commas directly before a closing brace/bracket, outside strings."""
+    out = []
+    in_string = escape = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "," and text[i + 1:].lstrip()[:1] in ("}", "]"):
+            continue
+        out.append(ch)
+    return "".join(out)
+
+
+def loads_lenient(text: str):
+    """``json.loads`` that accepts trailing commas and raw newlines in strings."""
+    try:
+        return json.loads(text, strict=False)
+    except json.JSONDecodeError:
+        return json.loads(_strip_trailing_commas(text), strict=False)
+
+
+class JsonObjectStream:
+    """Find the first complete JSON object in streamed text.
+
+    Args:
+        on_field: Called as ``on_field(key, value)`` for each top-level string
+            value as soon as it is complete.
+    """
+
+    def __init__(self, on_field: Optional[Callable[[str, str], None]] = None):
+        self.on_field = on_field
+        self.result: Optional[dict] = None
+        self._buffer = ""
+        self._pos = 0
+        self._reset_scan()
+
+    def _reset_scan(self):
+        self._start = -1  # index of the candidate object's opening brace
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._key: Optional[str] = None
+        self._expect_value = False
+        self._emitted = {}
+
+    @property
+    def done(self) -> bool:
+        return self.result is not None
+
+    def feed(self, chunk: str) -> Optional[dict]:
+        """Consume the next piece of output. Returns the object once complete."""
+        if self.done:
+            return self.result
+        self._buffer += chunk
+        buf = self._buffer
+        i = self._pos
+        while i < len(buf):
+            ch = buf[i]
+            if self._start < 0:
+                if ch == "{":
+                    self._start, self._depth = i, 1
+                i += 1
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._top_level_string(buf[self._string_start:i])
+            elif ch == '"':
+                self._in_string = True
+                self._string_start = i + 1
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    candidate = buf[self._start:i + 1]
+                    try:
+                        obj = loads_lenient(candidate)
+                    except json.JSONDecodeError:
+                        obj = None
+                    if isinstance(obj, dict):
+                        self.result = obj
+                        self._pos = i + 1
+                        return obj
+                    # Not JSON after all (e.g. braces in prose): rescan after it.
+                    i = self._start + 1
+                    self._reset_scan()
+                    continue
+            elif self._depth == 1:
+                if ch == ":":
+                    self._expect_value = True
+                elif ch == ",":
+                    self._key, self._expect_value = None, False
+            i += 1
+        self._pos = i
+        return None
+
+    def _top_level_string(self, raw: str):
+        try:
+            value = json.loads(f'"{raw}"', strict=False)
+        except json.JSONDecodeError:
+            value = raw
+        if not self._expect_value:
+            self._key = value
+            return
+        key, self._key, self._expect_value = self._key, None, False
+        if key is not None and key not in self._emitted:
+            self._emitted[key] = value
+            if self.on_field:
+                self.on_field(key, value)
+
+    def close(self) -> dict:
+        """End of output: return the object or raise :class:`ContentError`."""
+        if self.result is None and self._start >= 0:
+            # An unbalanced brace in prose can hide the real object; retry from
+            # every later opening brace.
+            for start in (m.start() for m in re.finditer(r"\{", self._buffer[self._start + 1:])):
+                retry = JsonObjectStream()
+                if retry.feed(self._buffer[self._start + 1 + start:]) is not None:
+                    self.result = retry.result
+                    break
+        if self.result is None:
+            raise ContentError(f"no complete JSON object in output: {self._buffer[:200]!r}")
+        return self.result
+
+
+def validate_content(obj) -> dict:
+    """Check a content element against the schema and normalise its fields."""
+    if not isinstance(obj, dict):
+        raise ContentError(f"expected a JSON object, got {type(obj).__name__}")
+    missing = [key for key in CONTENT_FIELDS if not isinstance(obj.get(key), str) or not obj[key].strip()]
+    if missing:
+        raise ContentError(f"content element lacks {missing}")
+    return {**obj, **{key: obj[key].strip() for key in CONTENT_FIELDS}}
+
+
+def parse_content(text: str) -> dict:
+    """Extract and validate the content element from a complete model output."""
+    stream = JsonObjectStream()
+    stream.feed(text)
+    return validate_content(stream.close())
@@ -3,21 +3,43 @@
 """Module to interact with Google Gemini Flash for text generation.
 Provides functions to generate image prompts and post content.
 """
-import os
-import requests
 import random
+import asyncio
+from functools import partial
+from typing import AsyncIterator, Callable, List, Optional
 from tenacity import retry, stop_after_attempt, wait_fixed
-from google import genai
-from openai import OpenAI
 import json
 
-# Load API key from settings
-from config.settings import TEXT_MODEL_NAME
-
+from src.providers import (
+    get_openai_client,
+    get_async_openai_client,
+    get_session,
+    get_async_http,
+    get_gemini_client,
+    run_blocking,
+    provider_url,
+    provider_headers,
+)
+from src.router import ProviderRouter, served_from_cache
+from src.utils import AsyncRateLimiter
+from src.cache import ResultCache, get_cache
+from src.metrics import span, traced, current_span
+from src.dedup import get_dedup_index
+from src.sampler import CoverageSampler
+from src.json_stream import CONTENT_FIELDS, ContentError, JsonObjectStream, parse_content, validate_content
 
-@retry(stop=stop_after_attempt(2), wait=wait_fixed(2))
-def generate_content_element():
-    SYSTEM_PROMPT_FULL = """
+# Load API key from settings
+from config.settings import (
+    GOOGLE_API_KEY,
+    TEXT_MODEL_NAME,
+    LLM_TIMEOUT,
+    TEXT_CONCURRENCY,
+    TEXT_PROVIDERS,
+    TEXT_PROVIDER_MIN_INTERVAL,
+    DEDUP_MAX_TRIES,
+)
+
+SYSTEM_PROMPT_FULL = """
     【系统元指令：小红书内容三合一生成器】
 
     你是一个专业的图像生成提示词（Prompt）专家和社交媒体内容创作者，精通生成高吸引力、暗示性强的艺术肖像和高互动性文案技巧。你的目标是根据用户请求，同时生成以下三项内容：
@@ -45,12 +67,21 @@ def generate_content_element():
     ```
     """
 
+# Style and mood pools the Cloudflare generator samples from
+STYLES = ["赛博朋克", "古典", "韩系温柔", "日系动漫", "油画质感", "Cinematic 电影感", "写实", "极简主义", "超现实主义", "蒸汽波"]
+MOODS = ["甜美", "性感", "妩媚", "自信", "慵懒", "思考", "俏皮", "空灵", "治愈", "神秘", "忧郁", "梦幻"]
+ETHNICITIES = ["东亚", "东南亚", "南亚", "高加索", "拉丁裔", "非洲裔", "中东"]
+SCENES = ["东京街头霓虹灯下的雨夜", "被阳光洒满的复古咖啡馆", "水墨画风格的竹林", "摩洛哥蓝色小镇的露台",
+          "海边日落的沙滩", "落雪的北欧森林小屋", "巴黎老式公寓的窗边", "盛开的樱花大道"]
+
+CLOUDFLARE_TEXT_MODEL = "@cf/openai/gpt-oss-20b"
+
+
+@retry(stop=stop_after_attempt(2), wait=wait_fixed(2))
+def generate_content_element():
     USER_REQUEST = "Create a detailed, vivid description for a high-quality AI-generated portrait of a beautiful woman. Generate the image prompt, title, and copy based on this request."
 
-    client = OpenAI(
-        base_url="https://router.huggingface.co/v1",
-        api_key=os.environ["HF_TOKEN"],
-    )
+    client = get_openai_client("hf")
 
     completion = client.chat.completions.create(
         model="deepseek-ai/DeepSeek-V3.2",
@@ -73,24 +104,15 @@ def generate_content_element():
     # ----------------------------------------------------
     # 关键步骤：解析 JSON 字符串
     # ----------------------------------------------------
+    # 容忍 ```json 标记、前后说明文字和多余的逗号；只有确实没有可用内容时才抛出
+    # ContentError，由 tenacity 重试。
     try:
-        # 尝试清理和加载 JSON (有时 LLM 会在 JSON 前后输出 ```json 标记)
-        if raw_output.strip().startswith("```json"):
-            json_str = raw_output.strip().strip("```json").strip("```").strip()
-        else:
-            json_str = raw_output.strip()
-
-        result_data = json.loads(json_str)
-        return result_data
-
-    except json.JSONDecodeError as e:
+        return parse_content(raw_output)
+    except ContentError as e:
         print("JSON 解析失败。LLM 可能未严格遵循 JSON 格式。")
         print(f"原始输出: \n{raw_output}")
         print(f"错误信息: {e}")
-
-
-
-
+        raise
 
 
 @retry(stop=stop_after_attempt(2), wait=wait_fixed(2))
@@ -107,10 +129,7 @@ def generate_image_prompt() -> str:
     #     model="gemini-2.5-flash",
     #     contents=prompt
     # )
-    client = OpenAI(
-        base_url="https://router.huggingface.co/v1",
-        api_key=os.environ["HF_TOKEN"],
-    )
+    client = get_openai_client("hf")
     completion = client.chat.completions.create(
         model="deepseek-ai/DeepSeek-V3.2:novita",
         messages=[
@@ -144,10 +163,7 @@ def generate_post_content(image_context: str) -> dict:
     #     contents=prompt
     # )
     # Expect the model to return title and copy separated by a newline.
-    client = OpenAI(
-        base_url="https://router.huggingface.co/v1",
-        api_key=os.environ["HF_TOKEN"],
-    )
+    client = get_openai_client("hf")
     completion = client.chat.completions.create(
         model="deepseek-ai/DeepSeek-V3.2:novita",
         messages=[
@@ -165,64 +181,156 @@ def generate_post_content(image_context: str) -> dict:
     return {"title": title, "copy": copy}
 
 
-def generate_content_element_cloudflare():
-    """Generate content element (JSON) using Cloudflare AI REST API."""
-    SYSTEM_PROMPT_FULL = """
-    【系统元指令：小红书内容三合一生成器】
+_sampler = None
 
-    你是一个专业的图像生成提示词（Prompt）专家和社交媒体内容创作者，精通生成高吸引力、暗示性强的艺术肖像和高互动性文案技巧。你的目标是根据用户请求，同时生成以下三项内容：
-    1. **图像提示词 (Image Prompt):** 满足高清晰度、多元化、随机风格的 AI 绘画提示词。
-    2. **小红书标题 (Title):** 抓人眼球，最多 10 个字符。尽可能使用中文
-    3. **小红书文案 (Copy):** 简短、引人入胜，约 50 个字符，使用友好、潮流的语气，在文末增加多个话题，以#开头，不要带任何ai话题。尽可能使用中文
 
-    **图像提示词必须满足以下随机和多样化要求，以确保生成的图片和美女是多元的、丰富的：**
-    1.  **目标：** 一张高清晰度、艺术化、暗示性强、引人注目的**女性肖像**。
-    2.  **风格：** 随机从【赛博朋克、古典、韩系温柔、日系动漫、油画质感、Cinematic 电影感、写实】中选择一种。
-    3.  **情绪：** 随机从【甜美、性感、妩媚、自信、慵懒、思考、俏皮、空灵、治愈】中选择一种。
-    4.  **人物细节：** 每次必须随机生成不同的**民族/人种**特征（例如：高加索、东亚、东南亚、拉丁裔、非洲裔），并描述具体的**发型、妆容和服饰**。
-    5.  **背景/场景：** 每次必须随机生成一个**新的、高细节的背景**（例如：东京街头霓虹灯下的雨夜、被阳光洒满的复古咖啡馆、水墨画风格的竹林、摩洛哥蓝色小镇的露台）。
-    6.  **核心细节（必须包含）：** 必须指定精确的**光线、景深**和**艺术媒介**。
+def get_sampler() -> CoverageSampler:
+    """Process-wide sampler of style, mood, ethnicity and scene combinations."""
+    global _sampler
+    if _sampler is None:
+        _sampler = CoverageSampler({"style": STYLES, "mood": MOODS, "ethnicity": ETHNICITIES, "scene": SCENES})
+    return _sampler
 
-    **【强制输出格式：】**
-    你必须严格以一个完整的 **JSON 对象**输出，包含以下三个键，无需任何额外的解释或文本：
 
-    ```json
-    {
-    "image_prompt": "[风格]-[情绪]- (高细节描述) - (人物主体细节) - (服装) - (背景场景) - (光线) - [摄影/艺术媒介]",
-    "title": "你生成的抓人眼球的标题",
-    "copy": "你生成的简短、引人入胜的小红书文案"
-    }
-    ```
-    """
+def _combination(seed: Optional[int] = None) -> dict:
+    """Attributes of a post: reproducible for a given `seed`, otherwise the
+    least covered combination so far."""
+    if seed is None:
+        return get_sampler().draw()[0]
+    rng = random.Random(seed)
+    return {"style": rng.choice(STYLES), "mood": rng.choice(MOODS),
+            "ethnicity": rng.choice(ETHNICITIES), "scene": rng.choice(SCENES)}
 
 
+def _settle(combination: dict, result_data: Optional[dict]):
+    """Record a drawn `combination` as used if content was generated with it,
+    otherwise give it back to the sampler."""
+    if result_data:
+        get_sampler().record(combination)
+    else:
+        get_sampler().release(combination)
 
-    # Randomly select style and mood to ensure diversity
-    styles = ["赛博朋克", "古典", "韩系温柔", "日系动漫", "油画质感", "Cinematic 电影感", "写实", "极简主义", "超现实主义", "蒸汽波"]
-    moods = ["甜美", "性感", "妩媚", "自信", "慵懒", "思考", "俏皮", "空灵", "治愈", "神秘", "忧郁", "梦幻"]
 
-    selected_style = random.choice(styles)
-    selected_mood = random.choice(moods)
+def _user_request(seed: Optional[int] = None, combination: Optional[dict] = None) -> str:
+    """Build the user request for a combination of style, mood, ethnicity and scene.
 
+    Without `combination` one is chosen by :func:`_combination`. A given
+    `seed` makes the request reproducible.
+    """
+    combination = combination or _combination(seed)
     # Add a random seed to the prompt to further encourage diversity
-    random_seed = random.randint(1, 100000)
+    rng = random.Random(seed) if seed is not None else random
+    random_seed = rng.randint(1, 100000)
 
-    USER_REQUEST = (
+    return (
         f"Create a detailed, vivid description for a high-quality AI-generated portrait of a beautiful woman. "
-        f"MUST use the style: '{selected_style}' and mood: '{selected_mood}'. "
+        f"MUST use the style: '{combination['style']}', mood: '{combination['mood']}', "
+        f"ethnicity: '{combination['ethnicity']}' and scene: '{combination['scene']}'. "
         f"Generate the image prompt, title, and copy based on this specific combination. "
         f"Random seed: {random_seed}."
     )
 
-    url = "https://api.cloudflare.com/client/v4/accounts/812985d5fdeac955ccfdb053fe794f93/ai/run/@cf/openai/gpt-oss-20b"
-    headers = {
-        "Authorization": f"Bearer {os.environ.get('CLOUDFLARE_API_TOKEN', '')}"
-    }
+
+def _cloudflare_payload(seed: Optional[int] = None, combination: Optional[dict] = None) -> dict:
     # Try using messages for chat input
-    payload = {
-        "input": f"{SYSTEM_PROMPT_FULL}\n\nUser Request: {USER_REQUEST}"
+    return {
+        "input": f"{SYSTEM_PROMPT_FULL}\n\nUser Request: {_user_request(seed, combination)}"
     }
 
+
+def _content_cache_key(provider: str, model: str, prompt: str, seed: Optional[int], **params) -> Optional[str]:
+    # Without a seed the request carries a random nonce and never repeats.
+    if seed is None:
+        return None
+    return ResultCache.key(kind="content", provider=provider, model=model, prompt=prompt, seed=seed, params=params)
+
+
+def _cloudflare_output_text(result: dict) -> Optional[str]:
+    """Extract the assistant text from a Cloudflare AI response body."""
+    if not result.get("success"):
+        print(f"Cloudflare API error: {result.get('errors')}")
+        return None
+    final_text = ""
+    # Parse the complex response structure
+    outputs = result.get("result", {}).get("output", [])
+    for item in outputs:
+        if item.get("type") == "message" and item.get("role") == "assistant":
+            for content in item.get("content", []):
+                if content.get("type") == "output_text":
+                    final_text += content.get("text", "")
+    return final_text
+
+
+def _parse_content_json(raw_output: str) -> Optional[dict]:
+    """Extract and validate the content element, tolerating fences, prose and trailing commas."""
+    try:
+        return parse_content(raw_output)
+    except ContentError as e:
+        print(f"JSON Parsing failed: {e}")
+        print(f"Raw output: {raw_output}")
+        return None
+
+
+# Receives each top-level field of the content element as soon as it is complete.
+FieldCallback = Optional[Callable[[str, str], None]]
+
+
+def _announce(result_data: Optional[dict], on_field: FieldCallback):
+    """Report the fields of a content element that did not arrive streamed."""
+    if result_data and on_field:
+        for key in CONTENT_FIELDS:
+            on_field(key, result_data[key])
+
+
+def _finish_stream(stream: JsonObjectStream, raw_output: str) -> Optional[dict]:
+    try:
+        return validate_content(stream.close())
+    except ContentError as e:
+        print(f"JSON Parsing failed: {e}")
+        print(f"Raw output: {raw_output}")
+        return None
+
+
+def _record_response(result_data: Optional[dict], nbytes: int):
+    """Note response size and usability on the provider's span."""
+    current_span().add_bytes(nbytes)
+    if not result_data:
+        current_span().fail("no content element in response")
+
+
+@traced("text.provider", provider="cloudflare")
+def generate_content_element_cloudflare(seed: Optional[int] = None, combination: Optional[dict] = None):
+    """Generate content element (JSON) using Cloudflare AI REST API.
+
+    Args:
+        seed: Optional seed for the style/mood selection. Identical seeds give
+            identical requests, which are answered from the result cache.
+        combination: Style, mood, ethnicity and scene to use; drawn from the
+            coverage sampler when neither this nor `seed` is given.
+    """
+    if combination is not None or seed is not None:
+        return _generate_cloudflare(seed, combination)
+    combination = _combination()
+    result_data = None
+    try:
+        result_data = _generate_cloudflare(seed, combination)
+    finally:
+        _settle(combination, result_data)
+    return result_data
+
+
+def _generate_cloudflare(seed: Optional[int], combination: Optional[dict]) -> Optional[dict]:
+    url = provider_url("cloudflare", CLOUDFLARE_TEXT_MODEL)
+    headers = provider_headers("cloudflare")
+    payload = _cloudflare_payload(seed, combination)
+
+    cache_key = _content_cache_key("cloudflare", CLOUDFLARE_TEXT_MODEL, payload["input"], seed)
+    cached = get_cache().get_json(cache_key)
+    if cached is not None:
+        current_span().set(cache="hit")
+        print("[autoRed] Content served from cache.")
+        return cached
+
     # Debug: Print equivalent curl command
     print(f"\n[DEBUG] Equivalent curl command:")
     print(f"curl {url} \\")
@@ -232,41 +340,273 @@ def generate_content_element_cloudflare():
     print("\n")
 
     try:
-        response = requests.post(url, headers=headers, json=payload)
+        response = get_session().post(url, headers=headers, json=payload, timeout=LLM_TIMEOUT)
         response.raise_for_status()
-        result = response.json()
-
-        final_text = ""
-        if result.get("success"):
-            # Parse the complex response structure
-            outputs = result.get("result", {}).get("output", [])
-            for item in outputs:
-                if item.get("type") == "message" and item.get("role") == "assistant":
-                    for content in item.get("content", []):
-                        if content.get("type") == "output_text":
-                            final_text += content.get("text", "")
-        else:
-             print(f"Cloudflare API error: {result.get('errors')}")
-             return None
-
-        # Parse JSON from text
-        raw_output = final_text
-        try:
-            if raw_output.strip().startswith("```json"):
-                json_str = raw_output.strip().strip("```json").strip("```").strip()
-            else:
-                json_str = raw_output.strip()
-            result_data = json.loads(json_str)
-            return result_data
-        except json.JSONDecodeError as e:
-            print("JSON Parsing failed.")
-            print(f"Raw output: {raw_output}")
+        final_text = _cloudflare_output_text(response.json())
+        if final_text is None:
+            current_span().fail("Cloudflare API error")
             return None
+        # Parse JSON from text
+        result_data = _parse_content_json(final_text)
+        _record_response(result_data, len(response.content))
+        if result_data:
+            get_cache().put_json(cache_key, result_data)
+        return result_data
 
     except Exception as e:
+        current_span().fail(f"{type(e).__name__}: {e}")
         print(f"Request failed: {e}")
         return None
 
+
+# ----------------------------------------------------------------------
+# Async, concurrent generation
+# ----------------------------------------------------------------------
+@traced("text.provider", provider="cloudflare")
+async def _agenerate_cloudflare(seed: Optional[int] = None, on_field: FieldCallback = None,
+                                combination: Optional[dict] = None) -> Optional[dict]:
+    payload = _cloudflare_payload(seed, combination)
+    cache_key = _content_cache_key("cloudflare", CLOUDFLARE_TEXT_MODEL, payload["input"], seed)
+    cached = get_cache().get_json(cache_key)
+    if cached is not None:
+        current_span().set(cache="hit")
+        served_from_cache()
+        _announce(cached, on_field)
+        return cached
+    response = await get_async_http().post(
+        provider_url("cloudflare", CLOUDFLARE_TEXT_MODEL),
+        headers=provider_headers("cloudflare"),
+        json=payload,
+    )
+    response.raise_for_status()
+    final_text = _cloudflare_output_text(response.json())
+    result_data = _parse_content_json(final_text) if final_text is not None else None
+    _record_response(result_data, len(response.content))
+    if result_data:
+        get_cache().put_json(cache_key, result_data)
+    _announce(result_data, on_field)
+    return result_data
+
+
+@traced("text.provider", provider="hf")
+async def _agenerate_hf(seed: Optional[int] = None, model: str = "deepseek-ai/DeepSeek-V3.2",
+                        on_field: FieldCallback = None, combination: Optional[dict] = None) -> Optional[dict]:
+    current_span().set(model=model)
+    user_request = _user_request(seed, combination)
+    cache_key = _content_cache_key("hf", model, f"{SYSTEM_PROMPT_FULL}\n\n{user_request}", seed, temperature=1.0)
+    cached = get_cache().get_json(cache_key)
+    if cached is not None:
+        current_span().set(cache="hit")
+        served_from_cache()
+        _announce(cached, on_field)
+        return cached
+    # Stream the completion so fields are reported as they arrive and reading
+    # stops as soon as the JSON object is complete.
+    response = await get_async_openai_client("hf").chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT_FULL},
+            {"role": "user", "content": user_request},
+        ],
+        temperature=1.0,
+        stream=True,
+    )
+    stream = JsonObjectStream(on_field=on_field)
+    raw_output = ""
+    try:
+        async for chunk in response:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                raw_output += delta
+                if stream.feed(delta) is not None:
+                    break
+    finally:
+        await response.close()
+    result_data = _finish_stream(stream, raw_output)
+    _record_response(result_data, len(raw_output.encode("utf-8")))
+    if result_data:
+        get_cache().put_json(cache_key, result_data)
+    return result_data
+
+
+@traced("text.provider", provider="gemini")
+async def _agenerate_gemini(seed: Optional[int] = None, on_field: FieldCallback = None,
+                            combination: Optional[dict] = None) -> Optional[dict]:
+    prompt = f"{SYSTEM_PROMPT_FULL}\n\nUser Request: {_user_request(seed, combination)}"
+    cache_key = _content_cache_key("gemini", TEXT_MODEL_NAME, prompt, seed)
+    cached = get_cache().get_json(cache_key)
+    if cached is not None:
+        current_span().set(cache="hit")
+        served_from_cache()
+        _announce(cached, on_field)
+        return cached
+    stream = JsonObjectStream(on_field=on_field)
+    raw_output = ""
+    async for chunk in await get_gemini_client().aio.models.generate_content_stream(
+        model=TEXT_MODEL_NAME,
+        contents=prompt,
+    ):
+        if chunk.text:
+            raw_output += chunk.text
+            if stream.feed(chunk.text) is not None:
+                break
+    result_data = _finish_stream(stream, raw_output)
+    _record_response(result_data, len(raw_output.encode("utf-8")))
+    if result_data:
+        get_cache().put_json(cache_key, result_data)
+    return result_data
+
+
+# Async content element generators by provider name.
+_ALL_CONTENT_PROVIDERS = {
+    "cloudflare": _agenerate_cloudflare,
+    "hf": _agenerate_hf,
+    "hf-novita": partial(_agenerate_hf, model="deepseek-ai/DeepSeek-V3.2:novita"),
+    "gemini": _agenerate_gemini,
+}
+CONTENT_PROVIDERS = {
+    name: _ALL_CONTENT_PROVIDERS[name]
+    for name in (n.strip() for n in TEXT_PROVIDERS.split(","))
+    # Gemini is only usable with an API key.
+    if name in _ALL_CONTENT_PROVIDERS and (name != "gemini" or GOOGLE_API_KEY)
+}
+
+
+def _provider_intervals(spec: str) -> dict:
+    """Parse ``"cloudflare:0.5,hf:1"`` into minimum seconds between requests."""
+    intervals = {}
+    for entry in spec.split(","):
+        name, _, interval = entry.strip().partition(":")
+        if name:
+            intervals[name] = float(interval or 0)
+    return intervals
+
+
+async def agenerate_content_elements(n: int, concurrency: int = TEXT_CONCURRENCY,
+                                     providers: Optional[List[str]] = None) -> AsyncIterator[dict]:
+    """Generate `n` content elements concurrently, yielding them as they complete.
+
+    Requests are spread round-robin over `providers`, at most `concurrency`
+    are in flight at once and each provider is throttled according to
+    ``TEXT_PROVIDER_MIN_INTERVAL``. Failed generations are reported and
+    skipped, so fewer than `n` results may be yielded. Each request gets its
+    own combination from the coverage sampler, recorded as used only when
+    content was generated with it.
+    """
+    providers = providers or list(CONTENT_PROVIDERS)
+    intervals = _provider_intervals(TEXT_PROVIDER_MIN_INTERVAL)
+    limiters = {name: AsyncRateLimiter(intervals.get(name, 0)) for name in providers}
+    semaphore = asyncio.Semaphore(concurrency)
+    combinations = get_sampler().draw(n)
+    settled = set()
+
+    async def one(i: int):
+        name = providers[i % len(providers)]
+        result_data = None
+        try:
+            async with semaphore:
+                await limiters[name].acquire()
+                result_data = await CONTENT_PROVIDERS[name](combination=combinations[i])
+        finally:
+            settled.add(i)
+            _settle(combinations[i], result_data)
+        return result_data
+
+    tasks = [asyncio.create_task(one(i)) for i in range(n)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            try:
+                result = await next_done
+            except Exception as e:
+                print(f"Request failed: {e}")
+                continue
+            if result:
+                yield result
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # Tasks cancelled before they started never ran their cleanup.
+        for i in set(range(n)) - settled:
+            get_sampler().release(combinations[i])
+
+
+_router = None
+
+
+def get_router() -> ProviderRouter:
+    """Process-wide router over :data:`CONTENT_PROVIDERS`."""
+    global _router
+    if _router is None:
+        _router = ProviderRouter(CONTENT_PROVIDERS)
+    return _router
+
+
+def _attempt_seed(seed: Optional[int], attempt: int) -> Optional[int]:
+    # Another request for a rejected generation, far from the seeds of other posts.
+    return seed + attempt * 1_000_003 if seed is not None and attempt else seed
+
+
+async def agenerate_content_element_routed(seed: Optional[int] = None,
+                                           on_image_prompt: Optional[Callable[[str], None]] = None,
+                                           combination: Optional[dict] = None) -> Optional[dict]:
+    """Generate one content element via the latency-aware provider router.
+
+    Content repeating a published post is generated again, up to
+    ``DEDUP_MAX_TRIES`` times. The combination of accepted content is recorded
+    as used with the sampler; abandoned ones are released.
+
+    Args:
+        on_image_prompt: Called with the image prompt as soon as one has been
+            streamed completely, before title and copy are done. With hedged
+            requests it can be called once per racing provider.
+        combination: Style, mood, ethnicity and scene of the post, e.g. from a
+            batch draw of :func:`get_sampler`. Without it (and without a
+            `seed`) the sampler is asked here, so that hedged requests share it.
+    """
+    index = get_dedup_index()
+
+    def on_field(key: str, value: str):
+        # A repeated image prompt is not worth rendering early.
+        if key == "image_prompt" and on_image_prompt is not None and index.find_text({key: value}) is None:
+            on_image_prompt(value)
+
+    with span("text.generate") as s:
+        for attempt in range(DEDUP_MAX_TRIES):
+            attempt_seed = _attempt_seed(seed, attempt)
+            # A repeat gets a new combination, not just a new request for the same one.
+            if combination is None or attempt:
+                if combination is not None:
+                    get_sampler().release(combination)
+                combination = _combination(attempt_seed)
+            try:
+                content = await get_router().call(seed=attempt_seed, on_field=on_field, combination=combination)
+            except Exception as e:
+                s.fail(f"{type(e).__name__}: {e}")
+                print(f"Request failed: {e}")
+                get_sampler().release(combination)
+                return None
+            duplicate = index.find_text(content) if content else None
+            if duplicate is None:
+                _settle(combination, content)
+                return content
+            s.retry()
+            print(f"[autoRed] Generated content repeats a published post ({duplicate}), generating again.")
+        s.fail("duplicate content")
+        get_sampler().release(combination)
+        return None
+
+
+def generate_content_element_routed(seed: Optional[int] = None,
+                                    on_image_prompt: Optional[Callable[[str], None]] = None,
+                                    combination: Optional[dict] = None) -> Optional[dict]:
+    """Blocking variant of :func:`agenerate_content_element_routed`. Runs on the
+    shared background loop, so connections are reused across calls."""
+    result = run_blocking(agenerate_content_element_routed(seed, on_image_prompt, combination))
+    print(f"[autoRed] Provider stats: {get_router().report()}")
+    return result
+
+
 if __name__ == "__main__":
     image_prompt = generate_image_prompt()
     print(image_prompt)
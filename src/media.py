@@ -0,0 +1,62 @@
+# media for autoRed
+
+"""In-memory image encoding for upload.
+
+Generated images are encoded straight to the upload format (JPEG/WebP, capped
+to the platform's maximum dimension) and kept as bytes, which Playwright's
+``set_input_files`` accepts directly, so nothing has to round-trip via disk.
+"""
+import io
+from dataclasses import dataclass, field
+
+from PIL import Image
+
+from config.settings import IMAGE_FORMAT, IMAGE_QUALITY, IMAGE_MAX_DIMENSION
+
+_MIME_TYPES = {"jpeg": "image/jpeg", "webp": "image/webp", "png": "image/png"}
+_EXTENSIONS = {"jpeg": ".jpg", "webp": ".webp", "png": ".png"}
+
+
+@dataclass(frozen=True)
+class EncodedImage:
+    """An encoded image held in memory."""
+    name: str
+    mime_type: str
+    # Kept out of the repr so printing a list of images does not dump megabytes.
+    data: bytes = field(repr=False)
+
+    def as_payload(self) -> dict:
+        """File payload accepted by Playwright's ``set_input_files``."""
+        return {"name": self.name, "mimeType": self.mime_type, "buffer": self.data}
+
+
+def extension(fmt: str = IMAGE_FORMAT) -> str:
+    return _EXTENSIONS[fmt]
+
+
+def mime_type(fmt: str = IMAGE_FORMAT) -> str:
+    return _MIME_TYPES[fmt]
+
+
+def encode_image(image: Image.Image, name: str, fmt: str = IMAGE_FORMAT, quality: int = IMAGE_QUALITY,
+                 max_dimension: int = IMAGE_MAX_DIMENSION) -> EncodedImage:
+    """Downscale `image` to `max_dimension` and encode it as `fmt`.
+
+    Args:
+        name: File name without extension reported to the upload form.
+    """
+    if fmt not in _MIME_TYPES:
+        raise ValueError(f"Unsupported image format: {fmt}")
+    if max(image.size) > max_dimension:
+        image = image.copy()
+        image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+    if fmt == "jpeg" and image.mode != "RGB":
+        image = image.convert("RGB")
+
+    buffer = io.BytesIO()
+    if fmt == "png":
+        # Fast compression level; PNG's default (6) is slow for little gain.
+        image.save(buffer, format="PNG", compress_level=1)
+    else:
+        image.save(buffer, format=fmt.upper(), quality=quality)
+    return EncodedImage(name=name + _EXTENSIONS[fmt], mime_type=_MIME_TYPES[fmt], data=buffer.getvalue())
@@ -0,0 +1,222 @@
+# metrics for autoRed
+
+"""Lightweight tracing of the pipeline's stages.
+
+Code is instrumented with :func:`span` (a context manager) or :func:`traced`
+(a decorator for sync and async functions). A span records its duration,
+outcome, bytes transferred, retries and labels. Every finished span is
+appended to a JSON lines file, and per-span histograms are kept in memory and
+can be exported in the Prometheus text format.
+"""
+import json
+import time
+import inspect
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from config.settings import METRICS_JSONL, METRICS_PROM_FILE
+
+# Upper bounds of the duration histogram buckets in seconds.
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_current: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("autored_span", default=None)
+
+
+class Span:
+    def __init__(self, name: str, labels: dict, parent: Optional["Span"]):
+        self.name = name
+        self.labels = dict(labels)
+        self.parent = parent
+        self.bytes = 0
+        self.retries = 0
+        self.outcome = "ok"
+        self.error: Optional[str] = None
+        self.started = time.time()
+        self._start = time.perf_counter()
+        self.duration = 0.0
+
+    def set(self, **labels):
+        """Add labels known only while the span runs (e.g. cache="hit")."""
+        self.labels.update(labels)
+
+    def add_bytes(self, n: int):
+        self.bytes += n
+
+    def retry(self, n: int = 1):
+        self.retries += n
+
+    def fail(self, error: str):
+        """Mark the span as failed without raising, e.g. for an unusable result."""
+        self.outcome = "error"
+        self.error = error
+
+    def as_dict(self) -> dict:
+        return {
+            "ts": round(self.started, 3),
+            "span": self.name,
+            "parent": self.parent.name if self.parent else None,
+            "duration": round(self.duration, 4),
+            "outcome": self.outcome,
+            "error": self.error,
+            "bytes": self.bytes,
+            "retries": self.retries,
+            "labels": self.labels,
+        }
+
+
+class _Series:
+    """Aggregates of one span name, label set and outcome."""
+
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.bytes = 0
+        self.retries = 0
+
+    def add(self, span: Span):
+        for i, bound in enumerate(BUCKETS):
+            if span.duration <= bound:
+                self.buckets[i] += 1
+        self.count += 1
+        self.sum += span.duration
+        self.max = max(self.max, span.duration)
+        self.bytes += span.bytes
+        self.retries += span.retries
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs) -> str:
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+class Metrics:
+    def __init__(self, jsonl_path: Optional[str] = METRICS_JSONL, prom_path: Optional[str] = METRICS_PROM_FILE):
+        self.jsonl_path = Path(jsonl_path) if jsonl_path else None
+        self.prom_path = Path(prom_path) if prom_path else None
+        self._series: Dict[Tuple, _Series] = {}
+        self._lock = threading.Lock()
+
+    def record(self, span: Span):
+        key = (span.name, tuple(sorted((k, str(v)) for k, v in span.labels.items())), span.outcome)
+        line = json.dumps(span.as_dict(), ensure_ascii=False, default=str)
+        with self._lock:
+            self._series.setdefault(key, _Series()).add(span)
+            if self.jsonl_path:
+                self.jsonl_path.parent.mkdir(parents=True, exist_ok=True)
+                with self.jsonl_path.open("a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+
+    def prometheus(self) -> str:
+        """All aggregates in the Prometheus text exposition format."""
+        with self._lock:
+            series = sorted(self._series.items())
+        lines = [
+            "# HELP autored_span_duration_seconds Duration of instrumented pipeline spans.",
+            "# TYPE autored_span_duration_seconds histogram",
+        ]
+        for (name, labels, outcome), s in series:
+            base = [("span", name), *labels, ("outcome", outcome)]
+            for bound, n in zip(BUCKETS, s.buckets):
+                lines.append(f"autored_span_duration_seconds_bucket{_labels(base + [('le', bound)])} {n}")
+            lines.append(f"autored_span_duration_seconds_bucket{_labels(base + [('le', '+Inf')])} {s.count}")
+            lines.append(f"autored_span_duration_seconds_sum{_labels(base)} {s.sum:.6f}")
+            lines.append(f"autored_span_duration_seconds_count{_labels(base)} {s.count}")
+        for metric, attr, help_text in (
+            ("autored_span_bytes_total", "bytes", "Bytes transferred within spans."),
+            ("autored_span_retries_total", "retries", "Retries and failovers within spans."),
+        ):
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+            for (name, labels, outcome), s in series:
+                lines.append(f"{metric}{_labels([('span', name), *labels, ('outcome', outcome)])} {getattr(s, attr)}")
+        return "\n".join(lines) + "\n"
+
+    def flush(self):
+        """Write the Prometheus export file (atomically, so scrapers never see half a file)."""
+        if not self.prom_path:
+            return
+        self.prom_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.prom_path.with_suffix(".tmp")
+        tmp.write_text(self.prometheus(), encoding="utf-8")
+        tmp.replace(self.prom_path)
+
+    def report(self) -> dict:
+        """Count, mean and max duration per span name, slowest total first."""
+        totals: Dict[str, list] = {}
+        with self._lock:
+            for (name, _, _), s in self._series.items():
+                t = totals.setdefault(name, [0, 0.0, 0.0])
+                t[0] += s.count
+                t[1] += s.sum
+                t[2] = max(t[2], s.max)
+        return {
+            name: {"count": n, "mean": round(total / n, 3), "max": round(peak, 3)}
+            for name, (n, total, peak) in sorted(totals.items(), key=lambda item: -item[1][1])
+        }
+
+
+_metrics = None
+
+
+def get_metrics() -> Metrics:
+    """Process-wide metrics registry."""
+    global _metrics
+    if _metrics is None:
+        _metrics = Metrics()
+    return _metrics
+
+
+def current_span() -> Optional[Span]:
+    """Innermost span of the running code, if any."""
+    return _current.get()
+
+
+@contextmanager
+def span(name: str, **labels):
+    """Time the enclosed block as span `name`.
+
+    Exceptions mark the span as failed and are re-raised. Spans nest: a span
+    opened inside another one records it as its parent, also across
+    ``asyncio.to_thread`` and tasks, which copy the context.
+    """
+    s = Span(name, labels, _current.get())
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.outcome = "cancelled" if type(e).__name__ == "CancelledError" else "error"
+        s.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        s.duration = time.perf_counter() - s._start
+        _current.reset(token)
+        get_metrics().record(s)
+
+
+def traced(name: Optional[str] = None, **labels):
+    """Decorator running every call of the function in a :func:`span`."""
+    def decorate(func):
+        span_name = name or func.__qualname__
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name, **labels):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name, **labels):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorate
@@ -0,0 +1,196 @@
+# pipeline for autoRed
+
+"""Staged batch pipeline: text generation -> image generation -> publish.
+
+Every stage has its own pool of workers and the stages are connected by bounded
+queues, so the LLM can generate post N+1 while images for post N are rendered
+and post N-1 is being published. A batch of N posts then takes roughly
+N x (slowest stage latency) instead of N x (sum of all stage latencies).
+
+The whole batch runs on one event loop: text generation and publishing are
+awaited on it directly, only the blocking image SDK runs in worker threads.
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, List, Optional, Union
+
+from src.llm_client import agenerate_content_element_routed, get_router, get_sampler
+from src.image_client import EarlyRender
+from src.publisher import PublisherPool
+from src.providers import aclose_clients
+from src.accounts import load_accounts
+from src.media import EncodedImage
+from src.metrics import span
+from src.dedup import get_dedup_index
+from config.settings import (
+    BATCH_SIZE,
+    PIPELINE_QUEUE_SIZE,
+    TEXT_CONCURRENCY,
+    IMAGE_CONCURRENCY,
+    PUBLISH_CONCURRENCY,
+    GENERATION_SEED,
+    IMAGES_PER_POST,
+    IMAGE_IN_MEMORY,
+)
+
+# Marker telling a stage worker that its upstream stage has finished.
+_DONE = object()
+
+
+@dataclass
+class Post:
+    """A single post travelling through the pipeline."""
+    index: int
+    image_prompt: str = ""
+    title: str = ""
+    copy: str = ""
+    images: List[Union[Path, EncodedImage]] = field(default_factory=list)
+    timings: dict = field(default_factory=dict)
+    error: Optional[str] = None
+    # Image rendering started by the text stage once the image prompt streamed in.
+    early: Optional[EarlyRender] = None
+    # Style, mood, ethnicity and scene the text is generated with.
+    combination: Optional[dict] = None
+
+
+def _seed(post: Post) -> Optional[int]:
+    # Derive per-post seeds from a fixed seed so a rerun hits the result cache.
+    return GENERATION_SEED + post.index if GENERATION_SEED is not None else None
+
+
+async def _text_stage(post: Post, mode: str):
+    post.early = EarlyRender(count=IMAGES_PER_POST, mode=mode, seed=_seed(post), in_memory=IMAGE_IN_MEMORY)
+    content_element = await agenerate_content_element_routed(seed=_seed(post), on_image_prompt=post.early.start,
+                                                             combination=post.combination)
+    if not content_element:
+        raise RuntimeError("no content generated")
+    post.image_prompt = content_element.get("image_prompt", "")
+    post.title = content_element.get("title", "title")
+    post.copy = content_element.get("copy", "nothing")
+
+
+def _image_stage(post: Post, mode: str):
+    post.images = post.early.result(post.image_prompt)
+    duplicate = get_dedup_index(mode).find_images(post.images)
+    if duplicate:
+        raise RuntimeError(f"images repeat a published post ({duplicate})")
+
+
+async def _publish_stage(post: Post, pool: PublisherPool, mode: str):
+    await pool.apublish(post.images, post.title, post.copy)
+    content = {"image_prompt": post.image_prompt, "title": post.title, "copy": post.copy}
+    await asyncio.to_thread(get_dedup_index(mode).add, content, post.images)
+
+
+async def _run_stage(name: str, func: Callable[[Post], Any], concurrency: int,
+                     inbox: asyncio.Queue, outbox: Optional[asyncio.Queue], finished: List[Post]):
+    """Run `concurrency` workers that pull posts from `inbox`, apply `func`
+    (awaited if it is a coroutine function, otherwise in a worker thread) and
+    push successful posts to `outbox`. Posts that fail, or leave the last
+    stage, are collected in `finished`.
+    """
+    is_async = asyncio.iscoroutinefunction(func)
+
+    async def worker():
+        while True:
+            post = await inbox.get()
+            if post is _DONE:
+                return
+            start = time.perf_counter()
+            try:
+                with span(f"pipeline.{name}"):
+                    if is_async:
+                        await func(post)
+                    else:
+                        await asyncio.to_thread(func, post)
+            except Exception as e:
+                post.error = f"{name}: {e}"
+                print(f"[autoRed] Post #{post.index} failed at {name} stage: {e}")
+            post.timings[name] = time.perf_counter() - start
+            if post.error is None and outbox is not None:
+                await outbox.put(post)
+            else:
+                finished.append(post)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+async def arun_batch(n: int = BATCH_SIZE, mode: str = "prod", headless: bool = False,
+                     pool: Optional[PublisherPool] = None) -> List[Post]:
+    """Generate and publish `n` posts through the staged pipeline.
+
+    Args:
+        pool: Publisher pool to borrow browser sessions from. When omitted a
+            pool covering every configured account, with at least one session
+            per publish worker, is started for the batch.
+
+    Returns:
+        The list of posts; posts with a non-empty `error` did not get published.
+    """
+    own_pool = pool is None
+    if own_pool:
+        # Spread the publish workers over the configured accounts.
+        accounts = load_accounts()
+        size = max(1, -(-PUBLISH_CONCURRENCY // len(accounts)))
+        # The pool lives on this loop, next to the generation work.
+        pool = await PublisherPool(size=size, headless=headless, accounts=accounts).astart()
+    try:
+        return await _run_pipeline(n, mode, pool)
+    finally:
+        if own_pool:
+            await pool.aclose()
+        await aclose_clients()
+
+
+async def _run_pipeline(n: int, mode: str, pool: PublisherPool) -> List[Post]:
+    stages = [
+        ("text", partial(_text_stage, mode=mode), TEXT_CONCURRENCY),
+        ("image", partial(_image_stage, mode=mode), IMAGE_CONCURRENCY),
+        ("publish", partial(_publish_stage, pool=pool, mode=mode), PUBLISH_CONCURRENCY),
+    ]
+    # The first queue is fed up front, the ones between stages are bounded so a
+    # fast stage cannot run arbitrarily far ahead of a slow one.
+    queues = [asyncio.Queue()]
+    queues += [asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE) for _ in stages[1:]]
+    queues.append(None)
+
+    # One draw for the whole batch gives every post its own combination. A
+    # fixed seed keeps the per-post choice reproducible instead.
+    combinations = get_sampler().draw(n) if GENERATION_SEED is None else [None] * n
+    for i, combination in enumerate(combinations):
+        queues[0].put_nowait(Post(index=i, combination=combination))
+    for _ in range(stages[0][2]):
+        queues[0].put_nowait(_DONE)
+
+    finished: List[Post] = []
+
+    async def run(i: int):
+        name, func, concurrency = stages[i]
+        await _run_stage(name, func, concurrency, queues[i], queues[i + 1], finished)
+        # Release every worker of the next stage once this stage is drained.
+        if i + 1 < len(stages):
+            for _ in range(stages[i + 1][2]):
+                await queues[i + 1].put(_DONE)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run(i) for i in range(len(stages))))
+    elapsed = time.perf_counter() - started
+
+    published = [p for p in finished if p.error is None]
+    print(f"[autoRed] Batch finished: {len(published)}/{n} posts published in {elapsed:.1f}s.")
+    for name, _, _ in stages:
+        durations = [p.timings[name] for p in finished if name in p.timings]
+        if durations:
+            print(f"[autoRed]   {name}: avg {sum(durations) / len(durations):.1f}s over {len(durations)} posts")
+    print(f"[autoRed] Provider stats: {get_router().report()}")
+    print(f"[autoRed] Combination coverage: {get_sampler().stats()}")
+    return sorted(finished, key=lambda p: p.index)
+
+
+def run_batch(n: int = BATCH_SIZE, mode: str = "prod", headless: bool = False,
+              pool: Optional[PublisherPool] = None) -> List[Post]:
+    """Synchronous entry point for :func:`arun_batch`."""
+    return asyncio.run(arun_batch(n, mode=mode, headless=headless, pool=pool))
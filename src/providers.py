@@ -0,0 +1,198 @@
+# providers for autoRed
+
+"""Registry of text generation providers and their shared HTTP clients.
+
+Clients are created lazily once per process (async clients once per event
+loop) and reused by every call, so batch generation keeps its TCP/TLS
+connections alive instead of paying a fresh handshake per request. Blocking
+callers share one background event loop via :func:`run_blocking`, so their
+async clients live as long as the process. The HTTP
+and SDK packages are imported on first use, so importing this module is cheap.
+"""
+import os
+import atexit
+import threading
+import weakref
+import asyncio
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import httpx
+    import requests
+    from openai import OpenAI, AsyncOpenAI
+
+from config.settings import LLM_POOL_SIZE, LLM_TIMEOUT, LLM_KEEPALIVE_EXPIRY, HF_BASE_URL, CLOUDFLARE_BASE_URL
+
+# Base URL and API key variable of each provider.
+PROVIDERS = {
+    "hf": {
+        "base_url": HF_BASE_URL,
+        "api_key_env": "HF_TOKEN",
+    },
+    "cloudflare": {
+        "base_url": CLOUDFLARE_BASE_URL,
+        "api_key_env": "CLOUDFLARE_API_TOKEN",
+    },
+}
+
+_lock = threading.Lock()
+_openai_clients = {}
+_session = None
+_gemini_client = None
+# Async clients are bound to the loop they were created on.
+_async_clients = weakref.WeakKeyDictionary()
+_background_loop = None
+
+
+def _provider(name: str) -> dict:
+    try:
+        return PROVIDERS[name]
+    except KeyError:
+        raise ValueError(f"Unknown provider: {name}") from None
+
+
+def _limits() -> "httpx.Limits":
+    import httpx
+    return httpx.Limits(
+        max_connections=LLM_POOL_SIZE,
+        max_keepalive_connections=LLM_POOL_SIZE,
+        keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+    )
+
+
+def provider_url(name: str, path: str = "") -> str:
+    """Absolute URL of `path` below the provider's base URL."""
+    base = _provider(name)["base_url"]
+    return f"{base}/{path.lstrip('/')}" if path else base
+
+
+def provider_headers(name: str) -> dict:
+    """Authorization headers for a provider's REST API."""
+    return {"Authorization": f"Bearer {os.environ.get(_provider(name)['api_key_env'], '')}"}
+
+
+def get_openai_client(name: str = "hf") -> "OpenAI":
+    """Shared OpenAI-compatible client for an OpenAI-style provider."""
+    with _lock:
+        client = _openai_clients.get(name)
+        if client is None:
+            import httpx
+            from openai import OpenAI
+            cfg = _provider(name)
+            client = OpenAI(
+                base_url=cfg["base_url"],
+                api_key=os.environ[cfg["api_key_env"]],
+                timeout=LLM_TIMEOUT,
+                http_client=httpx.Client(limits=_limits(), timeout=LLM_TIMEOUT),
+            )
+            _openai_clients[name] = client
+        return client
+
+
+def get_gemini_client():
+    """Shared Google GenAI client (reads GOOGLE_API_KEY from the environment)."""
+    global _gemini_client
+    with _lock:
+        if _gemini_client is None:
+            from google import genai
+            _gemini_client = genai.Client()
+        return _gemini_client
+
+
+def get_session() -> "requests.Session":
+    """Shared keep-alive session for plain REST providers (Cloudflare)."""
+    global _session
+    with _lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=len(PROVIDERS), pool_maxsize=LLM_POOL_SIZE)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+def _loop_clients() -> dict:
+    loop = asyncio.get_running_loop()
+    clients = _async_clients.get(loop)
+    if clients is None:
+        clients = _async_clients[loop] = {}
+    return clients
+
+
+def get_async_openai_client(name: str = "hf") -> "AsyncOpenAI":
+    """Async variant of :func:`get_openai_client`, shared per event loop."""
+    clients = _loop_clients()
+    key = ("openai", name)
+    if key not in clients:
+        import httpx
+        from openai import AsyncOpenAI
+        cfg = _provider(name)
+        clients[key] = AsyncOpenAI(
+            base_url=cfg["base_url"],
+            api_key=os.environ[cfg["api_key_env"]],
+            timeout=LLM_TIMEOUT,
+            http_client=httpx.AsyncClient(limits=_limits(), timeout=LLM_TIMEOUT),
+        )
+    return clients[key]
+
+
+def get_async_http() -> "httpx.AsyncClient":
+    """Async keep-alive HTTP client for plain REST providers, shared per event loop."""
+    clients = _loop_clients()
+    if "http" not in clients:
+        import httpx
+        clients["http"] = httpx.AsyncClient(limits=_limits(), timeout=LLM_TIMEOUT)
+    return clients["http"]
+
+
+async def aclose_clients():
+    """Close the async clients of the running loop. Call before the loop ends."""
+    clients = _async_clients.pop(asyncio.get_running_loop(), {})
+    for key, client in clients.items():
+        if key == "http":
+            await client.aclose()
+        else:
+            await client.close()
+
+
+def _get_background_loop() -> asyncio.AbstractEventLoop:
+    global _background_loop
+    with _lock:
+        if _background_loop is None:
+            _background_loop = asyncio.new_event_loop()
+            threading.Thread(target=_background_loop.run_forever, name="provider-clients", daemon=True).start()
+            atexit.register(_close_background_loop)
+        return _background_loop
+
+
+def _close_background_loop():
+    try:
+        asyncio.run_coroutine_threadsafe(aclose_clients(), _background_loop).result(timeout=5)
+    except Exception as e:
+        print(f"[autoRed] Error closing provider clients: {e}")
+    _background_loop.call_soon_threadsafe(_background_loop.stop)
+
+
+def run_blocking(coro):
+    """Run `coro` on the process-wide background loop and wait for its result.
+
+    For synchronous callers (worker threads, scheduled sync jobs): unlike
+    ``asyncio.run`` per call, the loop and with it the async clients and
+    their keep-alive connections outlive the call. Must not be called from
+    the background loop itself.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _get_background_loop()).result()
+
+
+def close_clients():
+    """Close the shared synchronous clients."""
+    global _session
+    with _lock:
+        for client in _openai_clients.values():
+            client.close()
+        _openai_clients.clear()
+        if _session is not None:
+            _session.close()
+            _session = None
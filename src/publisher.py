@@ -4,45 +4,89 @@
 It handles login (via QR code) and posting images with title and copy.
 """
 import os
-import json
+import re
 import asyncio
+import threading
+from contextlib import asynccontextmanager, contextmanager
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Optional, Set, Union
 
-from playwright.async_api import async_playwright
-from playwright.async_api import TimeoutError # 导入TimeoutError
 
-# Path to store cookies for persistent login
-COOKIES_PATH = Path(__file__).parent.parent / "cookies" / "xhs_cookies.json"
+from config.settings import (
+    PUBLISHER_POOL_SIZE,
+    PUBLISHER_MAX_USES,
+    PUBLISH_AUTO_SUBMIT,
+    PUBLISH_UPLOAD_TIMEOUT,
+    PUBLISH_CONFIRM_TIMEOUT,
+    XHS_CREATOR_URL,
+)
+from src.accounts import Account, DEFAULT_ACCOUNT, load_accounts, load_cookies, save_cookies
+from src.utils import AsyncRateLimiter
+from src.media import EncodedImage
+from src.metrics import span, traced
+from src.session_monitor import invalidate, mark_validated, validated_recently
 
+# Path to store cookies for persistent login (default account)
+COOKIES_PATH = DEFAULT_ACCOUNT.cookies_path
+CREATOR_URL = XHS_CREATOR_URL
+# Signals used to detect finished image uploads in the editor
+UPLOAD_RESPONSE_PATTERN = "ros-upload"
+THUMBNAIL_SELECTOR = ".img-container img"
 
 
+async def _start_playwright():
+    # Imported on first use so that importing the publisher does not load Playwright.
+    from playwright.async_api import async_playwright
+    return await async_playwright().start()
+
+
+def _input_files(images: List[Union[Path, EncodedImage]]) -> list:
+    """Files for ``set_input_files``: paths as-is, in-memory images as buffers."""
+    return [img.as_payload() if isinstance(img, EncodedImage) else str(img) for img in images]
+
+
+def _payload_size(images: List[Union[Path, EncodedImage]]) -> int:
+    return sum(len(img.data) if isinstance(img, EncodedImage) else Path(img).stat().st_size for img in images)
+
 
 class XHSPublisher:
-    def __init__(self, headless: bool = True):
+    def __init__(self, headless: bool = True, browser=None, account: Account = DEFAULT_ACCOUNT):
+        """
+        Args:
+            headless: Launch Chromium without a window.
+            browser: An already running browser to open the context in. When
+                given, the publisher only owns its context and page.
+            account: Account whose cookie jar the context is logged in with.
+        """
         self.headless = headless
-        self.browser = None
+        self.account = account
+        self.playwright = None
+        self.browser = browser
+        self._owns_browser = browser is None
         self.context = None
         self.page = None
+        # True while the page sits on the creator home page with a valid login.
+        self.ready = False
 
     async def _ensure_browser(self):
         if self.browser is None:
-            playwright = await async_playwright().start()
-            self.browser = await playwright.chromium.launch(headless=self.headless)
+            self.playwright = await _start_playwright()
+            self.browser = await self.playwright.chromium.launch(headless=self.headless)
+        if self.context is None:
             self.context = await self.browser.new_context()
             self.page = await self.context.new_page()
 
     async def _load_cookies(self):
-        if COOKIES_PATH.exists():
-            cookies = json.loads(COOKIES_PATH.read_text())
+        cookies = load_cookies(self.account)
+        if cookies:
             await self.context.add_cookies(cookies)
 
     async def _save_cookies(self):
-        cookies = await self.context.cookies()
-        COOKIES_PATH.parent.mkdir(parents=True, exist_ok=True)
-        COOKIES_PATH.write_text(json.dumps(cookies, ensure_ascii=False, indent=2))
+        save_cookies(self.account, await self.context.cookies())
 
+    @traced("publish.login_check")
     async def check_login_status(self):
+        from playwright.async_api import TimeoutError as PlaywrightTimeoutError
         # 尝试等待头像元素出现
         try:
             # 使用 wait_for_selector 或 page.locator.wait_for()
@@ -52,7 +96,7 @@ class XHSPublisher:
             print("[autoRed] 已成功登录.")
             return True
 
-        except TimeoutError:
+        except PlaywrightTimeoutError:
             # 如果超时，说明未找到头像，即未登录
             print("[autoRed] 未检测到用户头像，判断为未登录.")
             return False
@@ -61,13 +105,14 @@ class XHSPublisher:
             print(f"[autoRed] 发生其他错误: {e}")
             return False
 
+    @traced("publish.login")
     async def login(self):
         """Login to Xiaohongshu. If cookies are present they are used, otherwise a QR code is shown.
         The user must scan the QR code within the browser window.
         """
         await self._ensure_browser()
         await self._load_cookies()
-        await self.page.goto("https://creator.xiaohongshu.com")
+        await self.page.goto(CREATOR_URL)
         # Check if we are already logged in by looking for the avatar element.
         current_url = self.page.url
         is_logged_in = await self.check_login_status()
@@ -85,20 +130,26 @@ class XHSPublisher:
         # Wait until the avatar appears, indicating successful login.
         await self.page.wait_for_selector("img.user_avatar", timeout=120000)
         await self._save_cookies()
+        mark_validated(self.account.name)
         print("Login successful and cookies saved.")
 
-    async def publish(self, image_paths: List[Path], title: str, copy: str):
-        """Publish a post with given images, title and copy.
-        Args:
-            image_paths: List of image file paths to upload.
-            title: Post title.
-            copy: Post body text.
+    async def prepare(self):
+        """Open the creator home page and make sure we are logged in.
+
+        A no-op when the page is already prepared, which is what lets pooled
+        sessions skip navigation and the login probe on the next post.
         """
+        if self.ready:
+            return
         await self._ensure_browser()
         await self._load_cookies()
-        await self.page.goto("https://creator.xiaohongshu.com")
+        await self.page.goto(CREATOR_URL)
+        # The session monitor validates the cookies in the background; trust a
+        # recent validation instead of waiting for the avatar again.
+        if validated_recently(self.account.name):
+            self.ready = True
+            return
         # Ensure we are logged in.
-        current_url = self.page.url
         is_logged_in = await self.check_login_status()
         # is_logged_in = "/home" in current_url
         # is_logged_in = await self.page.locator("img.user_avatar").is_visible(timeout=10000)
@@ -106,42 +157,413 @@ class XHSPublisher:
             print("not logged in")
             await self.login()
         print("login succeeded")
+        mark_validated(self.account.name)
+        self.ready = True
 
-        # Click the button to create a new post.
-        await self.page.wait_for_selector("text=发布笔记", timeout=10000)
-        await self.page.click("text=发布笔记")
-        await self.page.click("text=上传图文")
-
-        # Upload images.
-        # pass all paths at once to set_input_files
-        await self.page.set_input_files("input[type='file']", [str(p) for p in image_paths])
-
-        # Wait a short moment for the thumbnail to appear.
-        await self.page.wait_for_timeout(10000)
-        print("images uploaded")
-        # Fill title and copy.
-        await self.page.fill("input.d-text", title)
-        await self.page.fill("div[role='textbox']", copy)
-        print("title and copy filled")
-
-        # Submit the post.
-        locator = self.page.locator("div.d-button-content")
-        await self.page.wait_for_timeout(3600*1000)
-        # filtered_locator = locator.filter(has_text="发布")
-        # await filtered_locator.click()
-        # # Wait for confirmation.
-        # await self.page.wait_for_selector("text=发布成功", timeout=30000)
-        print("Post published.")
+    async def is_healthy(self, timeout: float = 5) -> bool:
+        """Cheap liveness probe of the page's renderer."""
+        if self.page is None or self.page.is_closed():
+            return False
+        try:
+            await asyncio.wait_for(self.page.evaluate("1"), timeout)
+            return True
+        except Exception:
+            return False
+
+    async def publish(self, image_paths: List[Union[Path, EncodedImage]], title: str, copy: str) -> dict:
+        """Publish a post with given images, title and copy.
+        Args:
+            image_paths: Image file paths or in-memory encoded images to upload.
+            title: Post title.
+            copy: Post body text.
+
+        Returns:
+            Seconds spent in each step of the flow, keyed by step name.
+        """
+        timings = {}
+
+        @contextmanager
+        def step(name):
+            with span(f"publish.{name}", account=self.account.name) as s:
+                yield s
+            timings[name] = round(s.duration, 3)
+
+        with span("publish", account=self.account.name):
+            with step("prepare"):
+                await self.prepare()
+                # The page leaves the home page from here on.
+                self.ready = False
+
+            # Click the button to create a new post.
+            with step("open_editor"):
+                try:
+                    await self.page.wait_for_selector("text=发布笔记", timeout=10000)
+                except Exception:
+                    # Possibly logged out since the last validation: probe again next time.
+                    invalidate(self.account.name)
+                    raise
+                await self.page.click("text=发布笔记")
+                await self.page.click("text=上传图文")
+
+            # Upload images and wait until the site reports them as done.
+            with step("upload") as s:
+                await self._upload_images(image_paths)
+                s.add_bytes(_payload_size(image_paths))
+                print("images uploaded")
+
+            # Fill title and copy.
+            with step("fill"):
+                await self.page.fill("input.d-text", title)
+                await self.page.fill("div[role='textbox']", copy)
+                print("title and copy filled")
+
+            # Submit the post.
+            with step("confirm"):
+                if PUBLISH_AUTO_SUBMIT:
+                    locator = self.page.locator("div.d-button-content")
+                    await locator.filter(has_text=re.compile(r"^\s*发布\s*$")).first.click()
+                else:
+                    print("Waiting for the post to be submitted in the browser window.")
+                # Wait for confirmation.
+                await self.page.wait_for_selector("text=发布成功", timeout=PUBLISH_CONFIRM_TIMEOUT * 1000)
+        print(f"Post published. Step timings (s): {timings}")
+        return timings
+
+    async def _upload_images(self, image_paths: List[Union[Path, EncodedImage]]):
+        """Hand the images to the file input and return as soon as either every
+        thumbnail is rendered or the upload endpoint answered once per image.
+        """
+        from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+        expected = len(image_paths)
+        uploaded = 0
+        all_uploaded = asyncio.Event()
+
+        def on_response(response):
+            nonlocal uploaded
+            if UPLOAD_RESPONSE_PATTERN in response.url and response.request.method in ("PUT", "POST") and response.ok:
+                uploaded += 1
+                print(f"[autoRed] Image upload {uploaded}/{expected} acknowledged.")
+                if uploaded >= expected:
+                    all_uploaded.set()
+
+        self.page.on("response", on_response)
+        try:
+            # pass all paths at once to set_input_files
+            await self.page.set_input_files("input[type='file']", _input_files(image_paths))
+            waiters = {
+                asyncio.create_task(self.page.wait_for_function(
+                    "([selector, n]) => document.querySelectorAll(selector).length >= n",
+                    arg=[THUMBNAIL_SELECTOR, expected],
+                    timeout=PUBLISH_UPLOAD_TIMEOUT * 1000,
+                )),
+                asyncio.create_task(all_uploaded.wait()),
+            }
+            done, pending = await asyncio.wait(waiters, timeout=PUBLISH_UPLOAD_TIMEOUT,
+                                               return_when=asyncio.FIRST_COMPLETED)
+            for task in pending:
+                task.cancel()
+            if not any(not task.cancelled() and task.exception() is None for task in done):
+                raise PlaywrightTimeoutError(f"Upload of {expected} image(s) not confirmed within {PUBLISH_UPLOAD_TIMEOUT}s "
+                                   f"({uploaded} acknowledged)")
+        finally:
+            self.page.remove_listener("response", on_response)
 
     async def close(self):
+        self.ready = False
+        if not self._owns_browser:
+            if self.context:
+                await self.context.close()
+            return
         if self.browser:
             await self.browser.close()
+        if self.playwright:
+            await self.playwright.stop()
 
-# Helper function for synchronous usage
-def run_publish(image_paths: List[Path], title: str, copy: str, headless: bool = True):
-    async def _run():
-        publisher = XHSPublisher(headless=headless)
+
+class PublisherPool:
+    """Long-lived pool of logged-in publisher sessions sharing one Chromium.
+
+    Started with :meth:`astart` (or ``async with``) the pool lives on the
+    running event loop, next to the generation work it overlaps with, and is
+    used through :meth:`apublish`. Started with :meth:`start` it runs its own
+    event loop in a background thread so synchronous code (``job_v2``, the
+    queue workers) can borrow it with :meth:`publish`. Either way it can be
+    used from other threads and loops as well. Every session is an isolated
+    context + page that is health-checked before use, recycled after
+    ``max_uses`` posts and re-warmed on the creator home page right after each
+    post.
+
+    With several accounts each one gets ``size`` sessions with its own cookie
+    jar. A post goes to the idle account that is allowed to post the soonest
+    under its rate limit, so concurrent callers spread across accounts.
+    """
+
+    def __init__(self, size: int = PUBLISHER_POOL_SIZE, max_uses: int = PUBLISHER_MAX_USES,
+                 headless: bool = True, accounts: Optional[List[Account]] = None):
+        if size < 1:
+            raise ValueError("size must be at least 1")
+        self.size = size
+        self.max_uses = max_uses
+        self.headless = headless
+        self.accounts = accounts or load_accounts()
+        self._loop = None
+        self._thread = None
+        self._playwright = None
+        self._browser = None
+        self._idle: List[XHSPublisher] = []
+        self._available = None
+        self._uses = {}
+        # Background re-warms; kept so they are not garbage collected mid-run
+        # and can be cancelled on close.
+        self._tasks: Set[asyncio.Task] = set()
+        self._limiters: Dict[str, AsyncRateLimiter] = {
+            account.name: AsyncRateLimiter(account.min_interval) for account in self.accounts
+        }
+
+    # -- lifecycle ---------------------------------------------------------
+    def start(self):
+        """Start the pool on its own event loop in a background thread."""
+        if self._loop is not None:
+            return self
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="xhs-publisher-pool", daemon=True)
+        self._thread.start()
+        try:
+            self._call(self._astart())
+        except BaseException:
+            self._stop_thread()
+            raise
+        return self
+
+    async def astart(self):
+        """Start the pool on the running event loop."""
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+            try:
+                await self._astart()
+            except BaseException:
+                await self._aclose()
+                self._loop = None
+                raise
+        return self
+
+    def close(self):
+        """Close the pool. Call :meth:`aclose` instead on the pool's own loop."""
+        if self._loop is None:
+            return
+        try:
+            self._call(self._aclose())
+        finally:
+            self._stop_thread()
+
+    def _stop_thread(self):
+        if self._thread is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._thread = None
+        self._loop = None
+
+    async def aclose(self):
+        if self._loop is None:
+            return
+        if self._thread is not None or not self._on_pool_loop():
+            await asyncio.to_thread(self.close)
+            return
+        await self._aclose()
+        self._loop = None
+
+    def publish(self, image_paths: List[Union[Path, EncodedImage]], title: str, copy: str,
+                account: Optional[str] = None):
+        """Publish a post on the next free session, blocking the caller.
+
+        Args:
+            account: Name of the account to post as; any account when omitted.
+        """
+        return self._call(self._apublish(image_paths, title, copy, account))
+
+    async def apublish(self, image_paths: List[Union[Path, EncodedImage]], title: str, copy: str,
+                       account: Optional[str] = None):
+        """Publish a post on the next free session without blocking the event loop."""
+        return await self._acall(self._apublish(image_paths, title, copy, account))
+
+    async def asave_cookies(self):
+        """Write the cookies of one idle session per account to its cookie jar,
+        so the jar holds whatever the site refreshed while the pool ran."""
+        await self._acall(self._asave_cookies())
+
+    async def arelogin(self, account: str):
+        """Send the idle sessions of `account` through the login flow now, in
+        the background, instead of when the next post borrows them."""
+        await self._acall(self._arelogin(account))
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    async def __aenter__(self):
+        return await self.astart()
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    def _on_pool_loop(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def _call(self, coro):
+        if self._on_pool_loop():
+            coro.close()
+            raise RuntimeError("blocking call on the publisher pool's own event loop; await the async method")
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    async def _acall(self, coro):
+        if self._on_pool_loop():
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self._loop))
+
+    # -- internals (run on the pool loop) ----------------------------------
+    def _spawn(self, coro):
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _astart(self):
+        self._playwright = await _start_playwright()
+        self._browser = await self._playwright.chromium.launch(headless=self.headless)
+        self._available = asyncio.Condition()
+        # Sessions are warmed one after another so that a QR login performed
+        # by the first session of an account stores cookies the others reuse.
+        for account in self.accounts:
+            for _ in range(self.size):
+                self._idle.append(await self._new_session(account))
+        print(f"[autoRed] Publisher pool ready with {len(self._idle)} session(s) "
+              f"for {len(self.accounts)} account(s).")
+
+    async def _new_session(self, account: Account) -> XHSPublisher:
+        session = XHSPublisher(headless=self.headless, browser=self._browser, account=account)
+        await session.prepare()
+        self._uses[session] = 0
+        return session
+
+    async def _recycle(self, session: XHSPublisher) -> XHSPublisher:
+        try:
+            await session.close()
+        except Exception as e:
+            print(f"[autoRed] Error closing publisher session: {e}")
+        fresh = await self._new_session(session.account)
+        self._uses.pop(session, None)
+        return fresh
+
+    async def _release(self, session: XHSPublisher):
+        async with self._available:
+            self._idle.append(session)
+            self._available.notify_all()
+
+    async def _rewarm(self, session: XHSPublisher):
+        try:
+            await session.prepare()
+        except Exception as e:
+            print(f"[autoRed] Failed to re-warm publisher session: {e}")
+        await self._release(session)
+
+    async def _borrow(self, account: Optional[str]) -> XHSPublisher:
+        def candidates():
+            return [s for s in self._idle if account is None or s.account.name == account]
+
+        async with self._available:
+            await self._available.wait_for(candidates)
+            session = min(candidates(), key=lambda s: self._limiters[s.account.name].next_ready)
+            self._idle.remove(session)
+        await self._limiters[session.account.name].acquire()
+        return session
+
+    @asynccontextmanager
+    async def _session(self, account: Optional[str] = None):
+        if account is not None and account not in self._limiters:
+            raise ValueError(f"Unknown account: {account}")
+        session = await self._borrow(account)
+        if self._uses[session] >= self.max_uses or not await session.is_healthy():
+            try:
+                session = await self._recycle(session)
+            except Exception:
+                # Hand the dead session back; the next borrower retries.
+                await self._release(session)
+                raise
+        try:
+            yield session
+        finally:
+            self._uses[session] += 1
+            # Navigate back home off the caller's critical path.
+            self._spawn(self._rewarm(session))
+
+    async def _apublish(self, image_paths: List[Union[Path, EncodedImage]], title: str, copy: str,
+                        account: Optional[str] = None):
+        async with self._session(account) as session:
+            print(f"[autoRed] Publishing as account '{session.account.name}'.")
+            return await session.publish(image_paths, title, copy)
+
+    async def _asave_cookies(self):
+        saved = set()
+        for session in list(self._idle):
+            if session.account.name in saved or session.context is None:
+                continue
+            try:
+                await session._save_cookies()
+                saved.add(session.account.name)
+            except Exception as e:
+                print(f"[autoRed] Could not save cookies of '{session.account.name}': {e}")
+
+    async def _arelogin(self, account: str):
+        invalidate(account)
+        async with self._available:
+            stale = [s for s in self._idle if s.account.name == account]
+            for session in stale:
+                self._idle.remove(session)
+                session.ready = False
+        for session in stale:
+            self._spawn(self._rewarm(session))
+
+    async def _aclose(self):
+        # A re-warm may be stuck waiting for a QR login; closing the browser
+        # takes its session down with it.
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for session in self._idle:
+            await session.close()
+        self._idle.clear()
+        if self._browser:
+            await self._browser.close()
+            self._browser = None
+        if self._playwright:
+            await self._playwright.stop()
+            self._playwright = None
+
+
+async def arun_publish(image_paths: List[Union[Path, EncodedImage]], title: str, copy: str,
+                       headless: bool = True, pool: Optional[PublisherPool] = None):
+    """Publish one post, borrowing a warm session from `pool` when given."""
+    if pool is not None:
+        return await pool.apublish(image_paths, title, copy)
+    publisher = XHSPublisher(headless=headless)
+    try:
         # await publisher.login()
-        await publisher.publish(image_paths, title, copy)
+        return await publisher.publish(image_paths, title, copy)
+    finally:
         await publisher.close()
-    asyncio.run(_run())
+
+
+# Helper function for synchronous usage
+def run_publish(image_paths: List[Union[Path, EncodedImage]], title: str, copy: str, headless: bool = True,
+                pool: Optional[PublisherPool] = None):
+    """Blocking variant of :func:`arun_publish`. Without a pool this starts a
+    browser (and an event loop) for the one post."""
+    if pool is not None:
+        return pool.publish(image_paths, title, copy)
+    return asyncio.run(arun_publish(image_paths, title, copy, headless))
@@ -0,0 +1,165 @@
+# router for autoRed
+
+"""Latency-aware failover router across text generation providers.
+
+The router keeps a rolling window of latencies and outcomes per provider and
+sends each request to the fastest healthy one. If that provider has not
+answered within the hedge delay a duplicate request goes to the next best
+provider; whichever succeeds first wins and the other request is cancelled.
+A failing provider falls over to the next one in the ranking. Answers a
+provider served from a cache (see :func:`served_from_cache`) say nothing about
+its latency and are left out of the statistics.
+"""
+import time
+import asyncio
+import contextvars
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from src.metrics import current_span
+from config.settings import ROUTER_WINDOW, ROUTER_HEDGE_AFTER, ROUTER_MAX_ERROR_RATE
+
+_cache_hit: contextvars.ContextVar[bool] = contextvars.ContextVar("autored_router_cache_hit", default=False)
+
+
+def served_from_cache():
+    """Called by a provider answering the current request from a cache."""
+    _cache_hit.set(True)
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class ProviderStats:
+    """Rolling latency and error statistics of one provider."""
+
+    def __init__(self, window: int = ROUTER_WINDOW):
+        self.samples = deque(maxlen=window)  # (latency seconds, succeeded)
+
+    def record(self, latency: float, ok: bool):
+        self.samples.append((latency, ok))
+
+    @property
+    def latencies(self) -> List[float]:
+        return [latency for latency, ok in self.samples if ok]
+
+    @property
+    def p50(self) -> Optional[float]:
+        return _percentile(self.latencies, 0.5)
+
+    @property
+    def p95(self) -> Optional[float]:
+        return _percentile(self.latencies, 0.95)
+
+    @property
+    def error_rate(self) -> float:
+        if not self.samples:
+            return 0.0
+        return sum(1 for _, ok in self.samples if not ok) / len(self.samples)
+
+    def as_dict(self) -> dict:
+        return {"n": len(self.samples), "p50": self.p50, "p95": self.p95, "error_rate": round(self.error_rate, 3)}
+
+
+class ProviderRouter:
+    def __init__(self, providers: Dict[str, Callable[..., Awaitable[Any]]],
+                 hedge_after: float = ROUTER_HEDGE_AFTER, max_error_rate: float = ROUTER_MAX_ERROR_RATE):
+        """
+        Args:
+            providers: Async callables by provider name. A provider signals
+                failure by raising or by returning None.
+            hedge_after: Seconds to wait for the primary provider before a
+                hedge request is sent, used until the primary has a p95.
+            max_error_rate: Providers above this rolling error rate are only
+                used once the healthy ones are exhausted.
+        """
+        if not providers:
+            raise ValueError("at least one provider is required")
+        self.providers = providers
+        self.hedge_after = hedge_after
+        self.max_error_rate = max_error_rate
+        self.stats = {name: ProviderStats() for name in providers}
+
+    def ranked(self) -> List[str]:
+        """Provider names, best first: healthy by p50 latency, then the rest."""
+        def key(name):
+            stats = self.stats[name]
+            unhealthy = stats.error_rate > self.max_error_rate
+            # Providers without successful samples yet are tried early so
+            # that every provider gets measured.
+            return (unhealthy, stats.p50 if stats.p50 is not None else 0.0, stats.error_rate)
+        return sorted(self.providers, key=key)
+
+    def _hedge_delay(self, name: str) -> float:
+        p95 = self.stats[name].p95
+        return min(p95, self.hedge_after) if p95 is not None else self.hedge_after
+
+    async def _timed(self, name: str, **kwargs):
+        # Every request runs in its own task, so the flag is per request.
+        _cache_hit.set(False)
+        start = time.monotonic()
+        try:
+            result = await self.providers[name](**kwargs)
+        except asyncio.CancelledError:
+            # Lost the race: not a verdict on the provider.
+            raise
+        except Exception:
+            self.stats[name].record(time.monotonic() - start, False)
+            raise
+        if not _cache_hit.get():
+            self.stats[name].record(time.monotonic() - start, result is not None)
+        if result is None:
+            raise RuntimeError(f"{name} returned no result")
+        return result
+
+    async def call(self, **kwargs):
+        """Run one request through the best provider, hedging and failing over.
+
+        Keyword arguments are passed to the provider callable.
+        """
+        order = self.ranked()
+        launched = 0
+        hedged = False
+        pending = set()
+        last_error = None
+
+        def launch():
+            nonlocal launched
+            name = order[launched]
+            if launched and current_span() is not None:
+                # Hedges and failovers count as retries of the enclosing span.
+                current_span().retry()
+            launched += 1
+            pending.add(asyncio.create_task(self._timed(name, **kwargs), name=name))
+
+        launch()
+        try:
+            while pending:
+                timeout = None
+                if not hedged and launched < len(order):
+                    timeout = self._hedge_delay(order[0])
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    print(f"[autoRed] {order[0]} slower than {timeout:.1f}s, hedging with {order[launched]}.")
+                    hedged = True
+                    launch()
+                    continue
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    last_error = task.exception()
+                    print(f"[autoRed] Provider {task.get_name()} failed: {last_error}")
+                    # Fail over to the next provider in the ranking.
+                    if launched < len(order):
+                        launch()
+            raise RuntimeError(f"all providers failed, last error: {last_error}")
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def report(self) -> dict:
+        return {name: stats.as_dict() for name, stats in self.stats.items()}
@@ -0,0 +1,156 @@
+# sampler for autoRed
+
+"""Coverage-driven sampling of the attributes a post is generated with.
+
+Drawing style, mood and the like uniformly at random repeats some
+combinations within weeks while others never come up. The
+:class:`CoverageSampler` keeps persistent usage counts per combination and
+always draws the least used one, preferring values that are themselves
+under-represented, so N draws cover N distinct combinations for as long as
+unused ones exist. A draw only reserves its combination; it counts as used
+once :meth:`CoverageSampler.record` is called for it (when a post generated
+with it was accepted), and :meth:`CoverageSampler.release` gives it back.
+"""
+import json
+import random
+import threading
+from itertools import product
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from config.settings import SAMPLER_STATE_PATH
+
+Combination = Tuple[str, ...]
+
+
+class CoverageSampler:
+    """
+    Args:
+        dimensions: Name and possible values of every attribute, e.g.
+            ``{"style": [...], "mood": [...]}``. Draws are dicts with one value
+            per attribute.
+        path: JSON file the usage counts are kept in. ``None`` keeps them in
+            memory only.
+    """
+
+    def __init__(self, dimensions: Dict[str, Sequence[str]], path: Optional[Path] = SAMPLER_STATE_PATH,
+                 rng: Optional[random.Random] = None):
+        self.names = list(dimensions)
+        self.dimensions = {name: list(values) for name, values in dimensions.items()}
+        self.path = Path(path) if path else None
+        self.rng = rng or random.Random()
+        self._combinations: List[Combination] = list(product(*self.dimensions.values()))
+        self._known = set(self._combinations)
+        self._counts: Dict[Combination, int] = {}
+        # Drawn but not yet recorded or released; in memory only.
+        self._reserved: Dict[Combination, int] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    @staticmethod
+    def _key(combination: Combination) -> str:
+        return "|".join(combination)
+
+    def _load(self):
+        if not (self.path and self.path.exists()):
+            return
+        try:
+            state = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            print(f"[autoRed] Ignoring unreadable sampler state {self.path}: {e}")
+            return
+        known = {self._key(c): c for c in self._combinations}
+        # Counts of values that were removed from the pools are dropped.
+        self._counts = {known[key]: n for key, n in state.get("counts", {}).items() if key in known}
+
+    def _save(self):
+        if not self.path:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        state = {"counts": {self._key(c): n for c, n in self._counts.items()}}
+        tmp.write_text(json.dumps(state, ensure_ascii=False, indent=2), encoding="utf-8")
+        tmp.replace(self.path)
+
+    def _value_counts(self, counts: Dict[Combination, int]) -> List[Dict[str, int]]:
+        marginals = [dict.fromkeys(values, 0) for values in self.dimensions.values()]
+        for combination, n in counts.items():
+            for marginal, value in zip(marginals, combination):
+                marginal[value] += n
+        return marginals
+
+    def _combination(self, draw: Dict[str, str]) -> Optional[Combination]:
+        combination = tuple(draw.get(name) for name in self.names)
+        return combination if combination in self._known else None
+
+    def draw(self, n: int = 1) -> List[Dict[str, str]]:
+        """Draw `n` combinations, all distinct as long as there are enough, and
+        reserve them so concurrent draws spread out."""
+        with self._lock:
+            # Reserved combinations weigh like used ones.
+            counts = dict(self._counts)
+            for combination, n_reserved in self._reserved.items():
+                counts[combination] = counts.get(combination, 0) + n_reserved
+            marginals = self._value_counts(counts)
+            picked = set()
+            draws = []
+            for _ in range(n):
+                if len(picked) == len(self._combinations):
+                    picked.clear()
+                # Least used combination first, then the one whose values are
+                # least used, ties broken at random.
+                best = min(
+                    (c for c in self._combinations if c not in picked),
+                    key=lambda c: (counts.get(c, 0),
+                                   sum(marginal[value] for marginal, value in zip(marginals, c)),
+                                   self.rng.random()),
+                )
+                picked.add(best)
+                counts[best] = counts.get(best, 0) + 1
+                self._reserved[best] = self._reserved.get(best, 0) + 1
+                for marginal, value in zip(marginals, best):
+                    marginal[value] += 1
+                draws.append(dict(zip(self.names, best)))
+        return draws
+
+    def _unreserve(self, combination: Combination):
+        left = self._reserved.get(combination, 0) - 1
+        if left > 0:
+            self._reserved[combination] = left
+        else:
+            self._reserved.pop(combination, None)
+
+    def record(self, draw: Dict[str, str]):
+        """Count `draw` as used, e.g. once content generated with it was accepted.
+        Combinations outside the pools are ignored."""
+        combination = self._combination(draw)
+        if combination is None:
+            return
+        with self._lock:
+            self._unreserve(combination)
+            self._counts[combination] = self._counts.get(combination, 0) + 1
+            self._save()
+
+    def release(self, draw: Dict[str, str]):
+        """Give back a drawn combination that ended up unused."""
+        combination = self._combination(draw)
+        if combination is not None:
+            with self._lock:
+                self._unreserve(combination)
+
+    def stats(self) -> dict:
+        """How evenly the draws so far cover the combinations and each attribute."""
+        with self._lock:
+            marginals = self._value_counts(self._counts)
+            used = sum(1 for c in self._combinations if self._counts.get(c))
+            return {
+                "draws": sum(self._counts.values()),
+                "combinations": len(self._combinations),
+                "covered": used,
+                "coverage": round(used / len(self._combinations), 4),
+                "values": {
+                    name: {"min": min(marginal.values()), "max": max(marginal.values()),
+                           "unused": sum(1 for n in marginal.values() if n == 0)}
+                    for name, marginal in zip(self.names, marginals)
+                },
+            }
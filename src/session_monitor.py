@@ -0,0 +1,235 @@
+# session_monitor for autoRed
+
+"""Background health checks of the creator accounts' login sessions.
+
+Without it every publish reloads the cookie jar and waits up to 10 s for the
+avatar on the creator home page, and an expired login turns into a QR code
+stall in the middle of a scheduled post. The :class:`SessionMonitor` instead
+validates each account's cookies periodically with a single API request,
+persists refreshed cookies, alerts while there is still time to log in again
+and records every successful validation, so ``XHSPublisher.prepare`` can skip
+the avatar probe for a recently validated account.
+"""
+import time
+import asyncio
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from src.accounts import Account, load_accounts, load_cookies, save_cookies
+from src.metrics import span
+from config.settings import (
+    SESSION_CHECK_INTERVAL,
+    SESSION_TRUST_SECONDS,
+    SESSION_EXPIRY_WARNING,
+    SESSION_CHECK_URL,
+    SESSION_COOKIES,
+    SESSION_ALERT_WEBHOOK,
+)
+
+_validated: Dict[str, float] = {}
+_lock = threading.Lock()
+
+
+def mark_validated(account: str):
+    """Record that `account` was just seen logged in."""
+    with _lock:
+        _validated[account] = time.monotonic()
+
+
+def invalidate(account: str):
+    with _lock:
+        _validated.pop(account, None)
+
+
+def validated_recently(account: str, max_age: float = SESSION_TRUST_SECONDS) -> bool:
+    """Whether `account` was seen logged in within the last `max_age` seconds."""
+    with _lock:
+        checked = _validated.get(account)
+    return checked is not None and time.monotonic() - checked < max_age
+
+
+@dataclass
+class SessionStatus:
+    account: str
+    # None when the check itself failed (e.g. network error, unexpected answer).
+    valid: Optional[bool]
+    # Earliest expiry of the login cookies (epoch seconds), if known.
+    expires_at: Optional[float] = None
+    error: Optional[str] = None
+
+    @property
+    def expires_in(self) -> Optional[float]:
+        return self.expires_at - time.time() if self.expires_at is not None else None
+
+
+def _matches(cookie: dict, host: str) -> bool:
+    domain = cookie.get("domain", "").lstrip(".")
+    return host == domain or host.endswith("." + domain)
+
+
+def _live(cookie: dict, now: float) -> bool:
+    expires = cookie.get("expires", -1)
+    return expires is None or expires < 0 or expires > now
+
+
+def session_expiry(cookies: list, names: str = SESSION_COOKIES) -> Optional[float]:
+    """Earliest expiry of the login cookies; None for browser-session or unknown cookies."""
+    wanted = {name.strip() for name in names.split(",") if name.strip()}
+    expiries = [c["expires"] for c in cookies if c.get("name") in wanted and (c.get("expires") or -1) > 0]
+    return min(expiries) if expiries else None
+
+
+def _merge_set_cookies(cookies: list, jar, host: str) -> bool:
+    """Apply cookies set by a response to a Playwright cookie list. Returns
+    True if anything changed."""
+    changed = False
+    for new in jar:
+        domain = new.domain or host
+        existing = next((c for c in cookies if c["name"] == new.name and _matches(c, domain.lstrip("."))), None)
+        expires = float(new.expires) if new.expires else -1
+        if existing is None:
+            cookies.append({"name": new.name, "value": new.value, "domain": domain, "path": new.path or "/",
+                            "expires": expires, "httpOnly": False, "secure": bool(new.secure), "sameSite": "Lax"})
+            changed = True
+        elif existing["value"] != new.value or (new.expires and existing.get("expires") != expires):
+            existing["value"] = new.value
+            if new.expires:
+                existing["expires"] = expires
+            changed = True
+    return changed
+
+
+def _verdict(response) -> Tuple[Optional[bool], Optional[str]]:
+    """Whether a check response says the login is valid, or ``None`` and the
+    reason when it does not say either way (server errors, a page instead of
+    the API answer, a body of an unexpected shape)."""
+    if response.status_code >= 500:
+        return None, f"HTTP {response.status_code}"
+    if response.status_code != 200:
+        return False, None
+    if "json" not in response.headers.get("content-type", ""):
+        return None, f"unexpected content type {response.headers.get('content-type')!r}"
+    try:
+        body = response.json()
+    except ValueError as e:
+        return None, f"unparseable body: {e}"
+    if not isinstance(body, dict) or not ({"success", "code"} & body.keys()):
+        return None, "unexpected body"
+    return bool(body.get("success") or body.get("code") == 0), None
+
+
+class SessionMonitor:
+    """Validate the login of every account every `interval` seconds.
+
+    Args:
+        pool: Publisher pool whose live sessions hold the freshest cookies.
+            They are written to the cookie jars before each check, and idle
+            sessions of an account whose login failed are sent through the
+            login flow right away, off the publish path.
+        on_alert: Called with ``(account, message)`` for expired or soon
+            expiring logins, in addition to printing and the webhook.
+    """
+
+    def __init__(self, accounts: Optional[List[Account]] = None, interval: float = SESSION_CHECK_INTERVAL,
+                 url: str = SESSION_CHECK_URL, expiry_warning: float = SESSION_EXPIRY_WARNING,
+                 pool=None, on_alert: Optional[Callable[[str, str], None]] = None,
+                 webhook: Optional[str] = SESSION_ALERT_WEBHOOK):
+        self.accounts = accounts or load_accounts()
+        self.interval = interval
+        self.url = url
+        self.expiry_warning = expiry_warning
+        self.pool = pool
+        self.on_alert = on_alert
+        self.webhook = webhook
+        self.status: Dict[str, SessionStatus] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def check(self, account: Account, client) -> SessionStatus:
+        """Validate one account's cookie jar with a single request."""
+        import httpx
+
+        host = urlsplit(self.url).hostname or ""
+        now = time.time()
+        cookies = load_cookies(account)
+        header = "; ".join(f"{c['name']}={c['value']}" for c in cookies if _matches(c, host) and _live(c, now))
+        with span("session.check", account=account.name) as s:
+            try:
+                response = await client.get(self.url, headers={"Cookie": header} if header else {})
+            except httpx.HTTPError as e:
+                s.fail(f"{type(e).__name__}: {e}")
+                return SessionStatus(account.name, None, session_expiry(cookies), str(e))
+            valid, error = _verdict(response)
+            if error:
+                s.fail(error)
+            s.set(valid=valid)
+        if _merge_set_cookies(cookies, response.cookies.jar, host):
+            save_cookies(account, cookies)
+        # An inconclusive check neither trusts nor distrusts the login.
+        if valid:
+            mark_validated(account.name)
+        elif valid is False:
+            invalidate(account.name)
+        return SessionStatus(account.name, valid, session_expiry(cookies), error)
+
+    async def check_all(self) -> List[SessionStatus]:
+        import httpx
+
+        if self.pool is not None:
+            await self.pool.asave_cookies()
+        async with httpx.AsyncClient(timeout=10, follow_redirects=False) as client:
+            statuses = await asyncio.gather(*(self.check(account, client) for account in self.accounts))
+        for status in statuses:
+            self.status[status.account] = status
+            await self._report(status)
+        return statuses
+
+    async def _report(self, status: SessionStatus):
+        if status.valid is None:
+            print(f"[autoRed] Session check of '{status.account}' failed: {status.error}")
+            return
+        if not status.valid:
+            await self._alert(status.account, "login expired, scan the QR code in the browser window to log in")
+            if self.pool is not None:
+                await self.pool.arelogin(status.account)
+        elif status.expires_in is not None and status.expires_in < self.expiry_warning:
+            await self._alert(status.account, f"login expires in {status.expires_in / 3600:.1f}h")
+        else:
+            print(f"[autoRed] Session of '{status.account}' is valid.")
+
+    async def _alert(self, account: str, message: str):
+        print(f"[autoRed] Session alert for '{account}': {message}")
+        if self.on_alert is not None:
+            self.on_alert(account, message)
+        if self.webhook:
+            import httpx
+            try:
+                async with httpx.AsyncClient(timeout=10) as client:
+                    await client.post(self.webhook, json={"text": f"[autoRed] {account}: {message}"})
+            except httpx.HTTPError as e:
+                print(f"[autoRed] Could not send session alert: {e}")
+
+    async def run(self):
+        """Check all accounts every `interval` seconds until cancelled."""
+        while True:
+            try:
+                await self.check_all()
+            except Exception as e:
+                print(f"[autoRed] Session monitor error: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> asyncio.Task:
+        """Run the monitor in the background of the running event loop."""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+        return self._task
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
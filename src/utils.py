@@ -5,16 +5,55 @@ Provides small helpers for path handling and environment loading.
 """
 
 import os
+import time
+import asyncio
+import threading
 from pathlib import Path
-from dotenv import load_dotenv
 
-def load_env():
-    """Load .env file from the project root if it exists."""
-    env_path = Path(__file__).parent.parent / ".env"
-    if env_path.exists():
-        load_dotenv(dotenv_path=env_path)
+# The .env file is loaded once, by the settings module; load_env stays
+# importable from here for existing callers.
+from config.settings import load_env
+
+__all__ = ["load_env", "ensure_dir", "AsyncRateLimiter", "RateLimiter"]
+
 
 def ensure_dir(path: Path):
     """Create directory if it does not exist."""
     path.mkdir(parents=True, exist_ok=True)
     return path
+
+
+class AsyncRateLimiter:
+    """Spaces out `acquire` calls so that at most one passes every `interval` seconds.
+
+    Slots are reserved at call time, so concurrent callers queue up in order
+    without holding a lock while they sleep.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.next_ready = 0.0
+
+    async def acquire(self):
+        now = time.monotonic()
+        wait = self.next_ready - now
+        self.next_ready = max(now, self.next_ready) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class RateLimiter:
+    """Thread-safe, blocking counterpart of :class:`AsyncRateLimiter`."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.next_ready = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            wait = self.next_ready - now
+            self.next_ready = max(now, self.next_ready) + self.interval
+        if wait > 0:
+            time.sleep(wait)
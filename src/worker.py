@@ -0,0 +1,173 @@
+# worker for autoRed
+
+"""Workers that drive posts from the job store through their stages.
+
+Each post resumes at the state recorded in the store: content is generated
+once, images are rendered once, and only the remaining stages run again after
+a crash or a failed publish. The queue workers are threads; the scheduled
+jobs use the async variants (``aprepare``, ``aprocess``) on the scheduler's
+event loop.
+"""
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from src.llm_client import generate_content_element_routed, agenerate_content_element_routed, get_sampler
+from src.image_client import generate_images
+from src.publisher import run_publish, arun_publish, PublisherPool
+from src.jobstore import (
+    JobStore,
+    Job,
+    OPEN_STATES,
+    PENDING,
+    CONTENT_GENERATED,
+    IMAGES_RENDERED,
+    PUBLISHED,
+)
+from src.utils import RateLimiter
+from src.dedup import get_dedup_index
+from config.settings import IMAGES_PER_POST, JOB_WORKERS, JOB_PUBLISH_INTERVAL
+
+
+def enqueue(store: JobStore, n: int, seeds: Optional[List[int]] = None) -> List[int]:
+    """Queue `n` posts. Without seeds each post gets its own least covered
+    combination, stored with it like its seed, so retries repeat the same
+    requests."""
+    combinations = get_sampler().draw(n) if seeds is None else None
+    return store.enqueue(n, seeds=seeds, combinations=combinations)
+
+
+def _store_content(store: JobStore, job: Job, content_element: Optional[dict]):
+    if not content_element:
+        raise RuntimeError("no content generated")
+    store.advance(job, CONTENT_GENERATED, content=content_element)
+
+
+def generate_content(store: JobStore, job: Job):
+    _store_content(store, job, generate_content_element_routed(seed=job.seed, combination=job.combination))
+
+
+async def agenerate_content(store: JobStore, job: Job):
+    _store_content(store, job, await agenerate_content_element_routed(seed=job.seed, combination=job.combination))
+
+
+def render_images(store: JobStore, job: Job, mode: str = "prod"):
+    # Images must survive a crash, so they are always written to disk here.
+    images = generate_images(job.content.get("image_prompt", ""), count=IMAGES_PER_POST, mode=mode,
+                             job_id=f"job{job.id}", seed=job.seed)
+    duplicate = get_dedup_index(mode).find_images(images)
+    if duplicate:
+        # New images need a new prompt: generate the post's text again.
+        store.advance(job, PENDING)
+        raise RuntimeError(f"images repeat a published post ({duplicate})")
+    store.advance(job, IMAGES_RENDERED, images=images)
+
+
+def _check_images(store: JobStore, job: Job):
+    missing = [p for p in job.images if not p.exists()]
+    if missing:
+        # Rendered images are gone (e.g. output folder cleaned): render again.
+        store.advance(job, CONTENT_GENERATED)
+        raise RuntimeError(f"missing images {missing}")
+
+
+def publish(store: JobStore, job: Job, pool: Optional[PublisherPool] = None,
+            limiter: Optional[RateLimiter] = None, mode: str = "prod"):
+    _check_images(store, job)
+    if limiter is not None:
+        limiter.acquire()
+    run_publish(job.images, job.content.get("title", "title"), job.content.get("copy", "nothing"),
+                headless=False, pool=pool)
+    store.advance(job, PUBLISHED)
+    get_dedup_index(mode).add(job.content, job.images)
+
+
+async def apublish(store: JobStore, job: Job, pool: Optional[PublisherPool] = None, mode: str = "prod"):
+    _check_images(store, job)
+    await arun_publish(job.images, job.content.get("title", "title"), job.content.get("copy", "nothing"),
+                       headless=False, pool=pool)
+    store.advance(job, PUBLISHED)
+    await asyncio.to_thread(get_dedup_index(mode).add, job.content, job.images)
+
+
+def _generate(store: JobStore, job: Job, mode: str):
+    if job.state == PENDING:
+        generate_content(store, job)
+    if job.state == CONTENT_GENERATED:
+        render_images(store, job, mode)
+
+
+async def _agenerate(store: JobStore, job: Job, mode: str):
+    if job.state == PENDING:
+        await agenerate_content(store, job)
+    if job.state == CONTENT_GENERATED:
+        # The image SDK blocks.
+        await asyncio.to_thread(render_images, store, job, mode)
+
+
+async def aprepare(store: JobStore, job: Job, mode: str = "prod") -> bool:
+    """Run the generation stages of a claimed job, stopping before publish.
+    Returns True once the post is ready to publish."""
+    try:
+        await _agenerate(store, job, mode)
+    except Exception as e:
+        print(f"[autoRed] Job #{job.id} failed in state '{job.state}': {e}")
+        store.fail(job, str(e))
+        return False
+    store.release(job)
+    return True
+
+
+def process(store: JobStore, job: Job, mode: str = "prod", pool: Optional[PublisherPool] = None,
+            limiter: Optional[RateLimiter] = None) -> bool:
+    """Run the remaining stages of a claimed job. Returns True once published."""
+    print(f"[autoRed] Job #{job.id} resuming at state '{job.state}'.")
+    try:
+        _generate(store, job, mode)
+        publish(store, job, pool, limiter, mode)
+    except Exception as e:
+        print(f"[autoRed] Job #{job.id} failed in state '{job.state}': {e}")
+        store.fail(job, str(e))
+        return False
+    store.release(job)
+    print(f"[autoRed] Job #{job.id} published.")
+    return True
+
+
+async def aprocess(store: JobStore, job: Job, mode: str = "prod", pool: Optional[PublisherPool] = None) -> bool:
+    """Async variant of :func:`process` for use on an event loop."""
+    print(f"[autoRed] Job #{job.id} resuming at state '{job.state}'.")
+    try:
+        await _agenerate(store, job, mode)
+        await apublish(store, job, pool, mode)
+    except Exception as e:
+        print(f"[autoRed] Job #{job.id} failed in state '{job.state}': {e}")
+        store.fail(job, str(e))
+        return False
+    store.release(job)
+    print(f"[autoRed] Job #{job.id} published.")
+    return True
+
+
+def drain(store: JobStore, mode: str = "prod", pool: Optional[PublisherPool] = None,
+          workers: int = JOB_WORKERS, publish_interval: float = JOB_PUBLISH_INTERVAL) -> int:
+    """Process queued posts until none is left, publishing at most one post
+    every `publish_interval` seconds. Returns the number of posts published.
+    """
+    limiter = RateLimiter(publish_interval)
+
+    def worker() -> int:
+        published = 0
+        while True:
+            job = store.claim(OPEN_STATES)
+            if job is None:
+                return published
+            published += process(store, job, mode, pool, limiter)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        published = sum(executor.map(lambda _: worker(), range(workers)))
+    print(f"[autoRed] Drained queue: {published} published in {time.perf_counter() - started:.1f}s; "
+          f"states: {store.counts()}")
+    return published